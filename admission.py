@@ -0,0 +1,426 @@
+"""Control de admisión y descarte de carga delante de las rutas caras.
+
+Cuando llega más tráfico del que cabe, las peticiones a `/predict` se
+acumulan detrás de la escritura del CSV y la maquetación de PDFs hasta que
+los workers agotan su timeout y todo falla a la vez. Aquí se decide en la
+entrada, en microsegundos, qué se atiende y qué se rechaza:
+
+- `ConcurrencyLimiter`: como mucho `limit` peticiones a la vez por endpoint
+  y una cola de espera acotada (`max_queue`, `queue_timeout`). Si la cola
+  está llena o se agota la espera, 503 con `Retry-After` estimado a partir
+  del tiempo medio de servicio.
+- `TokenBucketLimiter` (opcional): cubo de fichas por usuario (el
+  `current_user` de Flask-Login; la IP si es anónimo). Sin fichas, 429 con
+  `Retry-After`; la ficha se devuelve si después la petición se descarta
+  por concurrencia. `SQLiteBucketBackend` comparte los cubos entre workers.
+  Detrás de un proxy inverso todos los anónimos llegan con la IP del proxy:
+  usa TRUSTED_PROXIES para tomar la del cliente de X-Forwarded-For.
+- Modo degradado (ADMISSION_DEGRADE=1): una petición que tuvo que esperar
+  en la cola se atiende, pero `/predict` devuelve la predicción sin generar
+  el PDF.
+
+Sólo se controlan las peticiones POST de los endpoints configurados. Con
+workers síncronos de gunicorn (un hilo) cada proceso atiende una petición
+y las demás esperan en el backlog del socket, fuera de la app: para que el
+descarte actúe, usa GUNICORN_THREADS mayor que el límite (o el modo ASGI).
+
+Configuración:
+    ADMISSION_LIMITS            endpoint=concurrencia:cola,... ('' o 0 lo desactiva todo)
+    ADMISSION_QUEUE_TIMEOUT_MS  espera máxima en la cola (1000)
+    ADMISSION_DEGRADE           1 para el modo degradado (0)
+    RATE_LIMIT_PER_MINUTE       fichas por minuto y usuario (0: desactivado)
+    RATE_LIMIT_BURST            capacidad del cubo (20)
+    RATE_LIMIT_DB               SQLite para compartir los cubos entre workers
+    TRUSTED_PROXIES             proxies inversos delante de la app (0)
+"""
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from flask import Response, g, jsonify, request
+from flask_login import current_user
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+DEFAULT_LIMITS = 'predict=4:16,predict_batch=1:2'
+# Peso del último tiempo de servicio en la media móvil.
+SERVICE_TIME_ALPHA = 0.2
+MAX_RETRY_AFTER = 60
+
+RATE_LIMITED = 'rate_limited'
+QUEUE_FULL = 'queue_full'
+QUEUE_TIMEOUT = 'queue_timeout'
+MESSAGES = {
+    RATE_LIMITED: 'Demasiadas peticiones. Inténtalo de nuevo en unos segundos.',
+    QUEUE_FULL: 'El servidor está saturado. Inténtalo de nuevo en unos segundos.',
+    QUEUE_TIMEOUT: 'El servidor está saturado. Inténtalo de nuevo en unos segundos.',
+}
+
+
+class Overloaded(Exception):
+    """Petición rechazada por el control de admisión."""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(MESSAGES[reason])
+        self.reason = reason
+        self.retry_after = retry_after
+
+    @property
+    def status_code(self):
+        return 429 if self.reason == RATE_LIMITED else 503
+
+
+class ConcurrencyLimiter:
+    """Semáforo con cola de espera acotada. Seguro entre hilos.
+
+    - limit: peticiones atendiéndose a la vez.
+    - max_queue: peticiones que pueden esperar un hueco; el resto se rechaza.
+    - queue_timeout: segundos máximos de espera en la cola.
+    """
+
+    def __init__(self, limit, max_queue=0, queue_timeout=1.0):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._waiting = 0
+        self._service_seconds = None
+        self._counters = {'admitted': 0, 'queued': 0, QUEUE_FULL: 0, QUEUE_TIMEOUT: 0}
+
+    def acquire(self):
+        """Ocupa un hueco y devuelve los segundos de espera; lanza `Overloaded` si no hay."""
+        start = time.monotonic()
+        with self._cond:
+            # Sin adelantar a quien ya espera: la cola es FIFO en la práctica.
+            if self._in_flight < self.limit and not self._waiting:
+                self._in_flight += 1
+                self._counters['admitted'] += 1
+                return 0.0
+            if self._waiting >= self.max_queue:
+                self._counters[QUEUE_FULL] += 1
+                raise Overloaded(QUEUE_FULL, self._retry_after())
+            self._waiting += 1
+            self._counters['queued'] += 1
+            deadline = start + self.queue_timeout
+            try:
+                while self._in_flight >= self.limit:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._counters[QUEUE_TIMEOUT] += 1
+                        raise Overloaded(QUEUE_TIMEOUT, self._retry_after())
+                    self._cond.wait(remaining)
+            finally:
+                self._waiting -= 1
+            self._in_flight += 1
+            self._counters['admitted'] += 1
+        return time.monotonic() - start
+
+    def release(self, service_seconds=None):
+        with self._cond:
+            self._in_flight -= 1
+            if service_seconds is not None:
+                if self._service_seconds is None:
+                    self._service_seconds = service_seconds
+                else:
+                    self._service_seconds += SERVICE_TIME_ALPHA * (service_seconds - self._service_seconds)
+            self._cond.notify()
+
+    def _retry_after(self):
+        # Lo que tardaría en vaciarse la cola actual, en segundos enteros.
+        service = self._service_seconds if self._service_seconds is not None else self.queue_timeout
+        return min(MAX_RETRY_AFTER, max(1, math.ceil((self._waiting + 1) * service / self.limit)))
+
+    def stats(self):
+        with self._cond:
+            return {**self._counters, 'in_flight': self._in_flight, 'queue_depth': self._waiting,
+                    'limit': self.limit, 'max_queue': self.max_queue,
+                    'service_ms': round((self._service_seconds or 0.0) * 1000, 3)}
+
+
+def _take_token(tokens, updated, now, rate, burst):
+    """(fichas, segundos hasta la próxima) tras intentar gastar una."""
+    tokens = min(burst, tokens + (now - updated) * rate)
+    if tokens >= 1:
+        return tokens - 1, 0.0
+    return tokens, (1 - tokens) / rate
+
+
+class SQLiteBucketBackend:
+    """Cubos compartidos entre procesos sobre un archivo SQLite.
+
+    Cada hilo usa su propia conexión; cada consulta es una transacción
+    `BEGIN IMMEDIATE`, así que dos workers no gastan la misma ficha.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute('CREATE TABLE IF NOT EXISTS rate_buckets ('
+                     'key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)')
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def take(self, key, rate, burst):
+        conn = self._conn()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT tokens, updated FROM rate_buckets WHERE key = ?', (key,)).fetchone()
+            tokens, wait = _take_token(*(row or (burst, now)), now, rate, burst)
+            conn.execute('INSERT OR REPLACE INTO rate_buckets (key, tokens, updated) VALUES (?, ?, ?)',
+                         (key, tokens, now))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return wait
+
+    def refund(self, key, burst):
+        self._conn().execute('UPDATE rate_buckets SET tokens = MIN(?, tokens + 1) WHERE key = ?', (burst, key))
+
+
+class TokenBucketLimiter:
+    """Un cubo de fichas por clave, con `burst` de capacidad y `per_minute` de recarga.
+
+    En memoria se guardan como mucho `max_keys` cubos (LRU); uno que se
+    descarta estaba, a efectos prácticos, lleno.
+    """
+
+    def __init__(self, per_minute, burst, max_keys=10000, backend=None):
+        self.rate = per_minute / 60.0
+        self.burst = max(1.0, float(burst))
+        self.max_keys = max_keys
+        self.backend = backend
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {'allowed': 0, RATE_LIMITED: 0, 'refunded': 0, 'backend_errors': 0}
+
+    def check(self, key):
+        """0.0 si `key` puede pasar (y gasta una ficha); si no, segundos hasta la siguiente."""
+        wait = None
+        if self.backend is not None:
+            try:
+                wait = self.backend.take(key, self.rate, self.burst)
+            except sqlite3.Error as e:
+                print(f"Error en los cubos compartidos: {e}")
+                with self._lock:
+                    self._counters['backend_errors'] += 1
+        with self._lock:
+            if wait is None:
+                now = time.monotonic()
+                tokens, updated = self._buckets.pop(key, (self.burst, now))
+                tokens, wait = _take_token(tokens, updated, now, self.rate, self.burst)
+                self._buckets[key] = (tokens, now)
+                while len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            self._counters['allowed' if wait == 0 else RATE_LIMITED] += 1
+        return wait
+
+    def refund(self, key):
+        """Devuelve la ficha que gastó `key` en una petición que no llegó a atenderse."""
+        if self.backend is not None:
+            try:
+                self.backend.refund(key, self.burst)
+            except sqlite3.Error as e:
+                print(f"Error en los cubos compartidos: {e}")
+                with self._lock:
+                    self._counters['backend_errors'] += 1
+        with self._lock:
+            if key in self._buckets:
+                tokens, updated = self._buckets[key]
+                self._buckets[key] = (min(self.burst, tokens + 1), updated)
+            self._counters['refunded'] += 1
+
+    def stats(self):
+        with self._lock:
+            return {**self._counters, 'keys': len(self._buckets),
+                    'per_minute': self.rate * 60, 'burst': self.burst}
+
+
+class Admission:
+    """Hueco concedido a una petición. `release` es idempotente."""
+
+    def __init__(self, limiter, waited, degraded):
+        self.limiter = limiter
+        self.waited = waited
+        self.degraded = degraded
+        self._start = time.monotonic()
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self.limiter.release(time.monotonic() - self._start)
+
+
+class AdmissionController:
+    """Límite de concurrencia por endpoint más límite de ritmo por usuario.
+
+    - limiters: {endpoint: ConcurrencyLimiter}; el resto de endpoints pasa sin control.
+    - rate_limiter: `TokenBucketLimiter` opcional, común a esos endpoints.
+    - degrade: atender en modo degradado lo que tuvo que esperar en la cola.
+    - on_shed(endpoint, reason): se llama por cada petición rechazada.
+    - observe(endpoint, waited, degraded): se llama por cada petición admitida.
+    """
+
+    def __init__(self, limiters, rate_limiter=None, degrade=False, on_shed=None, observe=None):
+        self.limiters = limiters
+        self.rate_limiter = rate_limiter
+        self.degrade = degrade
+        self.on_shed = on_shed
+        self.observe = observe
+
+    def admit(self, endpoint, key=None):
+        """`Admission` si se atiende, None si el endpoint no está controlado; si no, `Overloaded`."""
+        limiter = self.limiters.get(endpoint)
+        if limiter is None:
+            return None
+        charged = self.rate_limiter is not None and key is not None
+        try:
+            if charged:
+                wait = self.rate_limiter.check(key)
+                if wait:
+                    charged = False
+                    raise Overloaded(RATE_LIMITED, min(MAX_RETRY_AFTER, max(1, math.ceil(wait))))
+            waited = limiter.acquire()
+        except Overloaded as e:
+            if charged:
+                # Descartada por saturación, no por el usuario: no cuenta para su ritmo.
+                self.rate_limiter.refund(key)
+            if self.on_shed is not None:
+                self.on_shed(endpoint, e.reason)
+            raise
+        admission = Admission(limiter, waited, degraded=self.degrade and waited > 0)
+        if self.observe is not None:
+            self.observe(endpoint, waited, admission.degraded)
+        return admission
+
+    def stats(self):
+        return {'endpoints': {name: limiter.stats() for name, limiter in self.limiters.items()},
+                'rate_limit': self.rate_limiter.stats() if self.rate_limiter is not None else None,
+                'degrade': self.degrade}
+
+
+def parse_limits(value, queue_timeout):
+    """'predict=4:16,predict_batch=1:2' -> {endpoint: ConcurrencyLimiter}."""
+    limiters = {}
+    for item in value.split(','):
+        if not item.strip():
+            continue
+        endpoint, _, spec = item.partition('=')
+        limit, _, queue = spec.partition(':')
+        limiters[endpoint.strip()] = ConcurrencyLimiter(int(limit), int(queue or 0), queue_timeout)
+    return limiters
+
+
+def admission_from_env(on_shed=None, observe=None):
+    """Crea el controlador según ADMISSION_* y RATE_LIMIT_*.
+
+    Devuelve None si ADMISSION_LIMITS está vacío o es 0.
+    """
+    limits = os.environ.get('ADMISSION_LIMITS', DEFAULT_LIMITS).strip()
+    if limits in ('', '0'):
+        return None
+    try:
+        queue_timeout = float(os.environ.get('ADMISSION_QUEUE_TIMEOUT_MS', '1000')) / 1000
+        limiters = parse_limits(limits, queue_timeout)
+        per_minute = float(os.environ.get('RATE_LIMIT_PER_MINUTE', '0'))
+        burst = float(os.environ.get('RATE_LIMIT_BURST', '20'))
+    except ValueError:
+        print("Advertencia: configuración de admisión no válida; usando valores por defecto.")
+        queue_timeout, per_minute, burst = 1.0, 0.0, 20.0
+        limiters = parse_limits(DEFAULT_LIMITS, queue_timeout)
+    rate_limiter = None
+    if per_minute > 0:
+        db_path = os.environ.get('RATE_LIMIT_DB')
+        rate_limiter = TokenBucketLimiter(per_minute, burst,
+                                          backend=SQLiteBucketBackend(db_path) if db_path else None)
+    degrade = os.environ.get('ADMISSION_DEGRADE', '0').lower() in ('1', 'true', 'yes')
+    return AdmissionController(limiters, rate_limiter, degrade=degrade, on_shed=on_shed, observe=observe)
+
+
+def trusted_proxies_from_env():
+    """Número de proxies inversos de confianza (TRUSTED_PROXIES, 0 por defecto)."""
+    try:
+        return max(0, int(os.environ.get('TRUSTED_PROXIES', '0')))
+    except ValueError:
+        print("Advertencia: valor de entorno TRUSTED_PROXIES no válido; se ignora X-Forwarded-For.")
+        return 0
+
+
+def forwarded_ip(remote_addr, forwarded_for, trusted_proxies):
+    """IP del cliente como la calcula `ProxyFix(x_for=trusted_proxies)`."""
+    if trusted_proxies and forwarded_for:
+        hops = [hop.strip() for hop in forwarded_for.split(',')]
+        if len(hops) >= trusted_proxies:
+            return hops[-trusted_proxies]
+    return remote_addr
+
+
+def rate_key(user_id, ip):
+    """Clave del límite de ritmo: el usuario autenticado o, si no, la IP."""
+    return f'user:{user_id}' if user_id is not None else f'ip:{ip}'
+
+
+# --- Flask ---
+
+def client_key():
+    """`rate_key` de la petición en curso (con ProxyFix, `remote_addr` ya es la del cliente)."""
+    return rate_key(current_user.get_id() if current_user.is_authenticated else None, request.remote_addr)
+
+
+def overloaded_response(e):
+    """429/503 con `Retry-After`: JSON si el cliente lo pide, texto si no."""
+    if request.is_json or request.accept_mimetypes.best == 'application/json':
+        response = jsonify({'error': str(e), 'reason': e.reason, 'retry_after': e.retry_after})
+    else:
+        response = Response(str(e), mimetype='text/plain')
+    response.status_code = e.status_code
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response
+
+
+def is_degraded():
+    """True si la petición en curso se admitió en modo degradado."""
+    admission = g.get('_admission')
+    return bool(admission is not None and admission.degraded)
+
+
+def init_admission(app, controller, trusted_proxies=0):
+    """Aplica `controller` a las peticiones POST de sus endpoints.
+
+    Con `trusted_proxies` > 0 envuelve la app en `ProxyFix` para que la IP
+    de los anónimos sea la de X-Forwarded-For y no la del proxy.
+    """
+    if trusted_proxies:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=trusted_proxies)
+
+    @app.before_request
+    def _admit():
+        if request.method != 'POST':
+            return None
+        try:
+            admission = controller.admit(request.endpoint, client_key())
+        except Overloaded as e:
+            return overloaded_response(e)
+        if admission is not None:
+            g._admission = admission
+        return None
+
+    @app.teardown_request
+    def _release(exc):
+        # Con respuestas en streaming se llama al terminar de enviarlas.
+        admission = g.pop('_admission', None)
+        if admission is not None:
+            admission.release()
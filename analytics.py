@@ -0,0 +1,303 @@
+"""Almacén analítico en SQLite con agregados mantenidos de forma incremental.
+
+Las estadísticas del dashboard no vuelven a leer `data_log.csv` ni
+`user_feedback.csv` en cada visita:
+
+- Las filas nuevas de ambos CSV se incorporan a tablas indexadas
+  (`predictions`, `feedback`) leyendo sólo a partir del último byte
+  procesado, como `incremental_training.py`. Las rotaciones de
+  `data_log.csv` (`.1`, `.2`...) se siguen por inodo.
+- En la misma transacción se actualiza la tabla `aggregates` (dimensión,
+  clave, clase, n): predicciones por clase, por `tipo`, por `marca` y por
+  día, feedback por día y coincidencias entre el modelo y el feedback.
+- `summary()` sólo lee `aggregates`, cuyo tamaño depende del nº de clases,
+  tipos, marcas y días, no del histórico.
+
+La coincidencia compara la clasificación del feedback con la última
+predicción registrada para el mismo `modelo` (sin distinguir mayúsculas).
+
+Uso:
+    python analytics.py              # incorpora lo nuevo e imprime el resumen
+    python analytics.py --rebuild    # reconstruye todo desde los CSV
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from datetime import date, timedelta
+
+from prediction_cache import normalize_text
+from prediction_log import FEEDBACK_COLUMNS, LOG_COLUMNS
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ANALYTICS_DB = os.environ.get('ANALYTICS_DB', os.path.join(BASE_DIR, 'analytics.db'))
+# Como mucho una incorporación de filas nuevas cada tantos segundos por proceso.
+REFRESH_SECONDS = 5.0
+
+SCHEMA = [
+    'CREATE TABLE IF NOT EXISTS predictions ('
+    'id INTEGER PRIMARY KEY, ts TEXT, dia TEXT, tipo TEXT, marca TEXT, modelo TEXT, clase TEXT)',
+    'CREATE INDEX IF NOT EXISTS idx_predictions_dia ON predictions (dia)',
+    'CREATE INDEX IF NOT EXISTS idx_predictions_tipo ON predictions (tipo, clase)',
+    'CREATE INDEX IF NOT EXISTS idx_predictions_marca ON predictions (marca, clase)',
+    'CREATE TABLE IF NOT EXISTS feedback ('
+    'id INTEGER PRIMARY KEY, ts TEXT, dia TEXT, modelo TEXT, clase_real TEXT, clase_modelo TEXT)',
+    'CREATE INDEX IF NOT EXISTS idx_feedback_dia ON feedback (dia)',
+    'CREATE TABLE IF NOT EXISTS last_prediction (modelo TEXT PRIMARY KEY, clase TEXT) WITHOUT ROWID',
+    'CREATE TABLE IF NOT EXISTS aggregates ('
+    'dimension TEXT, clave TEXT, clase TEXT, n INTEGER NOT NULL, '
+    'PRIMARY KEY (dimension, clave, clase)) WITHOUT ROWID',
+    'CREATE TABLE IF NOT EXISTS ingest_state ('
+    'source TEXT PRIMARY KEY, inode INTEGER, offset INTEGER NOT NULL)',
+]
+
+
+def _read_delta(path, offset):
+    """Bytes completos (hasta el último salto de línea) desde `offset`. Devuelve (texto, nuevo_offset)."""
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        data = f.read()
+    end = data.rfind(b'\n') + 1
+    return data[:end].decode('utf-8-sig', errors='replace'), offset + end
+
+
+def _chain(path):
+    """`path` y sus rotaciones (`.1`, `.2`...), de la más antigua a la actual."""
+    directory, name = os.path.split(os.path.abspath(path))
+    backups = []
+    try:
+        for entry in os.listdir(directory):
+            suffix = entry[len(name) + 1:]
+            if entry.startswith(name + '.') and suffix.isdigit():
+                backups.append((int(suffix), os.path.join(directory, entry)))
+    except OSError:
+        pass
+    return [p for _, p in sorted(backups, reverse=True)] + [path]
+
+
+def _rows(text, columns, sep, skip_header):
+    reader = csv.reader(io.StringIO(text), delimiter=sep)
+    for values in reader:
+        if skip_header and values == columns:
+            skip_header = False
+            continue
+        skip_header = False
+        if len(values) >= len(columns):
+            yield dict(zip(columns, values))
+
+
+class AnalyticsStore:
+    """Tablas analíticas de predicciones y feedback y sus agregados.
+
+    - path: archivo SQLite.
+    - predictions_path / feedback_path: los CSV de origen.
+    - refresh_seconds: intervalo mínimo entre incorporaciones en `maybe_refresh`.
+    """
+
+    def __init__(self, path, predictions_path, feedback_path, refresh_seconds=REFRESH_SECONDS):
+        self.path = path
+        self.sources = {
+            'predictions': (predictions_path, LOG_COLUMNS, ','),
+            'feedback': (feedback_path, FEEDBACK_COLUMNS, ';'),
+        }
+        self.refresh_seconds = refresh_seconds
+        self._local = threading.local()
+        self._next_refresh = 0.0
+        self._refresh_lock = threading.Lock()
+
+    # --- Conexiones ---
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            for statement in SCHEMA:
+                conn.execute(statement)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    # --- Incorporación ---
+    def maybe_refresh(self):
+        """`refresh()` como mucho cada `refresh_seconds`; sin bloquear si ya hay una en curso."""
+        now = time.monotonic()
+        if now < self._next_refresh or not self._refresh_lock.acquire(blocking=False):
+            return None
+        try:
+            self._next_refresh = now + self.refresh_seconds
+            return self.refresh()
+        finally:
+            self._refresh_lock.release()
+
+    def refresh(self):
+        """Incorpora las filas nuevas de los CSV. Devuelve cuántas de cada tipo."""
+        conn = self._conn()
+        added = {}
+        # Predicciones antes que feedback: el feedback se compara con la última predicción.
+        for source in ('predictions', 'feedback'):
+            # BEGIN IMMEDIATE serializa a los workers: el segundo ve el offset ya avanzado.
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                rows = self._pending_rows(conn, source)
+                if source == 'predictions':
+                    added[source] = self._add_predictions(conn, rows)
+                else:
+                    added[source] = self._add_feedback(conn, rows)
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        return added
+
+    def _pending_rows(self, conn, source):
+        path, columns, sep = self.sources[source]
+        state = conn.execute('SELECT inode, offset FROM ingest_state WHERE source = ?', (source,)).fetchone()
+        inode, offset = state if state else (None, 0)
+        if not os.path.exists(path):
+            return []
+        chain = _chain(path)
+        inodes = []
+        for p in chain:
+            try:
+                inodes.append(os.stat(p).st_ino)
+            except OSError:
+                inodes.append(None)
+        if inode is None:
+            start = 0  # primera vez: también las rotaciones que ya existían
+        elif inode in inodes:
+            start = inodes.index(inode)  # el archivo seguido pudo haber rotado a `.N`
+        else:
+            start, offset = len(chain) - 1, 0  # se perdió (borrado): seguir por el actual
+        texts = []
+        for i, p in enumerate(chain[start:], start):
+            read_from = offset if i == start else 0
+            if read_from and os.path.getsize(p) < read_from:
+                read_from = 0  # truncado o reemplazado
+            text, new_offset = _read_delta(p, read_from)
+            texts.append((text, read_from == 0))
+        conn.execute('INSERT INTO ingest_state (source, inode, offset) VALUES (?, ?, ?) '
+                     'ON CONFLICT (source) DO UPDATE SET inode = excluded.inode, offset = excluded.offset',
+                     (source, inodes[-1], new_offset))
+        return [row for text, header in texts for row in _rows(text, columns, sep, header)]
+
+    @staticmethod
+    def _bump(conn, counts):
+        conn.executemany('INSERT INTO aggregates (dimension, clave, clase, n) VALUES (?, ?, ?, ?) '
+                         'ON CONFLICT (dimension, clave, clase) DO UPDATE SET n = n + excluded.n',
+                         [(*key, n) for key, n in counts.items()])
+
+    def _add_predictions(self, conn, rows):
+        counts = Counter()
+        records, latest = [], {}
+        for row in rows:
+            clase = row['prediccion_ml'].strip()
+            if not row['modelo'].strip() or not clase or clase.startswith('Error'):
+                continue
+            ts = row['timestamp']
+            dia = ts[:10]
+            tipo = row['tipo'].strip() or 'desconocido'
+            marca = row['marca'].strip() or 'desconocida'
+            records.append((ts, dia, tipo, marca, row['modelo'], clase))
+            latest[normalize_text(row['modelo'])] = clase
+            counts['clase', '', clase] += 1
+            counts['tipo', tipo, clase] += 1
+            counts['marca', marca, clase] += 1
+            counts['dia', dia, clase] += 1
+        conn.executemany('INSERT INTO predictions (ts, dia, tipo, marca, modelo, clase) VALUES (?, ?, ?, ?, ?, ?)',
+                         records)
+        conn.executemany('INSERT OR REPLACE INTO last_prediction (modelo, clase) VALUES (?, ?)',
+                         list(latest.items()))
+        self._bump(conn, counts)
+        return len(records)
+
+    def _add_feedback(self, conn, rows):
+        counts = Counter()
+        records = []
+        for row in rows:
+            modelo, real = row['modelo'].strip(), row['clasificacion_real'].strip()
+            if not modelo or not real:
+                continue
+            ts = row['timestamp']
+            found = conn.execute('SELECT clase FROM last_prediction WHERE modelo = ?',
+                                 (normalize_text(modelo),)).fetchone()
+            predicted = found[0] if found else None
+            if predicted is None:
+                outcome = 'sin_prediccion'
+            elif predicted.lower() == real.lower():
+                outcome = 'coincide'
+            else:
+                outcome = 'difiere'
+            records.append((ts, ts[:10], modelo, real, predicted))
+            counts['feedback_dia', ts[:10], ''] += 1
+            counts['acuerdo', outcome, ''] += 1
+        conn.executemany('INSERT INTO feedback (ts, dia, modelo, clase_real, clase_modelo) VALUES (?, ?, ?, ?, ?)',
+                         records)
+        self._bump(conn, counts)
+        return len(records)
+
+    def rebuild(self):
+        """Vacía las tablas y vuelve a incorporar los CSV desde el principio."""
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        for table in ('predictions', 'feedback', 'last_prediction', 'aggregates', 'ingest_state'):
+            conn.execute(f'DELETE FROM {table}')
+        conn.execute('COMMIT')
+        return self.refresh()
+
+    # --- Consultas ---
+    def summary(self, days=30):
+        """Resumen para el dashboard, calculado sólo a partir de `aggregates`."""
+        since = (date.today() - timedelta(days=days - 1)).isoformat()
+        rows = self._conn().execute(
+            "SELECT dimension, clave, clase, n FROM aggregates "
+            "WHERE dimension NOT IN ('dia', 'feedback_dia') OR clave >= ?", (since,)).fetchall()
+        por_clase, por_tipo, por_marca, por_dia, feedback_dia, acuerdo = {}, {}, {}, {}, {}, {}
+        for dimension, clave, clase, n in rows:
+            if dimension == 'clase':
+                por_clase[clase] = n
+            elif dimension == 'tipo':
+                por_tipo.setdefault(clave, {})[clase] = n
+            elif dimension == 'marca':
+                por_marca.setdefault(clave, {})[clase] = n
+            elif dimension == 'dia':
+                por_dia.setdefault(clave, {})[clase] = n
+            elif dimension == 'feedback_dia':
+                feedback_dia[clave] = n
+            elif dimension == 'acuerdo':
+                acuerdo[clave] = n
+        compared = acuerdo.get('coincide', 0) + acuerdo.get('difiere', 0)
+        return {
+            'total_predicciones': sum(por_clase.values()),
+            'total_feedback': sum(acuerdo.values()),
+            'por_clase': por_clase,
+            'por_tipo': por_tipo,
+            'por_marca': por_marca,
+            'por_dia': [{'dia': dia, **counts} for dia, counts in sorted(por_dia.items())],
+            'feedback_por_dia': [{'dia': dia, 'n': n} for dia, n in sorted(feedback_dia.items())],
+            'acuerdo': {**{k: acuerdo.get(k, 0) for k in ('coincide', 'difiere', 'sin_prediccion')},
+                        'tasa': acuerdo.get('coincide', 0) / compared if compared else None},
+            'dias': days,
+        }
+
+
+def main(argv=None):
+    from predict import CSV_FILE
+    parser = argparse.ArgumentParser(description="Almacén analítico de DonApp")
+    parser.add_argument('--rebuild', action='store_true', help="reconstruir desde los CSV")
+    parser.add_argument('--days', type=int, default=30)
+    args = parser.parse_args(argv)
+    store = AnalyticsStore(ANALYTICS_DB, CSV_FILE, os.path.join(BASE_DIR, 'user_feedback.csv'))
+    start = time.perf_counter()
+    added = store.rebuild() if args.rebuild else store.refresh()
+    print(f"Filas incorporadas: {added} en {time.perf_counter() - start:.2f} s")
+    print(json.dumps(store.summary(args.days), indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,17 +1,30 @@
-from flask import Flask, render_template, redirect, url_for, request, flash, jsonify, send_from_directory, send_file
+# Primero: mide cuánto tarda cada fase del arranque (ver startup.py).
+from startup import startup_timer, load_mode_from_env
+from flask import Flask, render_template, redirect, url_for, request, flash, jsonify, send_from_directory, send_file, Response, stream_with_context, make_response
 from flask_login import login_user, logout_user, login_required, current_user
-from werkzeug.security import check_password_hash
-from predict import save_data_to_csv, simulate_prediction, generate_prediction_pdf
-from user_model import get_user_by_username, add_new_user
+from prediction_log import get_feedback_log
+from analytics import ANALYTICS_DB, AnalyticsStore
+from predict import CSV_FILE, save_data_to_csv, simulate_prediction, generate_prediction_pdf, report_filename
+from user_model import get_user_by_username, add_new_user, check_user_password
 from login import init_login
+from static_assets import init_static
+from inference import InferenceEngine
+from artifact_registry import ArtifactRegistry
+from prediction_cache import cache_from_env
+from microbatch import batcher_from_env
+from admission import admission_from_env, init_admission, is_degraded, trusted_proxies_from_env
+from pdf_cleanup import ExpiryScheduler
+from pdf_jobs import PDFJobQueue, QueueFullError, DONE as PDF_DONE, QUEUED as PDF_QUEUED
+from batch_predict import OUTPUT_FORMATS, read_csv_records, predict_records, format_rows
+from metrics import REGISTRY, init_metrics, observe_stage, profiler_from_env, stage
 
-import joblib
-import pandas as pd
 import os
-import uuid
 import threading
 import time
-from io import BytesIO
+from datetime import datetime
+from io import TextIOWrapper
+
+startup_timer.mark('imports')
 
 # Tiempo en segundos para conservar un PDF descargable antes de eliminarlo.
 # Cambia `PDF_RETENTION_SECONDS` si quieres ajustar el periodo de reintentos.
@@ -32,6 +45,10 @@ app.config['SECRET_KEY'] = 'mi_clave_secreta_super_segura_123'
 # Inicializar Flask-Login (login.py debe definir user_loader)
 init_login(app)
 
+# Estáticos con hash en el nombre, minificados y precomprimidos en static/dist/
+# (se reconstruyen al arrancar si cambió algo; STATIC_FINGERPRINT=0 lo desactiva).
+static_manifest = init_static(app)
+
 # --- RUTAS DE AUTENTICACIÓN Y PÁGINAS ---
 @app.route('/', methods=['GET'])
 def root():
@@ -47,7 +64,7 @@ def login():
         username = request.form.get('username')
         password = request.form.get('password')
         user = get_user_by_username(username)
-        if user and check_password_hash(user.password_hash, password):
+        if user and check_user_password(user, password):
             login_user(user)
             next_page = request.args.get('next')
             return redirect(next_page or url_for('index'))
@@ -101,20 +118,161 @@ ENCODER_FILENAME = os.path.join(BASE_DIR, 'donapp_label_encoder.joblib')
 DATA_DIR = os.path.join(BASE_DIR, 'data')
 DATA_FILE = os.path.join(DATA_DIR, 'donapp_data_tecnico.csv')
 FEEDBACK_FILE = os.path.join(BASE_DIR, 'user_feedback.csv')
+# El feedback se encola y un hilo lo escribe por lotes (FEEDBACK_FLUSH_INTERVAL,
+# FEEDBACK_BATCH_SIZE, FEEDBACK_FSYNC); /feedback no espera al disco.
+feedback_log = get_feedback_log(FEEDBACK_FILE)
+FEEDBACK_BATCH_MAX = 1000
+
+# Estadísticas del dashboard: tablas SQLite con agregados que se actualizan
+# sólo con las filas nuevas de data_log.csv y user_feedback.csv (ANALYTICS_DB).
+analytics = AnalyticsStore(ANALYTICS_DB, CSV_FILE, FEEDBACK_FILE)
+
+# Motor de inferencia: los artefactos se cargan y calientan una sola vez por proceso
+# y se recargan solos cuando se publica una versión nueva en `artifacts/`.
+# La caché de predicciones se configura con PREDICTION_CACHE_SIZE/_TTL/_DB.
+engine = InferenceEngine(MODEL_FILENAME, VECTORIZER_FILENAME, ENCODER_FILENAME, cache=cache_from_env(),
+                         registry=ArtifactRegistry())
+# Micro-batching: los fallos de caché concurrentes se predicen juntos en un
+# solo lote (PREDICT_BATCH_MAX filas o PREDICT_BATCH_WAIT_MS de espera).
+PREDICT_BATCH_SIZE = REGISTRY.histogram('donapp_predict_batch_size', 'Filas por lote de predicción.',
+                                        buckets=(1, 2, 4, 8, 16, 32, 64, 128))
+
+
+def _observe_batch(size, waited):
+    PREDICT_BATCH_SIZE.observe(size)
+    observe_stage('batch_wait', waited)
+
+
+engine.batcher = batcher_from_env(engine.predict_many, observe=_observe_batch)
+# MODEL_LOAD_MODE: eager (al importar; el modo de gunicorn con preload_app),
+# background (hilo de precarga, por defecto) o lazy (en la primera petición).
+# /predict espera al modelo como mucho MODEL_READY_TIMEOUT segundos.
+MODEL_LOAD_MODE = load_mode_from_env()
+try:
+    MODEL_READY_TIMEOUT = float(os.environ.get('MODEL_READY_TIMEOUT', '30'))
+except ValueError:
+    print("Advertencia: valor de entorno MODEL_READY_TIMEOUT no válido; usando 30 segundos.")
+    MODEL_READY_TIMEOUT = 30.0
+startup_timer.mark('config')
+if MODEL_LOAD_MODE == 'eager':
+    engine.load_now()
+    startup_timer.mark('model')
+elif MODEL_LOAD_MODE == 'background':
+    engine.start_loading()
+
+# Cola de informes PDF (fuera del camino crítico de /predict).
+# Configurable con PDF_WORKERS, PDF_QUEUE_SIZE y PDF_QUEUE_TIMEOUT.
+PDF_DIR = os.path.join(BASE_DIR, 'tmp_pdfs')
+PDF_RETRY_AFTER_SECONDS = 5
+# Vida máxima de un PDF que nunca se descarga (antes lo hacía un hilo que
+# recorría `tmp_pdfs/` cada 10 minutos). Configurable con PDF_MAX_AGE_SECONDS.
+try:
+    PDF_MAX_AGE_SECONDS = int(os.environ.get('PDF_MAX_AGE_SECONDS', '3600'))
+except ValueError:
+    print("Advertencia: valor de entorno PDF_MAX_AGE_SECONDS no válido; usando 3600 segundos.")
+    PDF_MAX_AGE_SECONDS = 3600
+# Un único planificador de borrados por proceso; arranca en el primer uso,
+# también bajo gunicorn.
+pdf_expiry = ExpiryScheduler(PDF_DIR, max_age_seconds=PDF_MAX_AGE_SECONDS)
+try:
+    pdf_jobs = PDFJobQueue(generate_prediction_pdf, PDF_DIR,
+                           workers=int(os.environ.get('PDF_WORKERS', '2')),
+                           max_queue=int(os.environ.get('PDF_QUEUE_SIZE', '32')),
+                           submit_timeout=float(os.environ.get('PDF_QUEUE_TIMEOUT', '0.5')),
+                           on_written=pdf_expiry.track, observe=observe_stage)
+except ValueError:
+    print("Advertencia: configuración de la cola de PDFs no válida; usando valores por defecto.")
+    pdf_jobs = PDFJobQueue(generate_prediction_pdf, PDF_DIR, on_written=pdf_expiry.track, observe=observe_stage)
+
+# Métricas en /metrics y perfilado por muestreo (PROFILE_SAMPLE_RATE, o
+# `POST /metrics/profile` con X-Admin-Token = PROFILE_ADMIN_TOKEN para
+# cambiarlo en caliente en todos los workers, hasta PROFILE_MAX_RATE).
+init_metrics(app, profiler=profiler_from_env(BASE_DIR), admin_token=os.environ.get('PROFILE_ADMIN_TOKEN'))
+REGISTRY.callback('donapp_prediction_cache_hits_total', 'Aciertos de la caché de predicciones.',
+                  lambda: _cache_stat('hits') + _cache_stat('shared_hits'), kind='counter')
+REGISTRY.callback('donapp_prediction_cache_misses_total', 'Fallos de la caché de predicciones.',
+                  lambda: _cache_stat('misses'), kind='counter')
+REGISTRY.callback('donapp_predictions_total', 'Predicciones calculadas por el modelo.',
+                  lambda: engine.stats()['predictions'], kind='counter')
+REGISTRY.callback('donapp_model_reloads_total', 'Recargas del modelo en caliente.',
+                  lambda: engine.stats()['reloads'], kind='counter')
+REGISTRY.callback('donapp_predict_batch_queue_depth', 'Predicciones esperando a entrar en un lote.',
+                  lambda: _batch_stat('queue_depth'))
+REGISTRY.callback('donapp_predict_batches_total', 'Lotes de predicción ejecutados.',
+                  lambda: _batch_stat('batches'), kind='counter')
+REGISTRY.callback('donapp_model_ready', 'Modelo cargado (1) o no (0).', lambda: int(engine.ready))
+REGISTRY.callback('donapp_tmp_pdfs_bytes', 'Bytes ocupados por los PDFs en tmp_pdfs/.',
+                  lambda: pdf_expiry.stats()['bytes_on_disk'])
+REGISTRY.callback('donapp_tmp_pdfs_files', 'PDFs presentes en tmp_pdfs/.',
+                  lambda: pdf_expiry.stats()['tracked_files'])
+REGISTRY.callback('donapp_pdf_queue_depth', 'Trabajos de PDF esperando en la cola.',
+                  lambda: pdf_jobs.stats()['queue_depth'])
+REGISTRY.callback('donapp_pdf_jobs_total', 'Trabajos de PDF por resultado.',
+                  lambda: {k: v for k, v in pdf_jobs.stats().items()
+                           if k in ('submitted', 'completed', 'failed', 'rejected')},
+                  kind='counter', labelname='result')
+FEEDBACK_ITEMS = REGISTRY.counter('donapp_feedback_items_total', 'Feedbacks recibidos por resultado.',
+                                  ('result',))
+REGISTRY.callback('donapp_feedback_pending', 'Feedbacks en memoria esperando a escribirse.',
+                  feedback_log.pending)
+REGISTRY.callback('donapp_threads', 'Hilos vivos en el proceso.', threading.active_count)
+REGISTRY.callback('donapp_startup_phase_seconds', 'Duración de cada fase del arranque de la app.',
+                  lambda: dict(startup_timer.phases), labelname='phase')
+REGISTRY.callback('donapp_model_load_seconds', 'Duración de la última carga del modelo.',
+                  lambda: engine.stats()['load_ms'] / 1000)
+
+# Control de admisión: límite de concurrencia con cola acotada por endpoint y
+# de ritmo por usuario; lo que no cabe recibe 503/429 con Retry-After en lugar
+# de esperar hasta el timeout del worker. Ver admission.py (ADMISSION_LIMITS,
+# ADMISSION_QUEUE_TIMEOUT_MS, ADMISSION_DEGRADE, RATE_LIMIT_PER_MINUTE...).
+# Detrás de un proxy inverso, TRUSTED_PROXIES=n toma la IP de X-Forwarded-For.
+TRUSTED_PROXIES = trusted_proxies_from_env()
+ADMISSION_SHED = REGISTRY.counter('donapp_admission_shed_total',
+                                  'Peticiones rechazadas por el control de admisión.', ('endpoint', 'reason'))
+ADMISSION_QUEUE_SECONDS = REGISTRY.histogram('donapp_admission_queue_seconds',
+                                             'Espera en la cola de admisión de las peticiones admitidas.',
+                                             ('endpoint',))
+ADMISSION_DEGRADED = REGISTRY.counter('donapp_admission_degraded_total',
+                                      'Peticiones admitidas en modo degradado (sin PDF).', ('endpoint',))
+
+
+def _on_shed(endpoint, reason):
+    ADMISSION_SHED.inc(endpoint=endpoint, reason=reason)
+
+
+def _observe_admission(endpoint, waited, degraded):
+    ADMISSION_QUEUE_SECONDS.observe(waited, endpoint=endpoint)
+    if degraded:
+        ADMISSION_DEGRADED.inc(endpoint=endpoint)
+
+
+admission = admission_from_env(on_shed=_on_shed, observe=_observe_admission)
+if admission is not None:
+    init_admission(app, admission, TRUSTED_PROXIES)
+REGISTRY.callback('donapp_admission_in_flight', 'Peticiones atendiéndose por endpoint controlado.',
+                  lambda: _admission_stat('in_flight'), labelname='endpoint')
+REGISTRY.callback('donapp_admission_queue_depth', 'Peticiones esperando en la cola de admisión.',
+                  lambda: _admission_stat('queue_depth'), labelname='endpoint')
+startup_timer.mark('services')
+
+
+def _cache_stat(key):
+    cache_stats = engine.stats().get('cache')
+    return cache_stats[key] if cache_stats else 0
+
+
+def _batch_stat(key):
+    return engine.batcher.stats()[key] if engine.batcher is not None else 0
+
+
+def _admission_stat(key):
+    if admission is None:
+        return {}
+    return {endpoint: stats[key] for endpoint, stats in admission.stats()['endpoints'].items()}
 
-def safe_load(path):
-    if not os.path.exists(path):
-        return None
-    try:
-        return joblib.load(path)
-    except Exception:
-        return None
-
-model = safe_load(MODEL_FILENAME)
-tfidf_vectorizer = safe_load(VECTORIZER_FILENAME)
-label_encoder = safe_load(ENCODER_FILENAME)
 
 def ensure_data_file():
+    import pandas as pd
     os.makedirs(DATA_DIR, exist_ok=True)
     if not os.path.exists(DATA_FILE):
         header = ['id_usuario','nombre_usuario','tipo_usuario','tipo','marca','modelo','anio',
@@ -136,13 +294,19 @@ def predict():
         return render_template('predict.html')
 
     # POST: Obtener todos los datos del formulario
-    form_data = request.form.to_dict()
-    print("Datos recibidos:", form_data)
+    with stage('form_parse'):
+        form_data = request.form.to_dict()
 
     # 1. Realizar la Predicción (usando el campo 'modelo')
     modelo_text = form_data.get('modelo', '')
+    top_k = []
     if not modelo_text:
         prediction_result = "Error: El campo 'modelo' es obligatorio."
+    elif engine.ensure_loaded(MODEL_READY_TIMEOUT):
+        with stage('prediction'):
+            result = engine.predict(form_data)
+        prediction_result = result['label']
+        top_k = result['top_k']
     else:
         prediction_result = simulate_prediction(modelo_text)
 
@@ -151,26 +315,40 @@ def predict():
 
     # 3. Guardar los datos completos (incluida la predicción)
     try:
-        save_data_to_csv(form_data)
+        with stage('csv_write'):
+            save_data_to_csv(form_data)
     except Exception as e:
         print(f"Error al guardar en CSV: {e}")
 
-    # 4. Generar PDF y devolverlo como descarga
+    # 4. Informe direccionado por contenido: un envío idéntico reutiliza el PDF
+    # existente. Si no existe, se encola y la página consulta su estado.
+    # La marca de tiempo queda fuera del informe para que el contenido sea estable.
+    pdf_data = {k: v for k, v in form_data.items() if k != 'timestamp'}
+    filename = report_filename(pdf_data, prediction_result)
+    file_path = os.path.join(PDF_DIR, filename)
+    if os.path.exists(file_path):
+        pdf_expiry.track(file_path)
+        with stage('template_render'):
+            return render_template('predict_result.html', modelo=modelo_text, prediction=prediction_result,
+                                   top_k=top_k, pdf_ready=True, status_url=None,
+                                   download_url=url_for('download_pdf', filename=filename))
+    if is_degraded():
+        # Bajo carga (ADMISSION_DEGRADE): la predicción sí, el informe no.
+        with stage('template_render'):
+            return render_template('predict_result.html', modelo=modelo_text, prediction=prediction_result,
+                                   top_k=top_k, status_url=None, download_url=None)
     try:
-        pdf_buffer = generate_prediction_pdf(form_data, prediction_result)
-        # Guardar el PDF en un archivo temporal dentro del proyecto
-        tmp_dir = os.path.join(BASE_DIR, 'tmp_pdfs')
-        os.makedirs(tmp_dir, exist_ok=True)
-        filename = f"pred_{uuid.uuid4().hex}.pdf"
-        file_path = os.path.join(tmp_dir, filename)
-        with open(file_path, 'wb') as f:
-            f.write(pdf_buffer.getvalue())
-
-        # Renderizar página de resultado con enlace de descarga
-        download_url = url_for('download_pdf', filename=filename)
-        return render_template('predict_result.html', modelo=modelo_text, prediction=prediction_result, download_url=download_url)
+        with stage('pdf_enqueue'):
+            pdf_jobs.submit(pdf_data, prediction_result, filename=filename)
+    except QueueFullError:
+        # Contrapresión: se muestra la predicción, pero sin informe.
+        response = make_response(render_template('predict_result.html', modelo=modelo_text,
+                                                  prediction=prediction_result, top_k=top_k,
+                                                  status_url=None, download_url=None), 503)
+        response.headers['Retry-After'] = str(PDF_RETRY_AFTER_SECONDS)
+        return response
     except Exception as e:
-        print(f"Error al generar/servir el PDF: {e}")
+        print(f"Error al encolar el PDF: {e}")
         # Caer a una respuesta simple si falla la generación del PDF
         success_message = f"""
         <h1>✅ Predicción Exitosa</h1>
@@ -182,113 +360,165 @@ def predict():
         """
         return success_message
 
+    with stage('template_render'):
+        return render_template('predict_result.html', modelo=modelo_text, prediction=prediction_result,
+                               top_k=top_k, status_url=url_for('pdf_status', filename=filename),
+                               download_url=url_for('download_pdf', filename=filename))
+
+@app.route('/pdf_status/<filename>')
+def pdf_status(filename):
+    """Estado del informe `filename`: queued, rendering, done o error.
+
+    Responde cualquier worker: si el trabajo lo encoló otro, el estado sale
+    de si el PDF ya está en PDF_DIR (ver `PDFJobQueue.status_for`).
+    """
+    if os.path.basename(filename) != filename:
+        return jsonify({'error': 'Informe no encontrado.'}), 404
+    status = pdf_jobs.status_for(filename)
+    body = {'filename': filename, 'state': status['state'], 'error': status['error']}
+    if status['state'] == PDF_DONE:
+        body['download_url'] = url_for('download_pdf', filename=filename)
+    elif status['state'] == PDF_QUEUED and status['known']:
+        body['queue_depth'] = pdf_jobs.stats()['queue_depth']
+    return jsonify(body)
+
+@app.route('/predict/batch', methods=['POST'])
+def predict_batch():
+    """Clasifica un lote de equipos y devuelve el resultado en streaming.
+
+    Acepta una lista JSON de registros (o {"records": [...]}) o un CSV con el
+    esquema de `donapp_data_tecnico.csv`. `?format=ndjson|csv` elige la salida.
+    """
+    if not engine.ensure_loaded(MODEL_READY_TIMEOUT):
+        return jsonify({'error': 'El modelo no está cargado.'}), 503
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in OUTPUT_FORMATS:
+        return jsonify({'error': f'Formato no soportado: {fmt}'}), 400
+
+    if request.is_json:
+        data = request.get_json(silent=True)
+        if isinstance(data, dict):
+            data = data.get('records')
+        if not isinstance(data, list):
+            return jsonify({'error': 'Se esperaba una lista de registros.'}), 400
+        # Se valida antes de empezar a responder: con el streaming en marcha ya no cabe un 400.
+        invalid = [i for i, record in enumerate(data) if not isinstance(record, dict)]
+        if invalid:
+            return jsonify({'error': 'Cada registro debe ser un objeto JSON.', 'indices': invalid[:20]}), 400
+        records = iter(data)
+    else:
+        records = read_csv_records(TextIOWrapper(request.stream, encoding='utf-8-sig', newline=''))
+
+    rows = predict_records(engine, records)
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    return Response(stream_with_context(format_rows(rows, fmt)), mimetype=mimetype)
+
+@app.route('/model/info')
+def model_info():
+    """Estado del motor de inferencia y coste acumulado de las predicciones."""
+    return jsonify({**engine.stats(), 'load_mode': MODEL_LOAD_MODE, 'startup': startup_timer.report()})
+
+def _feedback_row(item):
+    """Fila para `user_feedback.csv` o (None, error) si faltan campos."""
+    if not isinstance(item, dict):
+        return None, 'Se esperaba un objeto JSON.'
+    modelo = item.get('modelo')
+    clasificacion_real = item.get('clasificacion_real')
+    if not modelo or not clasificacion_real:
+        return None, 'Modelo y clasificación real son requeridos.'
+    return {'modelo': modelo, 'clasificacion_real': clasificacion_real,
+            'timestamp': datetime.now().isoformat(sep=' ')}, None
+
 @app.route('/feedback', methods=['POST'])
 def receive_feedback():
+    """Encola el feedback y responde 202; un hilo lo escribe por lotes en `user_feedback.csv`."""
+    row, error = _feedback_row(request.get_json(force=True, silent=True))
+    if error:
+        FEEDBACK_ITEMS.inc(result='rejected')
+        return jsonify({'error': error}), 400
+    feedback_log.append(row)
+    FEEDBACK_ITEMS.inc(result='accepted')
+    return jsonify({'message': 'Feedback recibido', 'modelo': row['modelo'],
+                    'real': row['clasificacion_real']}), 202
+
+@app.route('/feedback/batch', methods=['POST'])
+def receive_feedback_batch():
+    """Varios feedbacks en una petición: lista JSON o {"items": [...]}.
+
+    Se aceptan los válidos y se informa el índice y el motivo de cada rechazo.
+    """
+    data = request.get_json(force=True, silent=True)
+    if isinstance(data, dict):
+        data = data.get('items')
+    if not isinstance(data, list):
+        return jsonify({'error': 'Se esperaba una lista de feedbacks.'}), 400
+    if len(data) > FEEDBACK_BATCH_MAX:
+        return jsonify({'error': f'Máximo {FEEDBACK_BATCH_MAX} feedbacks por petición.'}), 413
+    accepted, rejected = 0, []
+    for index, item in enumerate(data):
+        row, error = _feedback_row(item)
+        if error:
+            rejected.append({'index': index, 'error': error})
+            continue
+        feedback_log.append(row)
+        accepted += 1
+    FEEDBACK_ITEMS.inc(accepted, result='accepted')
+    FEEDBACK_ITEMS.inc(len(rejected), result='rejected')
+    return jsonify({'accepted': accepted, 'rejected': rejected}), 202
+
+@app.route('/api/dashboard')
+@login_required
+def dashboard_data():
+    """Agregados para el dashboard (`?days=30` limita las series diarias)."""
+    start = time.perf_counter()
     try:
-        data = request.get_json(force=True)
-        modelo = data.get('modelo')
-        clasificacion_real = data.get('clasificacion_real')
-        if not modelo or not clasificacion_real:
-            return jsonify({'error': 'Modelo y clasificación real son requeridos.'}), 400
-
-        new_data = pd.DataFrame({
-            'modelo': [modelo],
-            'clasificacion_real': [clasificacion_real],
-            'timestamp': [pd.Timestamp.now()]
-        })
-
-        if os.path.exists(FEEDBACK_FILE):
-            new_data.to_csv(FEEDBACK_FILE, mode='a', header=False, index=False, sep=';')
-        else:
-            new_data.to_csv(FEEDBACK_FILE, mode='w', header=True, index=False, sep=';')
-
-        return jsonify({'message': 'Feedback guardado correctamente', 'modelo': modelo, 'real': clasificacion_real}), 200
-
+        analytics.maybe_refresh()
     except Exception as e:
-        return jsonify({'error': f'Error al procesar el feedback: {str(e)}'}), 500
+        # Se sirven los agregados que ya hay; se reintentará en la próxima petición.
+        print(f"Error al actualizar las estadísticas: {e}")
+    days = min(max(request.args.get('days', 30, type=int), 1), 365)
+    summary = analytics.summary(days)
+    summary['elapsed_ms'] = round((time.perf_counter() - start) * 1000, 2)
+    return jsonify(summary)
 
 @app.route('/casuistica')
 def casuistica():
     return render_template('casuistica.html')
 
 
+@app.route('/pdf_stats')
+def pdf_stats():
+    """Métricas de la cola de PDFs y de los borrados pendientes en `tmp_pdfs/`."""
+    return jsonify({'jobs': pdf_jobs.stats(), 'expiry': pdf_expiry.stats()})
+
 @app.route('/download_pdf/<filename>')
 def download_pdf(filename):
-    tmp_dir = os.path.join(BASE_DIR, 'tmp_pdfs')
-    file_path = os.path.join(tmp_dir, filename)
-    if not os.path.exists(file_path):
+    """Sirve el PDF directamente desde disco.
+
+    `send_from_directory` usa el file wrapper del servidor (sendfile en
+    gunicorn), sin copiar el archivo en memoria, y con `conditional=True`
+    responde a Range e If-None-Match. El nombre ya es un hash del contenido,
+    así que sirve como ETag.
+    """
+    file_path = os.path.join(PDF_DIR, filename)
+    if not os.path.isfile(file_path):
         return "Archivo no encontrado", 404
     try:
-        # Leer el archivo en memoria
-        with open(file_path, 'rb') as f:
-            data = f.read()
-
         # Programar la eliminación diferida del archivo para permitir reintentos
         # Usa la constante `PDF_RETENTION_SECONDS` definida al inicio del archivo.
-        _schedule_delete(file_path, delay_seconds=PDF_RETENTION_SECONDS)
-
-        bio = BytesIO(data)
-        bio.seek(0)
-        try:
-            return send_file(bio, as_attachment=True, download_name=filename, mimetype='application/pdf')
-        except TypeError:
-            return send_file(bio, as_attachment=True, attachment_filename=filename, mimetype='application/pdf')
+        pdf_expiry.schedule(file_path, PDF_RETENTION_SECONDS)
+
+        etag = os.path.splitext(filename)[0]
+        return send_from_directory(PDF_DIR, filename, as_attachment=True, download_name=filename,
+                                   mimetype='application/pdf', conditional=True, etag=etag)
     except Exception as e:
         print(f"Error al enviar el PDF: {e}")
         return "Error al descargar el archivo", 500
 
 
-def _tmp_pdfs_cleaner(interval_seconds: int = 600, max_age_seconds: int = 3600):
-    """Hilo demonio que limpia archivos en `tmp_pdfs/` más antiguos que `max_age_seconds`.
+startup_timer.mark('routes')
+startup_timer.finish()
 
-    - interval_seconds: cada cuántos segundos revisa (por defecto 600s = 10min)
-    - max_age_seconds: edad máxima permitida (por defecto 3600s = 1h)
-    """
-    tmp_dir = os.path.join(BASE_DIR, 'tmp_pdfs')
-    os.makedirs(tmp_dir, exist_ok=True)
-    while True:
-        try:
-            now = time.time()
-            for fname in os.listdir(tmp_dir):
-                fpath = os.path.join(tmp_dir, fname)
-                try:
-                    mtime = os.path.getmtime(fpath)
-                    age = now - mtime
-                    if age > max_age_seconds:
-                        os.remove(fpath)
-                        print(f"Eliminado archivo temporal antiguo: {fpath}")
-                except FileNotFoundError:
-                    continue
-                except Exception as e:
-                    print(f"Error limpiando {fpath}: {e}")
-        except Exception as e:
-            print(f"Error en el limpiador de tmp_pdfs: {e}")
-        time.sleep(interval_seconds)
-
-
-def _schedule_delete(path: str, delay_seconds: int = 30):
-    """Programar la eliminación de `path` después de `delay_seconds`.
-
-    Se ejecuta en un hilo daemon para no bloquear la petición.
-    """
-    def _delayed():
-        try:
-            time.sleep(delay_seconds)
-            if os.path.exists(path):
-                try:
-                    os.remove(path)
-                    print(f"Eliminado archivo temporal tras descarga: {path}")
-                except Exception as e:
-                    print(f"No se pudo eliminar {path} tras retraso: {e}")
-        except Exception as e:
-            print(f"Error en hilo de eliminación diferida para {path}: {e}")
-
-    t = threading.Thread(target=_delayed, daemon=True)
-    t.start()
 
 if __name__ == '__main__':
-    # Iniciar hilo demonio que limpia PDFs temporales cada 10 minutos (archivos > 1 hora)
-    cleaner_thread = threading.Thread(target=_tmp_pdfs_cleaner, kwargs={'interval_seconds': 600, 'max_age_seconds': 3600}, daemon=True)
-    cleaner_thread.start()
-
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
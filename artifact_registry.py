@@ -0,0 +1,185 @@
+"""Registro versionado de artefactos del modelo.
+
+Estructura en disco:
+
+    artifacts/
+        CURRENT                      <- nombre de la versión activa
+        versions/<version>/
+            model.joblib
+            vectorizer.joblib
+            encoder.joblib
+            forest.npz               <- opcional: el bosque compilado (`compiled_forest.py`)
+            manifest.json            <- sha256 y tamaño de cada archivo, etiquetas, metadatos
+
+Publicar escribe la versión completa en un directorio temporal, la renombra y
+sólo entonces sustituye `CURRENT` con `os.replace`: un worker nunca ve un
+vectorizador de una versión con el modelo de otra. Los workers detectan una
+versión nueva con un simple `stat` de `CURRENT`.
+
+Los artefactos se guardan sin comprimir para poder cargarlos con
+`joblib.load(mmap_mode='r')`: los arrays grandes se leen desde la caché de
+páginas del sistema en lugar de copiarse al cargar.
+"""
+import hashlib
+import io
+import json
+import os
+import shutil
+from datetime import datetime
+from pathlib import Path
+
+BASE = Path(__file__).parent
+ARTIFACTS_DIR = Path(os.environ.get('ARTIFACTS_DIR', BASE / 'artifacts'))
+
+ARTIFACT_FILES = {
+    'model': 'model.joblib',
+    'vectorizer': 'vectorizer.joblib',
+    'encoder': 'encoder.joblib',
+}
+COMPILED_FILE = 'forest.npz'
+
+
+class ArtifactError(Exception):
+    """Versión inexistente o artefactos que no coinciden con su manifiesto."""
+
+
+def _sha256(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def size_bytes(*objs):
+    """Bytes que ocupan `objs` serializados con joblib sin comprimir, como se publican."""
+    import joblib
+    buffer = io.BytesIO()
+    joblib.dump(objs, buffer)
+    return buffer.tell()
+
+
+class ArtifactRegistry:
+    """Publica, localiza y carga versiones de artefactos."""
+
+    def __init__(self, root=ARTIFACTS_DIR):
+        self.root = Path(root)
+        self.versions_dir = self.root / 'versions'
+        self.pointer = self.root / 'CURRENT'
+
+    # --- Lectura ---
+    def current_version(self):
+        """Versión activa o None si todavía no se publicó ninguna."""
+        try:
+            version = self.pointer.read_text(encoding='utf-8').strip()
+        except OSError:
+            return None
+        return version or None
+
+    def pointer_stamp(self):
+        """Marca barata (mtime_ns) para saber si `CURRENT` cambió desde la última vez."""
+        try:
+            return self.pointer.stat().st_mtime_ns
+        except OSError:
+            return None
+
+    def list_versions(self):
+        if not self.versions_dir.exists():
+            return []
+        return sorted(p.name for p in self.versions_dir.iterdir()
+                      if p.is_dir() and not p.name.startswith('.'))
+
+    def manifest(self, version):
+        path = self.versions_dir / version / 'manifest.json'
+        try:
+            return json.loads(path.read_text(encoding='utf-8'))
+        except OSError:
+            raise ArtifactError(f"La versión {version} no existe")
+
+    def load(self, version=None, mmap_mode='r', verify=True, compiled=False):
+        """Carga (model, vectorizer, encoder, manifest) de `version` (por defecto, la activa).
+
+        Con `compiled=True`, si la versión incluye `forest.npz` el modelo
+        devuelto es ese `CompiledForest` y el bosque de joblib no se lee.
+        """
+        version = version or self.current_version()
+        if version is None:
+            raise ArtifactError("No hay ninguna versión publicada")
+        import joblib
+        manifest = self.manifest(version)
+        directory = self.versions_dir / version
+        loaded = {}
+        files = dict(ARTIFACT_FILES)
+        if compiled and COMPILED_FILE in manifest['files']:
+            from compiled_forest import CompiledForest
+            path = directory / COMPILED_FILE
+            if verify and _sha256(path) != manifest['files'][COMPILED_FILE]['sha256']:
+                raise ArtifactError(f"Checksum incorrecto en {path}")
+            loaded['model'] = CompiledForest.load(path)
+            del files['model']
+        for name, filename in files.items():
+            path = directory / filename
+            if verify and _sha256(path) != manifest['files'][filename]['sha256']:
+                raise ArtifactError(f"Checksum incorrecto en {path}")
+            loaded[name] = joblib.load(path, mmap_mode=mmap_mode)
+        return loaded['model'], loaded['vectorizer'], loaded['encoder'], manifest
+
+    # --- Escritura ---
+    def publish(self, model, vectorizer, encoder, metadata=None, activate=True, compiled=None):
+        """Escribe una versión nueva y (por defecto) la activa. Devuelve su nombre.
+
+        `compiled` es el `CompiledForest` de `model`, si lo hay.
+        """
+        import joblib
+        version = datetime.now().strftime('%Y%m%d%H%M%S%f')
+        self.versions_dir.mkdir(parents=True, exist_ok=True)
+        staging = self.versions_dir / f'.tmp-{version}'
+        staging.mkdir()
+        try:
+            files = {}
+            for name, obj in (('model', model), ('vectorizer', vectorizer), ('encoder', encoder)):
+                filename = ARTIFACT_FILES[name]
+                path = staging / filename
+                joblib.dump(obj, path)
+                files[filename] = {'sha256': _sha256(path), 'bytes': path.stat().st_size}
+            if compiled is not None:
+                path = staging / COMPILED_FILE
+                compiled.save(path)
+                files[COMPILED_FILE] = {'sha256': _sha256(path), 'bytes': path.stat().st_size}
+            manifest = {
+                'version': version,
+                'created_at': datetime.now().isoformat(timespec='seconds'),
+                'files': files,
+                'labels': [str(c) for c in encoder.classes_],
+                'model_class': type(model).__name__,
+                'vectorizer_class': type(vectorizer).__name__,
+                'metadata': metadata or {},
+            }
+            (staging / 'manifest.json').write_text(json.dumps(manifest, indent=2, ensure_ascii=False),
+                                                  encoding='utf-8')
+            os.rename(staging, self.versions_dir / version)
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        if activate:
+            self.activate(version)
+        return version
+
+    def activate(self, version):
+        """Apunta `CURRENT` a `version` de forma atómica (también sirve para volver atrás)."""
+        if not (self.versions_dir / version / 'manifest.json').exists():
+            raise ArtifactError(f"La versión {version} no existe")
+        tmp = self.root / f'.CURRENT.{os.getpid()}.tmp'
+        tmp.write_text(version, encoding='utf-8')
+        os.replace(tmp, self.pointer)
+
+    def prune(self, keep=5):
+        """Borra las versiones antiguas, conservando las `keep` más recientes y la activa."""
+        current = self.current_version()
+        versions = self.list_versions()
+        removed = []
+        for version in versions[:-keep] if keep else versions:
+            if version != current:
+                shutil.rmtree(self.versions_dir / version, ignore_errors=True)
+                removed.append(version)
+        return removed
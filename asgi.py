@@ -0,0 +1,461 @@
+"""Modo ASGI: las rutas calientes en asyncio y el trabajo de CPU en un pool de procesos.
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+
+Rutas nativas (Starlette): `/predict`, `/pdf_status/<archivo>`, `/download_pdf/<archivo>`,
+`/feedback`, `/feedback/batch`, `/model/info` y `/metrics`. Todo lo demás (login,
+registro, dashboard, `/predict/batch`...) lo sirve la app Flask de `app.py`,
+montada debajo, con las mismas plantillas y configuración.
+
+- La predicción y la maquetación de PDFs se ejecutan en `offload.py` (pool de
+  ASGI_PROCESSES procesos); el bucle de eventos sólo espera el resultado, así
+  que un único worker mantiene muchas conexiones lentas a la vez.
+- La caché de predicciones se consulta en este proceso, antes de ir al pool.
+- Las predicciones concurrentes viajan al pool en lotes (`microbatch.py`,
+  PREDICT_BATCH_MAX y PREDICT_BATCH_WAIT_MS): un viaje y un `predict_proba`
+  por lote en lugar de uno por petición.
+- El CSV de predicciones se escribe desde un hilo; el feedback sólo se encola.
+- Las descargas usan `FileResponse` (lectura no bloqueante, Range y ETag).
+- `/predict` pasa por el mismo control de admisión que la app Flask
+  (`admission.py`): lo que no cabe recibe 503/429 con Retry-After.
+
+Requiere starlette, uvicorn y python-multipart (no están en requirements.txt).
+"""
+import asyncio
+import os
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+
+from itsdangerous import BadSignature
+
+try:
+    from starlette.applications import Starlette
+    from starlette.concurrency import run_in_threadpool
+    from starlette.responses import FileResponse, JSONResponse, PlainTextResponse, Response
+    from starlette.routing import Mount, Route
+    from starlette.staticfiles import StaticFiles
+    from starlette.templating import Jinja2Templates
+except ImportError as e:
+    raise ImportError("El modo ASGI necesita starlette, uvicorn y python-multipart: "
+                      "pip install starlette uvicorn python-multipart") from e
+try:
+    from a2wsgi import WSGIMiddleware
+except ImportError:
+    from starlette.middleware.wsgi import WSGIMiddleware
+
+# El modelo de este proceso no se usa (predicen los procesos del pool): que
+# la app Flask no lo cargue salvo que alguna de sus rutas lo pida.
+os.environ.setdefault('MODEL_LOAD_MODE', 'lazy')
+
+import offload
+import static_assets
+import app as wsgi
+from admission import Overloaded, forwarded_ip, rate_key
+from inference import RELOAD_CHECK_SECONDS, cache_text
+from microbatch import batcher_from_env
+from metrics import CONTENT_TYPE, REGISTRY, observe_stage, stage
+from pdf_jobs import DONE, ERROR, QUEUED, RENDERING, QueueFullError, file_status
+from prediction_cache import cache_from_env
+from predict import report_filename, save_data_to_csv, simulate_prediction
+
+
+def _env_int(name, default):
+    try:
+        return int(os.environ.get(name, str(default)))
+    except ValueError:
+        print(f"Advertencia: valor de entorno {name} no válido; usando {default}.")
+        return default
+
+
+ASGI_PROCESSES = _env_int('ASGI_PROCESSES', min(4, os.cpu_count() or 1))
+ASGI_PDF_QUEUE = _env_int('ASGI_PDF_QUEUE', 32)
+
+templates = Jinja2Templates(directory=os.path.join(wsgi.BASE_DIR, 'templates'))
+
+
+class HashedStaticFiles(StaticFiles):
+    """`StaticFiles` que sirve `dist/` como la app Flask (ver `static_assets.py`):
+    variante precomprimida según `Accept-Encoding` y caché inmutable."""
+
+    def __init__(self, manifest, **kwargs):
+        super().__init__(**kwargs)
+        self.manifest = manifest
+
+    async def get_response(self, path, scope):
+        hashed = static_assets.hashed_path(self.manifest, path) if self.manifest else None
+        if hashed is None:
+            return await super().get_response(path, scope)
+        accept = dict(scope['headers']).get(b'accept-encoding', b'').decode('latin-1')
+        name, encoding = static_assets.negotiate(self.manifest, hashed, accept)
+        return FileResponse(os.path.join(self.directory, static_assets.DIST_DIRNAME, name),
+                            media_type=static_assets.content_type(hashed),
+                            headers=static_assets.response_headers(encoding))
+
+
+class AsyncPDFJobs:
+    """Equivalente asyncio de `pdf_jobs.PDFJobQueue`: mismos estados y contrapresión.
+
+    Los informes se maquetan en el pool de procesos; como mucho `max_pending`
+    trabajos a la vez, si no `submit` lanza `QueueFullError`.
+    """
+
+    def __init__(self, output_dir, max_pending=32, max_jobs=1000, on_written=None):
+        self.output_dir = output_dir
+        self.max_pending = max_pending
+        self.max_jobs = max_jobs
+        self.on_written = on_written
+        self.pool = None
+        self._jobs = OrderedDict()
+        self._by_filename = {}
+        self._inflight = {}
+        self._tasks = set()
+        self._counters = {'submitted': 0, 'completed': 0, 'failed': 0, 'rejected': 0}
+
+    def submit(self, data, prediction, filename):
+        existing = self._inflight.get(filename)
+        if existing is not None:
+            return existing
+        if len(self._inflight) >= self.max_pending:
+            self._counters['rejected'] += 1
+            raise QueueFullError("La cola de PDFs está llena")
+        job = {'id': uuid.uuid4().hex, 'state': QUEUED, 'filename': filename,
+               'submitted_at': time.time(), 'finished_at': None, 'error': None}
+        self._jobs[job['id']] = job
+        self._by_filename[filename] = job['id']
+        while len(self._jobs) > self.max_jobs:
+            _, old = self._jobs.popitem(last=False)
+            if self._by_filename.get(old['filename']) == old['id']:
+                del self._by_filename[old['filename']]
+        self._inflight[filename] = job['id']
+        self._counters['submitted'] += 1
+        task = asyncio.get_running_loop().create_task(self._run(job, dict(data), prediction))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job['id']
+
+    async def _run(self, job, data, prediction):
+        path = os.path.join(self.output_dir, job['filename'])
+        job['state'] = RENDERING
+        try:
+            timings = await asyncio.get_running_loop().run_in_executor(
+                self.pool, offload.render_pdf, data, prediction, path)
+            observe_stage('pdf_render', timings['pdf_render'])
+            observe_stage('file_write', timings['file_write'])
+            if self.on_written is not None:
+                self.on_written(path)
+            job.update(state=DONE, finished_at=time.time())
+            self._counters['completed'] += 1
+        except Exception as e:
+            print(f"Error al generar el PDF {job['filename']}: {e}")
+            job.update(state=ERROR, error=str(e), finished_at=time.time())
+            self._counters['failed'] += 1
+        finally:
+            self._inflight.pop(job['filename'], None)
+
+    def status(self, job_id):
+        job = self._jobs.get(job_id)
+        return dict(job) if job is not None else None
+
+    def status_for(self, filename):
+        job = self._jobs.get(self._by_filename.get(filename))
+        return file_status(self.output_dir, filename, dict(job) if job is not None else None)
+
+    def stats(self):
+        return {**self._counters, 'tracked_jobs': len(self._jobs), 'queue_depth': len(self._inflight),
+                'max_queue': self.max_pending, 'workers': ASGI_PROCESSES}
+
+
+pdf_jobs = AsyncPDFJobs(wsgi.PDF_DIR, max_pending=ASGI_PDF_QUEUE, on_written=wsgi.pdf_expiry.track)
+REGISTRY.callback('donapp_pdf_queue_depth', 'Trabajos de PDF esperando en la cola.',
+                  lambda: pdf_jobs.stats()['queue_depth'])
+REGISTRY.callback('donapp_pdf_jobs_total', 'Trabajos de PDF por resultado.',
+                  lambda: {k: v for k, v in pdf_jobs.stats().items()
+                           if k in ('submitted', 'completed', 'failed', 'rejected')},
+                  kind='counter', labelname='result')
+
+
+def _run_in_pool(fn, *args):
+    return asyncio.get_running_loop().run_in_executor(pdf_jobs.pool, fn, *args)
+
+
+# Caché de predicciones en este proceso, delante del batcher y del pool (como
+# `InferenceEngine.predict` en la app Flask): un acierto no viaja al pool.
+# La clave necesita la versión y las columnas del modelo de los procesos del
+# pool; se actualizan con cada lote y, como mucho, cada RELOAD_CHECK_SECONDS.
+prediction_cache = cache_from_env()
+_pipeline = {'info': None, 'checked': 0.0}
+
+
+def _remember(info, records, results, top_k):
+    _pipeline.update(info=info, checked=time.monotonic())
+    if prediction_cache is None or info is None:
+        return
+    k = top_k or info['top_k']
+    for record, result in zip(records, results):
+        if result is not None:
+            key = prediction_cache.make_key(info['version'], cache_text(record, info['features']), k)
+            prediction_cache.set(key, result)
+
+
+async def _cache_key(record):
+    if prediction_cache is None:
+        return None
+    if time.monotonic() - _pipeline['checked'] > RELOAD_CHECK_SECONDS:
+        _pipeline.update(info=await _run_in_pool(offload.pipeline_info), checked=time.monotonic())
+    info = _pipeline['info']
+    if info is None:
+        return None
+    return prediction_cache.make_key(info['version'], cache_text(record, info['features']), info['top_k'])
+
+
+def _predict_batch(records, top_k):
+    # Se ejecuta en un hilo del batcher: uno por proceso del pool, para
+    # que haya tantos lotes en vuelo como procesos.
+    info, results = pdf_jobs.pool.submit(offload.predict_many_with_info, records, top_k).result()
+    _remember(info, records, results, top_k)
+    return results
+
+
+batcher = batcher_from_env(_predict_batch, workers=ASGI_PROCESSES, observe=wsgi._observe_batch)
+REGISTRY.callback('donapp_prediction_cache_hits_total', 'Aciertos de la caché de predicciones.',
+                  lambda: _parent_cache_stat('hits') + _parent_cache_stat('shared_hits'), kind='counter')
+REGISTRY.callback('donapp_prediction_cache_misses_total', 'Fallos de la caché de predicciones.',
+                  lambda: _parent_cache_stat('misses'), kind='counter')
+REGISTRY.callback('donapp_predict_batch_queue_depth', 'Predicciones esperando a entrar en un lote.',
+                  lambda: batcher.stats()['queue_depth'] if batcher is not None else 0)
+REGISTRY.callback('donapp_predict_batches_total', 'Lotes de predicción ejecutados.',
+                  lambda: batcher.stats()['batches'] if batcher is not None else 0, kind='counter')
+
+
+def _parent_cache_stat(key):
+    return prediction_cache.stats()[key] if prediction_cache is not None else 0
+
+
+# --- Rutas ---
+
+_session_serializer = wsgi.app.session_interface.get_signing_serializer(wsgi.app)
+
+
+def client_key(request):
+    """La misma clave de ritmo que `admission.client_key` en Flask.
+
+    El usuario sale de la cookie de sesión firmada de Flask (la que escribe
+    Flask-Login al iniciar sesión); si no hay o no es válida, la IP, con la
+    misma regla de TRUSTED_PROXIES que `ProxyFix`.
+    """
+    user_id = None
+    cookie = request.cookies.get(wsgi.app.config['SESSION_COOKIE_NAME'])
+    if cookie and _session_serializer is not None:
+        try:
+            session = _session_serializer.loads(
+                cookie, max_age=int(wsgi.app.permanent_session_lifetime.total_seconds()))
+            user_id = session.get('_user_id')
+        except BadSignature:
+            pass
+    ip = forwarded_ip(request.client.host if request.client else None,
+                      request.headers.get('x-forwarded-for'), wsgi.TRUSTED_PROXIES)
+    if user_id is None and ip is None:
+        return None
+    return rate_key(user_id, ip)
+
+
+def admitted(endpoint, handler):
+    """Aplica el control de admisión de la app Flask (`wsgi.admission`) a una ruta nativa."""
+    async def route(request):
+        if wsgi.admission is None or request.method != 'POST':
+            return await handler(request)
+        key = client_key(request)
+        try:
+            # Puede esperar en la cola: fuera del bucle de eventos.
+            admission = await run_in_threadpool(wsgi.admission.admit, endpoint, key)
+        except Overloaded as e:
+            return PlainTextResponse(str(e), status_code=e.status_code,
+                                     headers={'Retry-After': str(e.retry_after)})
+        request.state.admission = admission
+        try:
+            return await handler(request)
+        finally:
+            if admission is not None:
+                admission.release()
+    return route
+
+
+async def predict(request):
+    if request.method == 'GET':
+        return templates.TemplateResponse(request, 'predict.html')
+
+    with stage('form_parse'):
+        form_data = dict((await request.form()).items())
+
+    modelo_text = form_data.get('modelo', '')
+    top_k = []
+    if not modelo_text:
+        prediction_result = "Error: El campo 'modelo' es obligatorio."
+    else:
+        with stage('prediction'):
+            key = await _cache_key(form_data)
+            result = prediction_cache.get(key) if key is not None else None
+            if result is not None:
+                result = dict(result)
+            elif batcher is not None:
+                result = await asyncio.wrap_future(batcher.submit_future(form_data))
+            else:
+                result = await _run_in_pool(offload.predict, form_data)
+                if key is not None and result is not None:
+                    prediction_cache.set(key, result)
+        if result is None:
+            prediction_result = simulate_prediction(modelo_text)
+        else:
+            prediction_result = result['label']
+            top_k = result['top_k']
+
+    form_data['prediction_result'] = prediction_result
+    try:
+        with stage('csv_write'):
+            await run_in_threadpool(save_data_to_csv, form_data)
+    except Exception as e:
+        print(f"Error al guardar en CSV: {e}")
+
+    pdf_data = {k: v for k, v in form_data.items() if k != 'timestamp'}
+    filename = report_filename(pdf_data, prediction_result)
+    context = {'modelo': modelo_text, 'prediction': prediction_result, 'top_k': top_k,
+               'pdf_ready': False, 'status_url': None,
+               'download_url': app.url_path_for('download_pdf', filename=filename)}
+    status_code, headers = 200, None
+    admission = getattr(request.state, 'admission', None)
+    if os.path.exists(os.path.join(wsgi.PDF_DIR, filename)):
+        wsgi.pdf_expiry.track(os.path.join(wsgi.PDF_DIR, filename))
+        context['pdf_ready'] = True
+    elif admission is not None and admission.degraded:
+        context['download_url'] = None
+    else:
+        try:
+            with stage('pdf_enqueue'):
+                pdf_jobs.submit(pdf_data, prediction_result, filename)
+            context['status_url'] = app.url_path_for('pdf_status', filename=filename)
+        except QueueFullError:
+            context['download_url'] = None
+            status_code, headers = 503, {'Retry-After': str(wsgi.PDF_RETRY_AFTER_SECONDS)}
+    with stage('template_render'):
+        return templates.TemplateResponse(request, 'predict_result.html', context,
+                                          status_code=status_code, headers=headers)
+
+
+async def pdf_status(request):
+    filename = request.path_params['filename']
+    if os.path.basename(filename) != filename:
+        return JSONResponse({'error': 'Informe no encontrado.'}, status_code=404)
+    status = pdf_jobs.status_for(filename)
+    body = {'filename': filename, 'state': status['state'], 'error': status['error']}
+    if status['state'] == DONE:
+        body['download_url'] = app.url_path_for('download_pdf', filename=filename)
+    elif status['state'] == QUEUED and status['known']:
+        body['queue_depth'] = pdf_jobs.stats()['queue_depth']
+    return JSONResponse(body)
+
+
+async def download_pdf(request):
+    filename = request.path_params['filename']
+    file_path = os.path.join(wsgi.PDF_DIR, filename)
+    if os.path.basename(filename) != filename or not os.path.isfile(file_path):
+        return PlainTextResponse("Archivo no encontrado", status_code=404)
+    wsgi.pdf_expiry.schedule(file_path, wsgi.PDF_RETENTION_SECONDS)
+    etag = '"' + os.path.splitext(filename)[0] + '"'
+    # Mismas cabeceras que `send_from_directory(..., conditional=True)` en Flask.
+    headers = {'etag': etag, 'cache-control': 'no-cache'}
+    if _etag_matches(request.headers.get('if-none-match'), etag):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(file_path, media_type='application/pdf', filename=filename, headers=headers)
+
+
+def _etag_matches(if_none_match, etag):
+    """True si `If-None-Match` incluye `etag` (comparación débil) o es `*`."""
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(',')]
+    return '*' in tags or etag in (t[2:] if t.startswith('W/') else t for t in tags)
+
+
+async def _json_body(request):
+    try:
+        return await request.json()
+    except ValueError:
+        return None
+
+
+async def feedback(request):
+    row, error = wsgi._feedback_row(await _json_body(request))
+    if error:
+        wsgi.FEEDBACK_ITEMS.inc(result='rejected')
+        return JSONResponse({'error': error}, status_code=400)
+    wsgi.feedback_log.append(row)
+    wsgi.FEEDBACK_ITEMS.inc(result='accepted')
+    return JSONResponse({'message': 'Feedback recibido', 'modelo': row['modelo'],
+                         'real': row['clasificacion_real']}, status_code=202)
+
+
+async def feedback_batch(request):
+    data = await _json_body(request)
+    if isinstance(data, dict):
+        data = data.get('items')
+    if not isinstance(data, list):
+        return JSONResponse({'error': 'Se esperaba una lista de feedbacks.'}, status_code=400)
+    if len(data) > wsgi.FEEDBACK_BATCH_MAX:
+        return JSONResponse({'error': f'Máximo {wsgi.FEEDBACK_BATCH_MAX} feedbacks por petición.'},
+                            status_code=413)
+    accepted, rejected = 0, []
+    for index, item in enumerate(data):
+        row, error = wsgi._feedback_row(item)
+        if error:
+            rejected.append({'index': index, 'error': error})
+            continue
+        wsgi.feedback_log.append(row)
+        accepted += 1
+    wsgi.FEEDBACK_ITEMS.inc(accepted, result='accepted')
+    wsgi.FEEDBACK_ITEMS.inc(len(rejected), result='rejected')
+    return JSONResponse({'accepted': accepted, 'rejected': rejected}, status_code=202)
+
+
+async def model_info(request):
+    """Estadísticas de uno de los procesos del pool (cada uno tiene su modelo)."""
+    stats = await _run_in_pool(offload.engine_stats)
+    return JSONResponse({**(stats or {}), 'mode': 'asgi', 'processes': ASGI_PROCESSES,
+                         'parent_cache': prediction_cache.stats() if prediction_cache is not None else None,
+                         'pdf_jobs': pdf_jobs.stats(),
+                         'batching': batcher.stats() if batcher is not None else None})
+
+
+async def metrics(request):
+    return Response(REGISTRY.render(), headers={'content-type': CONTENT_TYPE})
+
+
+@asynccontextmanager
+async def lifespan(starlette_app):
+    # El pool se crea dentro de cada worker de uvicorn y se calienta antes de
+    # aceptar peticiones: cada proceso carga el modelo en su inicializador.
+    start = time.perf_counter()
+    pdf_jobs.pool = offload.make_pool(ASGI_PROCESSES, wsgi.MODEL_FILENAME, wsgi.VECTORIZER_FILENAME,
+                                      wsgi.ENCODER_FILENAME)
+    loop = asyncio.get_running_loop()
+    await asyncio.gather(*(loop.run_in_executor(pdf_jobs.pool, offload.ping) for _ in range(ASGI_PROCESSES)))
+    print(f"Pool de {ASGI_PROCESSES} procesos listo en {(time.perf_counter() - start) * 1000:.0f} ms")
+    try:
+        yield
+    finally:
+        pdf_jobs.pool.shutdown(wait=True, cancel_futures=True)
+
+
+app = Starlette(routes=[
+    Route('/predict', admitted('predict', predict), methods=['GET', 'POST']),
+    Route('/pdf_status/{filename}', pdf_status),
+    Route('/download_pdf/{filename}', download_pdf),
+    Route('/feedback', feedback, methods=['POST']),
+    Route('/feedback/batch', feedback_batch, methods=['POST']),
+    Route('/model/info', model_info),
+    Route('/metrics', metrics),
+    Mount('/static', HashedStaticFiles(wsgi.static_manifest, directory=os.path.join(wsgi.BASE_DIR, 'static')),
+          name='static'),
+    Mount('/', WSGIMiddleware(wsgi.app)),
+], lifespan=lifespan)
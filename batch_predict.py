@@ -0,0 +1,150 @@
+"""Predicción por lotes para campañas de donación (miles de equipos).
+
+La entrada usa el esquema de `donapp_data_tecnico.csv` (CSV separado por ';'
+o ',') o una lista JSON de registros. La columna `modelo` de cada trozo de
+`chunk_size` filas pasa por un único `transform` + `predict_proba`, de modo
+que la memoria queda acotada por el tamaño del trozo y no por el archivo.
+
+Uso desde la línea de comandos:
+    python batch_predict.py entrada.csv -o salida.ndjson
+    python batch_predict.py entrada.json --format csv > salida.csv
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+from itertools import islice
+
+from inference import InferenceEngine
+from artifact_registry import ArtifactRegistry
+
+BASE_DIR = os.path.dirname(__file__)
+MODEL_FILENAME = os.path.join(BASE_DIR, 'donapp_ml_model.joblib')
+VECTORIZER_FILENAME = os.path.join(BASE_DIR, 'donapp_tfidf_vectorizer.joblib')
+ENCODER_FILENAME = os.path.join(BASE_DIR, 'donapp_label_encoder.joblib')
+
+DEFAULT_CHUNK_SIZE = 2000
+OUTPUT_FORMATS = ('ndjson', 'csv')
+MISSING_MODELO = "Error: El campo 'modelo' es obligatorio."
+INVALID_RECORD = "Error: el registro no es un objeto."
+
+
+def read_csv_records(stream):
+    """Itera los registros de un CSV de texto detectando el separador (';' o ',')."""
+    header = stream.readline().lstrip('\ufeff')
+    if not header.strip():
+        return
+    sep = ';' if header.count(';') >= header.count(',') else ','
+    columns = next(csv.reader([header], delimiter=sep))
+    for values in csv.reader(stream, delimiter=sep):
+        if values:
+            yield dict(zip(columns, values))
+
+
+def read_records(path):
+    """Abre `path` (.json o CSV) y devuelve un iterador de registros."""
+    if path.lower().endswith('.json'):
+        with open(path, encoding='utf-8-sig') as f:
+            data = json.load(f)
+        if isinstance(data, dict):
+            data = data.get('records', [])
+        return iter(data)
+
+    def _iter_csv():
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            yield from read_csv_records(f)
+    return _iter_csv()
+
+
+def chunked(records, size):
+    records = iter(records)
+    while True:
+        chunk = list(islice(records, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def predict_records(engine, records, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Genera los registros de entrada con `prediccion_ml` y `probabilidad` añadidos."""
+    for chunk in chunked(records, chunk_size):
+        valid = [i for i, r in enumerate(chunk) if isinstance(r, dict) and str(r.get('modelo') or '').strip()]
+        results = engine.predict_many([chunk[i] for i in valid])
+        by_index = dict(zip(valid, results))
+        for i, record in enumerate(chunk):
+            if not isinstance(record, dict):
+                # Una lista JSON puede traer cualquier cosa: fila de error y seguir.
+                yield {'registro': record, 'prediccion_ml': INVALID_RECORD, 'probabilidad': ''}
+                continue
+            out = dict(record)
+            result = by_index.get(i)
+            if result is None:
+                out['prediccion_ml'] = MISSING_MODELO
+                out['probabilidad'] = ''
+            else:
+                out['prediccion_ml'] = result['label']
+                out['probabilidad'] = round(result['probability'], 4)
+            yield out
+
+
+def format_ndjson(rows):
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + '\n'
+
+
+def format_csv(rows):
+    """Serializa a CSV (';'). Las columnas las fija la primera fila."""
+    writer = None
+    buffer = io.StringIO()
+    for row in rows:
+        if writer is None:
+            writer = csv.DictWriter(buffer, fieldnames=list(row.keys()), delimiter=';',
+                                    lineterminator='\n', extrasaction='ignore')
+            writer.writeheader()
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def format_rows(rows, fmt):
+    if fmt not in OUTPUT_FORMATS:
+        raise ValueError(f"Formato no soportado: {fmt!r} (usa {OUTPUT_FORMATS})")
+    return format_csv(rows) if fmt == 'csv' else format_ndjson(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Predicción por lotes de DonApp")
+    parser.add_argument('input', help="CSV (esquema donapp_data_tecnico.csv) o lista JSON")
+    parser.add_argument('-o', '--output', help="archivo de salida (por defecto, stdout)")
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, default=None,
+                        help="ndjson o csv (por defecto se deduce de la extensión de salida)")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    fmt = args.format or ('csv' if (args.output or '').lower().endswith('.csv') else 'ndjson')
+    # Lotes grandes: el RandomForest de scikit-learn (repartido entre hilos)
+    # rinde más por fila que el bosque compilado, pensado para filas sueltas.
+    engine = InferenceEngine(MODEL_FILENAME, VECTORIZER_FILENAME, ENCODER_FILENAME, registry=ArtifactRegistry(),
+                             compiled=False)
+    if not engine.load():
+        print("No se encontraron los artefactos del modelo. Ejecuta: python ml_model.py", file=sys.stderr)
+        return 1
+
+    out = open(args.output, 'w', encoding='utf-8', newline='') if args.output else sys.stdout
+    try:
+        rows = predict_records(engine, read_records(args.input), chunk_size=args.chunk_size)
+        for piece in format_rows(rows, fmt):
+            out.write(piece)
+    finally:
+        if args.output:
+            out.close()
+    stats = engine.stats()
+    print(f"Filas clasificadas: {stats['predictions']} en {stats['predict_seconds']:.2f} s", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,216 @@
+"""Carga abierta contra `/predict` con y sin control de admisión (`admission.py`).
+
+Un generador de carga de bucle abierto envía `--rate` peticiones por segundo
+durante `--seconds` segundos, lleguen o no las respuestas (como los usuarios
+reales), repartidas entre `--users` usuarios con sesión iniciada. La
+latencia se mide desde el instante en que tocaba enviar cada petición, así
+que incluye la espera en el propio generador.
+
+Modos, cada uno contra un gunicorn nuevo (`--workers` workers con
+`--threads` hilos, para que las peticiones de más lleguen a la app):
+
+- off: sin control de admisión (ADMISSION_LIMITS='').
+- shed: `--limit` peticiones a la vez y `--queue` en cola; el resto, 503.
+- degrade: como shed, y lo que espera en cola se atiende sin PDF.
+- rate: sólo el límite por usuario (`--per-minute`, `--burst`); el resto, 429.
+
+Por modo se informa cuántas respuestas fueron completas (con PDF), con la
+predicción pero sin PDF (modo degradado o cola de PDFs llena), 429, 503 o
+errores, el goodput (respuestas 200 por segundo) y
+p50/p99 de las respuestas 200 y de los rechazos.
+
+Uso (desde la raíz del proyecto; requiere gunicorn):
+    python -m benchmarks.bench_admission
+    python -m benchmarks.bench_admission --rate 60 --seconds 20 --modes off,degrade
+"""
+import argparse
+import http.client
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from benchmarks import synthetic_data
+from benchmarks.bench_suite import _csv_list, gunicorn_server, stage_project
+
+MODES = ('off', 'shed', 'degrade', 'rate')
+
+
+def mode_env(mode, args):
+    env = {'ADMISSION_LIMITS': f'predict={args.limit}:{args.queue}',
+           'ADMISSION_QUEUE_TIMEOUT_MS': str(args.queue_timeout_ms),
+           'ADMISSION_DEGRADE': '1' if mode == 'degrade' else '0',
+           'RATE_LIMIT_PER_MINUTE': '0'}
+    if mode == 'off':
+        env['ADMISSION_LIMITS'] = ''
+    elif mode == 'rate':
+        # Concurrencia sin techo práctico: sólo actúa el límite por usuario.
+        env.update({'ADMISSION_LIMITS': 'predict=1000:0', 'RATE_LIMIT_PER_MINUTE': str(args.per_minute),
+                    'RATE_LIMIT_BURST': str(args.burst)})
+    return env
+
+
+def _request(port, method, path, form=None, cookie=None, timeout=60):
+    """(status, cabeceras, cuerpo) por una conexión nueva."""
+    body = urllib.parse.urlencode(form).encode('utf-8') if form is not None else None
+    headers = {'Content-Type': 'application/x-www-form-urlencoded'} if body is not None else {}
+    if cookie:
+        headers['Cookie'] = cookie
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+    try:
+        conn.request(method, path, body=body, headers=headers)
+        response = conn.getresponse()
+        return response.status, response.getheaders(), response.read()
+    finally:
+        conn.close()
+
+
+def login_users(port, n):
+    """Registra e inicia sesión con `n` usuarios; devuelve sus cookies de sesión."""
+    cookies = []
+    for i in range(n):
+        form = {'username': f'carga{i}', 'password': 'carga'}
+        _request(port, 'POST', '/register', form)
+        _, headers, _ = _request(port, 'POST', '/login', form)
+        cookie = next((v.split(';', 1)[0] for k, v in headers
+                       if k.lower() == 'set-cookie' and v.startswith('session=')), None)
+        if cookie is None:
+            raise RuntimeError(f"No se pudo iniciar sesión como {form['username']}")
+        cookies.append(cookie)
+    return cookies
+
+
+def send(port, row, cookie, scheduled, timeout):
+    """Un POST /predict; la latencia cuenta desde `scheduled`."""
+    try:
+        status, headers, body = _request(port, 'POST', '/predict', row, cookie, timeout)
+        content_type = dict((k.lower(), v) for k, v in headers).get('content-type', '')
+        if status in (200, 503) and content_type.startswith('text/html'):
+            # Con predicción; sin PDF si se degradó o la cola de PDFs estaba llena (503).
+            kind = 'full' if status == 200 and b'Descargar PDF' in body else 'degraded'
+        else:
+            kind = str(status)
+    except (OSError, http.client.HTTPException):
+        kind = 'error'
+    return kind, time.perf_counter() - scheduled
+
+
+def open_loop(port, rows, cookies, rate, seconds, timeout):
+    """Envía a ritmo fijo sin esperar respuestas; devuelve [(tipo, latencia, usuario)]."""
+    n = int(rate * seconds)
+    with ThreadPoolExecutor(max_workers=512) as pool:
+        start = time.perf_counter()
+        futures = []
+        for i in range(n):
+            scheduled = start + i / rate
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            user = i % len(cookies)
+            futures.append((user, pool.submit(send, port, rows[i % len(rows)], cookies[user], scheduled,
+                                              timeout)))
+        results = [(f.result()[0], f.result()[1], user) for user, f in futures]
+        elapsed = time.perf_counter() - start
+    return results, elapsed
+
+
+def summarize(results, elapsed):
+    counts = {}
+    for kind, _, _ in results:
+        counts[kind] = counts.get(kind, 0) + 1
+    ok = np.asarray([t for kind, t, _ in results if kind in ('full', 'degraded')]) * 1000
+    shed = np.asarray([t for kind, t, _ in results if kind in ('429', '503')]) * 1000
+    per_user = {}
+    for kind, _, user in results:
+        if kind == '429':
+            per_user[user] = per_user.get(user, 0) + 1
+    return {
+        'sent': len(results), 'counts': counts,
+        'goodput_rps': round(len(ok) / elapsed, 1) if elapsed else 0.0,
+        'ok_p50_ms': round(float(np.percentile(ok, 50)), 1) if len(ok) else None,
+        'ok_p99_ms': round(float(np.percentile(ok, 99)), 1) if len(ok) else None,
+        'shed_p50_ms': round(float(np.percentile(shed, 50)), 1) if len(shed) else None,
+        'shed_p99_ms': round(float(np.percentile(shed, 99)), 1) if len(shed) else None,
+        'rate_limited_per_user': per_user,
+    }
+
+
+def fetch_metrics(port):
+    _, _, body = _request(port, 'GET', '/metrics')
+    return [line for line in body.decode('utf-8').splitlines()
+            if line.startswith('donapp_admission_') and '_bucket' not in line]
+
+
+def _fmt(value):
+    return '-' if value is None else f'{value:.1f}'
+
+
+def print_results(results):
+    print(f"\n{'modo':<9}{'enviadas':>9}{'con PDF':>9}{'sin PDF':>9}{'429':>6}{'503':>6}{'error':>7}"
+          f"{'goodput':>9}{'ok p50':>9}{'ok p99':>9}{'rech p99':>10}")
+    for mode, m in results.items():
+        c = m['counts']
+        errors = sum(v for k, v in c.items() if k not in ('full', 'degraded', '429', '503'))
+        print(f"{mode:<9}{m['sent']:>9}{c.get('full', 0):>9}{c.get('degraded', 0):>9}{c.get('429', 0):>6}"
+              f"{c.get('503', 0):>6}{errors:>7}{m['goodput_rps']:>9.1f}{_fmt(m['ok_p50_ms']):>9}"
+              f"{_fmt(m['ok_p99_ms']):>9}{_fmt(m['shed_p99_ms']):>10}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Carga abierta contra /predict con control de admisión")
+    parser.add_argument('--modes', default=','.join(MODES))
+    parser.add_argument('--rate', type=float, default=150.0, help="peticiones por segundo")
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--users', type=int, default=4, help="usuarios con sesión iniciada")
+    parser.add_argument('--workers', type=int, default=1, help="workers de gunicorn")
+    parser.add_argument('--threads', type=int, default=32, help="hilos por worker")
+    parser.add_argument('--limit', type=int, default=4, help="ADMISSION_LIMITS: concurrencia de /predict")
+    parser.add_argument('--queue', type=int, default=16, help="ADMISSION_LIMITS: cola de /predict")
+    parser.add_argument('--queue-timeout-ms', type=float, default=1000.0)
+    parser.add_argument('--per-minute', type=float, default=120.0, help="modo rate: fichas por minuto")
+    parser.add_argument('--burst', type=float, default=10.0, help="modo rate: capacidad del cubo")
+    parser.add_argument('--timeout', type=float, default=30.0, help="timeout de cada petición (s)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help="guardar los resultados en este JSON")
+    args = parser.parse_args(argv)
+
+    modes = _csv_list(args.modes)
+    for mode in modes:
+        if mode not in MODES:
+            parser.error(f"modo desconocido: {mode}")
+    rows = synthetic_data.form_rows(max(int(args.rate * args.seconds), 1), args.seed)
+
+    tmp = tempfile.mkdtemp(prefix='donapp_bench_admission_')
+    results = {}
+    try:
+        for mode in modes:
+            print(f"{mode}: {args.rate:g} req/s durante {args.seconds:g} s...")
+            stage = os.path.join(tmp, mode)
+            env = {**stage_project(stage), 'GUNICORN_THREADS': str(args.threads), **mode_env(mode, args)}
+            with gunicorn_server(stage, env, args.workers) as (port, _):
+                cookies = login_users(port, args.users)
+                # Calentamiento: modelo, caché de plantillas y primeros PDFs.
+                for row in rows[:args.limit]:
+                    _request(port, 'POST', '/predict', row, cookies[0])
+                measured, elapsed = open_loop(port, rows, cookies, args.rate, args.seconds, args.timeout)
+                results[mode] = {**summarize(measured, elapsed), 'metrics': fetch_metrics(port)}
+            for line in results[mode]['metrics']:
+                print(f"  {line}")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    print_results(results)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'args': vars(args), 'results': results}, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
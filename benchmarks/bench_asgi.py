@@ -0,0 +1,176 @@
+"""Comparativa: gunicorn síncrono (`app:app`) frente al modo ASGI (`asgi:app`).
+
+Para cada nivel de concurrencia se lanza la misma carga de `/predict` contra:
+
+- gunicorn con `--workers` workers síncronos (la configuración actual);
+- uvicorn con un único worker y el pool de `offload.py` (`--processes`).
+
+Con `--slow-ms` cada cliente envía las cabeceras, espera ese tiempo y luego
+el cuerpo, como un móvil con mala conexión: en gunicorn síncrono el worker
+queda bloqueado mientras tanto; en ASGI sólo espera el bucle de eventos.
+
+Se informa p50/p95/p99, rendimiento, errores y RSS total (servidor + workers
+o procesos del pool). Ambos servidores corren sobre copias del proyecto en un
+directorio temporal.
+
+Uso (desde la raíz del proyecto; requiere gunicorn, uvicorn, starlette y
+python-multipart):
+    python -m benchmarks.bench_asgi
+    python -m benchmarks.bench_asgi --concurrency 8,32,64 --slow-ms 200 --requests 300
+"""
+import argparse
+import contextlib
+import http.client
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks import synthetic_data
+from benchmarks.bench_suite import (_children, _csv_list, _free_port, gunicorn_server, process_stats,
+                                    stage_project, summarize)
+
+SERVERS = ('gunicorn', 'asgi')
+
+
+@contextlib.contextmanager
+def uvicorn_server(stage, env, processes):
+    """Arranca `uvicorn asgi:app` (un worker) y espera a que el pool esté listo."""
+    port = _free_port()
+    env = {**env, 'ASGI_PROCESSES': str(processes)}
+    log = open(os.path.join(stage, 'uvicorn.log'), 'wb')
+    proc = subprocess.Popen([sys.executable, '-m', 'uvicorn', '--app-dir', stage, '--host', '127.0.0.1',
+                             '--port', str(port), '--no-access-log', 'asgi:app'],
+                            cwd=stage, env=env, stdout=log, stderr=subprocess.STDOUT)
+    try:
+        deadline = time.monotonic() + 120
+        while True:
+            if proc.poll() is not None:
+                raise RuntimeError(f"uvicorn terminó al arrancar; ver {log.name}")
+            try:
+                # uvicorn no acepta conexiones hasta terminar el lifespan
+                # (pool creado y calentado).
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+                conn.request('GET', '/login')
+                conn.getresponse().read()
+                conn.close()
+                break
+            except OSError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError("uvicorn no respondió en 120 s")
+            time.sleep(0.2)
+        yield port, proc.pid
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        log.close()
+
+
+def slow_post(port, path, form, slow_seconds):
+    """POST en dos tramos (cabeceras, pausa, cuerpo) por una conexión nueva."""
+    body = urllib.parse.urlencode(form).encode('utf-8')
+    t0 = time.perf_counter()
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+    try:
+        conn.putrequest('POST', path)
+        conn.putheader('Content-Type', 'application/x-www-form-urlencoded')
+        conn.putheader('Content-Length', str(len(body)))
+        conn.endheaders()
+        if slow_seconds:
+            time.sleep(slow_seconds)
+        conn.send(body)
+        response = conn.getresponse()
+        response.read()
+        status = response.status
+    except (OSError, http.client.HTTPException):
+        status = 599
+    finally:
+        conn.close()
+    return time.perf_counter() - t0, status
+
+
+def run_load(port, pids_fn, rows, n_requests, concurrency, slow_seconds):
+    """`n_requests` POST /predict con `concurrency` clientes en paralelo."""
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        warmup = rows[:min(concurrency, len(rows))]
+        list(pool.map(lambda row: slow_post(port, '/predict', row, 0), warmup))
+        start = time.perf_counter()
+        timings = list(pool.map(lambda i: slow_post(port, '/predict', rows[i % len(rows)], slow_seconds),
+                                range(n_requests)))
+        elapsed = time.perf_counter() - start
+    return {**summarize([t for t, _ in timings], elapsed, [s for _, s in timings]),
+            **process_stats(pids_fn())}
+
+
+def run_server(name, stage, env, args, rows, levels):
+    if name == 'gunicorn':
+        server = gunicorn_server(stage, env, args.workers)
+    else:
+        server = uvicorn_server(stage, env, args.processes)
+    results = {}
+    with server as (port, main_pid):
+        for concurrency in levels:
+            print(f"  {name}, {concurrency} clientes...")
+            results[f'{name}/c{concurrency}'] = {
+                **run_load(port, lambda: [main_pid] + _children(main_pid), rows, args.requests,
+                           concurrency, args.slow_ms / 1000),
+                'concurrency': concurrency,
+            }
+    return results
+
+
+def print_results(results):
+    print(f"\n{'servidor':<18}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'req/s':>9}{'err':>7}{'RSS MB':>9}")
+    for name, m in results.items():
+        print(f"{name:<18}{m['p50_ms']:>9.1f}{m['p95_ms']:>9.1f}{m['p99_ms']:>9.1f}{m['throughput_rps']:>9.1f}"
+              f"{m['error_rate']:>7.2f}{m['peak_rss_mb']:>9.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="gunicorn síncrono frente a ASGI + pool de procesos")
+    parser.add_argument('--servers', default=','.join(SERVERS))
+    parser.add_argument('--concurrency', default='8,32,64', help="niveles de clientes en paralelo")
+    parser.add_argument('--requests', type=int, default=200, help="peticiones por nivel")
+    parser.add_argument('--slow-ms', type=float, default=100.0, help="pausa entre cabeceras y cuerpo")
+    parser.add_argument('--workers', type=int, default=2, help="workers de gunicorn")
+    parser.add_argument('--processes', type=int, default=2, help="procesos del pool ASGI")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help="guardar los resultados en este JSON")
+    args = parser.parse_args(argv)
+
+    servers = _csv_list(args.servers)
+    for name in servers:
+        if name not in SERVERS:
+            parser.error(f"servidor desconocido: {name}")
+    levels = [int(c) for c in _csv_list(args.concurrency)]
+    rows = synthetic_data.form_rows(max(args.requests, 1), args.seed)
+
+    tmp = tempfile.mkdtemp(prefix='donapp_bench_asgi_')
+    results = {}
+    try:
+        for name in servers:
+            print(f"{name}...")
+            stage = os.path.join(tmp, name)
+            env = stage_project(stage)
+            results.update(run_server(name, stage, env, args, rows, levels))
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    print_results(results)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'args': vars(args), 'results': results}, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,80 @@
+"""Benchmark del micro-batching de predicciones (`microbatch.py`).
+
+Lanza `--requests` predicciones con N hilos concurrentes contra el
+`InferenceEngine` real, sin caché (cada texto es distinto), primero una a
+una y luego con `MicroBatcher`. Informa predicciones/s, p50/p99 y el tamaño
+medio de lote para cada nivel de concurrencia.
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.bench_batching
+    python -m benchmarks.bench_batching --concurrency 1,8,32,64 --max-batch 64 --wait-ms 2
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from benchmarks import synthetic_data
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run(engine, rows, concurrency):
+    def call(i):
+        t0 = time.perf_counter()
+        engine.predict(rows[i])
+        return time.perf_counter() - t0
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        start = time.perf_counter()
+        latencies = np.asarray(list(pool.map(call, range(len(rows))))) * 1000
+        elapsed = time.perf_counter() - start
+    return {'rps': len(rows) / elapsed, 'p50_ms': float(np.percentile(latencies, 50)),
+            'p99_ms': float(np.percentile(latencies, 99))}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark del micro-batching")
+    parser.add_argument('--concurrency', default='1,8,32,64')
+    parser.add_argument('--requests', type=int, default=1000, help="predicciones por nivel")
+    parser.add_argument('--max-batch', type=int, default=32)
+    parser.add_argument('--wait-ms', type=float, default=2.0)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, ROOT)
+    from inference import InferenceEngine
+    from microbatch import MicroBatcher
+
+    engine = InferenceEngine(os.path.join(ROOT, 'donapp_ml_model.joblib'),
+                             os.path.join(ROOT, 'donapp_tfidf_vectorizer.joblib'),
+                             os.path.join(ROOT, 'donapp_label_encoder.joblib'))
+    if not engine.load_now():
+        print("No hay artefactos del modelo; ejecuta antes `python ml_model.py`.")
+        return 1
+    # Textos únicos: sin caché todas las predicciones llegan al modelo.
+    rows = [dict(row, modelo=f"{row['modelo']} {i}")
+            for i, row in enumerate(synthetic_data.form_rows(args.requests, args.seed))]
+    batcher = MicroBatcher(engine.predict_many, max_batch=args.max_batch, max_wait=args.wait_ms / 1000)
+
+    print(f"{'hilos':>6}{'modo':>10}{'pred/s':>10}{'p50 ms':>9}{'p99 ms':>9}{'lote':>7}")
+    for concurrency in [int(c) for c in args.concurrency.split(',') if c.strip()]:
+        engine.batcher = None
+        single = run(engine, rows, concurrency)
+        print(f"{concurrency:>6}{'uno a uno':>10}{single['rps']:>10.1f}{single['p50_ms']:>9.1f}"
+              f"{single['p99_ms']:>9.1f}{'':>7}")
+        engine.batcher = batcher
+        before = batcher.stats()
+        batched = run(engine, rows, concurrency)
+        after = batcher.stats()
+        avg = (after['batched_items'] - before['batched_items']) / max(after['batches'] - before['batches'], 1)
+        print(f"{concurrency:>6}{'lotes':>10}{batched['rps']:>10.1f}{batched['p50_ms']:>9.1f}"
+              f"{batched['p99_ms']:>9.1f}{avg:>7.1f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
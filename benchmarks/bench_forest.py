@@ -0,0 +1,74 @@
+"""Latencia del bosque compilado (`compiled_forest.py`) frente a scikit-learn.
+
+Para lotes de 1, 8, 64 y 1000 filas mide `predict_proba` (sólo el modelo,
+con la matriz TF-IDF ya calculada) de:
+
+- sklearn: el RandomForest tal cual se entrena (`n_jobs=-1`),
+- sklearn n_jobs=1: el mismo sin repartir árboles entre hilos,
+- compilado: `CompiledForest`,
+
+y comprueba que las probabilidades son idénticas en cada lote.
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.bench_forest
+    python -m benchmarks.bench_forest --sizes 1,16 --repeat 500
+"""
+import argparse
+import copy
+import os
+import sys
+import time
+
+import numpy as np
+
+from benchmarks import synthetic_data
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def timeit(fn, X, repeat):
+    fn(X)
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(X)
+        times.append(time.perf_counter() - t0)
+    ms = np.asarray(times) * 1000
+    return float(np.percentile(ms, 50)), float(np.percentile(ms, 99))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bosque compilado frente a scikit-learn")
+    parser.add_argument('--sizes', default='1,8,64,1000', help="filas por llamada")
+    parser.add_argument('--repeat', type=int, default=200, help="llamadas por medida")
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, ROOT)
+    from compiled_forest import _load_sklearn_artifacts, compile_forest
+
+    model, vectorizer, _, _ = _load_sklearn_artifacts()
+    start = time.perf_counter()
+    compiled = compile_forest(model)
+    print(f"Compilado en {(time.perf_counter() - start) * 1000:.1f} ms: {compiled.n_estimators} árboles, "
+          f"{compiled.n_nodes} nodos, profundidad {compiled.max_depth}")
+    serial = copy.copy(model)
+    serial.n_jobs = 1
+
+    sizes = [int(s) for s in args.sizes.split(',') if s.strip()]
+    texts = [row['modelo'] for row in synthetic_data.generate_rows(max(sizes), seed=7)]
+    print(f"\n{'filas':>6}{'modelo':>18}{'p50 ms':>10}{'p99 ms':>10}{'filas/s':>12}")
+    for size in sizes:
+        X = vectorizer.transform(texts[:size])
+        if not np.array_equal(model.predict_proba(X), compiled.predict_proba(X)):
+            print(f"ERROR: las probabilidades difieren con {size} filas")
+            return 1
+        repeat = max(args.repeat * 8 // max(size, 8), 5)
+        for name, fn in (('sklearn', model.predict_proba), ('sklearn n_jobs=1', serial.predict_proba),
+                         ('compilado', compiled.predict_proba)):
+            p50, p99 = timeit(fn, X, repeat)
+            print(f"{size:>6}{name:>18}{p50:>10.3f}{p99:>10.3f}{size / (p50 / 1000):>12.0f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
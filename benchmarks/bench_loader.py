@@ -0,0 +1,81 @@
+"""Memoria y tiempo de la carga de datos: CSV entero frente a `data_loader.py` por trozos.
+
+Genera un CSV sintético de `--rows` filas y, cada modo en un proceso aparte
+(para que el pico de RSS sea el suyo), mide:
+
+- full: `pd.read_csv` + `ml_model.prepare` (la carga actual),
+- chunks: `TrainingData` sin caché (parsea el CSV por trozos),
+- cache-build: primera ejecución con caché (parsea y escribe los `.npy`),
+- cache-read: ejecuciones siguientes (sólo lee los `.npy`).
+
+En todos los modos se leen todos los textos, como lo hace el entrenamiento
+en streaming. Se informa también la memoria tras los imports (pandas,
+scikit-learn), común a los cuatro.
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.bench_loader --rows 1000000
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from benchmarks import synthetic_data
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODES = ('full', 'chunks', 'cache-build', 'cache-read')
+
+_CHILD = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+mode, path, cache_dir, chunk_mb = {mode!r}, {path!r}, {cache_dir!r}, {chunk_mb!r}
+import numpy as np
+import pandas as pd
+import data_loader
+import ml_model
+baseline = data_loader.peak_rss_mb()
+start = time.perf_counter()
+if mode == 'full':
+    texts, labels = ml_model.prepare(pd.read_csv(path, sep=';'))
+    rows = int((texts != '').sum())
+else:
+    data = data_loader.TrainingData([(path, 'modelo', 'prediccion_ml')],
+                                    cache_dir=None if mode == 'chunks' else cache_dir, memory_mb=chunk_mb)
+    # Comparar con '' obliga a leer cada texto (los .npy se abren con mmap).
+    rows = sum(int((t != '').sum()) for t, _ in data.chunks())
+print(json.dumps({{'seconds': time.perf_counter() - start, 'rows': rows, 'baseline_mb': baseline,
+                  'peak_rss_mb': data_loader.peak_rss_mb()}}))
+"""
+
+
+def run_mode(mode, path, cache_dir, chunk_mb):
+    code = _CHILD.format(root=ROOT, mode=mode, path=path, cache_dir=cache_dir, chunk_mb=chunk_mb)
+    out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de la carga de datos por trozos")
+    parser.add_argument('--rows', type=int, default=500000)
+    parser.add_argument('--chunk-mb', type=float, default=64.0)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args(argv)
+
+    tmp = tempfile.mkdtemp(prefix='donapp_bench_loader_')
+    try:
+        path = synthetic_data.write_csv(os.path.join(tmp, 'data.csv'), args.rows, args.seed)
+        print(f"CSV de {args.rows} filas: {os.path.getsize(path) / 2 ** 20:.1f} MB")
+        print(f"{'modo':<14}{'segundos':>10}{'filas':>10}{'RSS pico MB':>14}{'tras imports':>14}")
+        for mode in MODES:
+            m = run_mode(mode, path, os.path.join(tmp, 'cache'), args.chunk_mb)
+            print(f"{mode:<14}{m['seconds']:>10.2f}{m['rows']:>10}{m['peak_rss_mb']:>14.1f}{m['baseline_mb']:>14.1f}")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
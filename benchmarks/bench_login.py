@@ -0,0 +1,67 @@
+"""Benchmark del inicio de sesión y de la carga de usuarios.
+
+Mide, contra una base de datos temporal:
+- logins/s a través de `/login` con el cliente de pruebas de Flask,
+- búsquedas/s de `get_user_by_username`,
+- cargas/s de `get_user_by_id` (el `user_loader` de Flask-Login) con la caché.
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.bench_login --users 1000 --logins 200
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+
+def _rate(n, seconds):
+    return n / seconds if seconds else float('inf')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de login")
+    parser.add_argument('--users', type=int, default=1000, help="usuarios a crear")
+    parser.add_argument('--logins', type=int, default=200, help="logins a medir")
+    parser.add_argument('--lookups', type=int, default=20000, help="búsquedas a medir")
+    parser.add_argument('--hash-method', default='pbkdf2:sha256:1000',
+                        help="método de hash para crear los usuarios (barato por defecto)")
+    args = parser.parse_args(argv)
+
+    tmp = tempfile.mkdtemp(prefix='bench_login_')
+    os.environ['USERS_DB'] = os.path.join(tmp, 'users.db')
+    os.environ['PASSWORD_HASH_METHOD'] = args.hash_method
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import user_model
+    from app import app
+
+    names = [f"bench_{i}" for i in range(args.users)]
+    start = time.perf_counter()
+    for name in names:
+        user_model.add_new_user(name, 'secreto')
+    print(f"Alta de {args.users} usuarios: {time.perf_counter() - start:.2f} s")
+
+    client = app.test_client()
+    start = time.perf_counter()
+    for _ in range(args.logins):
+        client.post('/login', data={'username': random.choice(names), 'password': 'secreto'})
+        client.get('/logout')
+    elapsed = time.perf_counter() - start
+    print(f"Login + logout vía /login: {_rate(args.logins, elapsed):.1f} /s")
+
+    start = time.perf_counter()
+    for _ in range(args.lookups):
+        user_model.get_user_by_username(random.choice(names))
+    print(f"get_user_by_username: {_rate(args.lookups, time.perf_counter() - start):.0f} /s")
+
+    ids = [user_model.get_user_by_username(n).id for n in names[:100]]
+    start = time.perf_counter()
+    for _ in range(args.lookups):
+        user_model.get_user_by_id(random.choice(ids))
+    print(f"get_user_by_id (con caché): {_rate(args.lookups, time.perf_counter() - start):.0f} /s")
+    print("Estadísticas del repositorio:", user_model.users.stats())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,483 @@
+"""Suite de benchmarks reproducible para los endpoints y el entrenamiento.
+
+Tres objetivos:
+
+- client: `/predict`, `/feedback`, `/login` y `/download_pdf` con el cliente
+  de pruebas de Flask (en proceso, sin red).
+- gunicorn: los mismos escenarios contra un gunicorn local, con varias
+  peticiones concurrentes.
+- train: `ml_model.main()` sobre 1k/10k/100k filas sintéticas, cada tamaño en
+  un proceso aparte para que el pico de memoria sea el suyo.
+
+Cada objetivo se ejecuta sobre una copia del proyecto en un directorio
+temporal (los registros, PDFs, usuarios y artefactos que genera no tocan el
+árbol de trabajo). Por escenario se informa p50/p95/p99, rendimiento,
+errores, pico de RSS y nº de descriptores de archivo e hilos.
+
+Los resultados se comparan con una baseline JSON; si alguna métrica empeora
+más que la tolerancia el proceso termina con código 1. Sin baseline (o si
+ningún escenario medido aparece en ella) termina con código 2, antes de
+medir nada cuando falta el archivo: la baseline depende de la máquina, así
+que se crea con --save-baseline en la misma donde se va a comparar.
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.bench_suite --save-baseline          # primera vez
+    python -m benchmarks.bench_suite                          # compara con la baseline
+    python -m benchmarks.bench_suite --targets client --requests 100 --train-rows 1000
+"""
+import argparse
+import contextlib
+import http.client
+import json
+import os
+import platform
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+from benchmarks import synthetic_data
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines')
+DEFAULT_BASELINE = os.path.join(BASELINE_DIR, 'baseline.json')
+
+TARGETS = ('client', 'gunicorn', 'train')
+SCENARIOS = ('predict', 'feedback', 'login', 'download_pdf')
+DEFAULT_TRAIN_ROWS = '1000,10000,100000'
+
+# Lo que no se copia al preparar el proyecto temporal.
+STAGE_IGNORE = shutil.ignore_patterns('.git', 'benchmarks', '__pycache__', 'tmp_pdfs', 'incremental',
+                                      'data_log.csv*', 'users.db*', 'user_feedback.csv', '*.lock',
+                                      'requests.jsonl')
+
+# Métricas vigiladas frente a la baseline: (mejor si es menor, holgura absoluta).
+# La holgura evita falsos positivos en valores muy pequeños (1 ms, 2 hilos...).
+GATED_METRICS = {
+    'p50_ms': (True, 1.0),
+    'p95_ms': (True, 2.0),
+    'p99_ms': (True, 5.0),
+    'throughput_rps': (False, 5.0),
+    'error_rate': (True, 0.02),
+    'peak_rss_mb': (True, 10.0),
+    'fds': (True, 4),
+    'threads': (True, 2),
+    'seconds': (True, 0.5),
+}
+
+
+# --- Entorno ---
+
+def stage_project(dest):
+    """Copia el proyecto a `dest` (sin estado de ejecución) y devuelve su entorno."""
+    shutil.copytree(ROOT, dest, ignore=STAGE_IGNORE)
+    env = dict(os.environ)
+    env.update({
+        'ARTIFACTS_DIR': os.path.join(dest, 'artifacts'),
+        'USERS_DB': os.path.join(dest, 'users.db'),
+        # Los PDFs de la prueba de descarga deben sobrevivir a toda la ejecución.
+        'PDF_RETENTION_SECONDS': '3600',
+        'PYTHONDONTWRITEBYTECODE': '1',
+        # Un solo cliente (una IP) a máxima velocidad: sin control de admisión
+        # se mide el servidor, no el descarte (ver bench_admission.py).
+        'ADMISSION_LIMITS': '',
+    })
+    env.pop('PREDICTION_CACHE_DB', None)
+    return env
+
+
+def _proc_status(pid):
+    values = {}
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            key, _, value = line.partition(':')
+            values[key] = value.strip()
+    return values
+
+
+def _children(pid):
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            return [int(p) for p in f.read().split()]
+    except OSError:
+        return []
+
+
+def process_stats(pids):
+    """Pico de RSS (MB), descriptores e hilos sumados sobre `pids`.
+
+    Usa /proc (Linux). En otros sistemas sólo informa el pico de RSS del
+    proceso actual.
+    """
+    if not os.path.isdir('/proc'):
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return {'peak_rss_mb': round(rss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)}
+    peak_kb = fds = threads = 0
+    for pid in pids:
+        try:
+            status = _proc_status(pid)
+            peak_kb += int(status.get('VmHWM', '0 kB').split()[0])
+            threads += int(status.get('Threads', '0'))
+            fds += len(os.listdir(f'/proc/{pid}/fd'))
+        except (OSError, ValueError):
+            continue
+    return {'peak_rss_mb': round(peak_kb / 1024, 1), 'fds': fds, 'threads': threads}
+
+
+def summarize(latencies, elapsed, statuses):
+    """Percentiles (ms), rendimiento y errores de una serie de peticiones."""
+    ms = np.asarray(latencies) * 1000
+    counts = {}
+    for status in statuses:
+        counts[str(status)] = counts.get(str(status), 0) + 1
+    errors = sum(1 for status in statuses if status >= 400)
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99]) if len(ms) else (0.0, 0.0, 0.0)
+    return {
+        'requests': len(latencies),
+        'p50_ms': round(float(p50), 3),
+        'p95_ms': round(float(p95), 3),
+        'p99_ms': round(float(p99), 3),
+        'mean_ms': round(float(ms.mean()), 3) if len(ms) else 0.0,
+        'throughput_rps': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'error_rate': round(errors / len(latencies), 4) if latencies else 0.0,
+        'statuses': counts,
+    }
+
+
+# --- Escenarios ---
+
+def _prepare_pdf(stage, row):
+    """Deja un informe en `tmp_pdfs/` del proyecto temporal y devuelve su nombre."""
+    if stage not in sys.path:
+        sys.path.insert(0, stage)
+    import predict
+    filename = predict.report_filename(row, 'Funcional')
+    os.makedirs(os.path.join(stage, 'tmp_pdfs'), exist_ok=True)
+    with open(os.path.join(stage, 'tmp_pdfs', filename), 'wb') as f:
+        f.write(predict.generate_prediction_pdf(row, 'Funcional').getvalue())
+    return filename
+
+
+def make_request(scenario, i, rows, pdf_name):
+    """Petición `i` del escenario: dict con method, path y form/json."""
+    row = rows[i % len(rows)]
+    if scenario == 'predict':
+        return {'method': 'POST', 'path': '/predict', 'form': row}
+    if scenario == 'feedback':
+        label = synthetic_data.CLASES[i % len(synthetic_data.CLASES)]
+        return {'method': 'POST', 'path': '/feedback', 'json': {'modelo': row['modelo'], 'clasificacion_real': label}}
+    if scenario == 'login':
+        return {'method': 'POST', 'path': '/login', 'form': {'username': 'admin', 'password': 'pass123'}}
+    if scenario == 'download_pdf':
+        return {'method': 'GET', 'path': f'/download_pdf/{pdf_name}'}
+    raise ValueError(f"Escenario desconocido: {scenario}")
+
+
+def run_client(stage, env, scenarios, n_requests, rows):
+    """Escenarios con el cliente de pruebas de Flask, en este mismo proceso."""
+    os.environ.update(env)
+    os.chdir(stage)
+    sys.path.insert(0, stage)
+    pdf_name = _prepare_pdf(stage, rows[0])
+    from app import app
+    # Sin cookies: cada POST /login vuelve a verificar la contraseña.
+    client = app.test_client(use_cookies=False)
+    results = {}
+    for scenario in scenarios:
+        for i in range(min(5, n_requests)):  # calentamiento
+            _client_call(client, make_request(scenario, i, rows, pdf_name))
+        latencies, statuses = [], []
+        start = time.perf_counter()
+        for i in range(n_requests):
+            spec = make_request(scenario, i, rows, pdf_name)
+            t0 = time.perf_counter()
+            statuses.append(_client_call(client, spec))
+            latencies.append(time.perf_counter() - t0)
+        elapsed = time.perf_counter() - start
+        results[f'client/{scenario}'] = {**summarize(latencies, elapsed, statuses),
+                                         **process_stats([os.getpid()])}
+    return results
+
+
+def _client_call(client, spec):
+    response = client.open(spec['path'], method=spec['method'], data=spec.get('form'), json=spec.get('json'))
+    response.close()
+    return response.status_code
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+@contextlib.contextmanager
+def gunicorn_server(stage, env, workers):
+    """Arranca `gunicorn app:app` en el proyecto temporal y espera a que responda."""
+    port = _free_port()
+    log = open(os.path.join(stage, 'gunicorn.log'), 'wb')
+    proc = subprocess.Popen([sys.executable, '-m', 'gunicorn', '--chdir', stage, '-w', str(workers),
+                             '-b', f'127.0.0.1:{port}', 'app:app'],
+                            cwd=stage, env=env, stdout=log, stderr=subprocess.STDOUT)
+    try:
+        deadline = time.monotonic() + 120
+        while True:
+            if proc.poll() is not None:
+                raise RuntimeError(f"gunicorn terminó al arrancar; ver {log.name}")
+            try:
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+                conn.request('GET', '/login')
+                conn.getresponse().read()
+                conn.close()
+                # Todos los workers deben haber cargado la app antes de medir.
+                if len(_children(proc.pid)) >= workers:
+                    break
+            except OSError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError("gunicorn no respondió en 120 s")
+            time.sleep(0.2)
+        yield port, proc.pid
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        log.close()
+
+
+def _http_call(local, port, spec):
+    conn = getattr(local, 'conn', None)
+    if conn is None:
+        conn = local.conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    headers, body = {}, None
+    if spec.get('form') is not None:
+        body = urllib.parse.urlencode(spec['form'])
+        headers['Content-Type'] = 'application/x-www-form-urlencoded'
+    elif spec.get('json') is not None:
+        body = json.dumps(spec['json'])
+        headers['Content-Type'] = 'application/json'
+    t0 = time.perf_counter()
+    try:
+        conn.request(spec['method'], spec['path'], body=body, headers=headers)
+        response = conn.getresponse()
+        response.read()
+        status = response.status
+    except (OSError, http.client.HTTPException):
+        conn.close()
+        status = 599
+    return time.perf_counter() - t0, status
+
+
+def run_gunicorn(stage, env, scenarios, n_requests, rows, workers, concurrency):
+    """Escenarios contra un gunicorn local con `concurrency` clientes en paralelo."""
+    pdf_name = _prepare_pdf(stage, rows[0])
+    results = {}
+    with gunicorn_server(stage, env, workers) as (port, master):
+        local = threading.local()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for scenario in scenarios:
+                warmup = [make_request(scenario, i, rows, pdf_name) for i in range(min(concurrency, n_requests))]
+                list(pool.map(lambda spec: _http_call(local, port, spec), warmup))
+                specs = [make_request(scenario, i, rows, pdf_name) for i in range(n_requests)]
+                start = time.perf_counter()
+                timings = list(pool.map(lambda spec: _http_call(local, port, spec), specs))
+                elapsed = time.perf_counter() - start
+                pids = [master] + _children(master)
+                results[f'gunicorn/{scenario}'] = {
+                    **summarize([t for t, _ in timings], elapsed, [s for _, s in timings]),
+                    **process_stats(pids), 'workers': workers, 'concurrency': concurrency,
+                }
+    return results
+
+
+# Se ejecuta en un proceso hijo: importa ml_model, llama a main() y mide.
+_TRAIN_CHILD = """
+import contextlib, io, json, resource, time
+t0 = time.perf_counter()
+import ml_model
+imported = time.perf_counter()
+with contextlib.redirect_stdout(io.StringIO()):
+    ml_model.main([])
+done = time.perf_counter()
+print(json.dumps({'seconds': done - imported, 'import_seconds': imported - t0,
+                  'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}))
+"""
+
+
+def run_training(stage, env, sizes, seed):
+    """Tiempo y memoria de `ml_model.main()` para cada tamaño de dataset."""
+    results = {}
+    data_path = os.path.join(stage, 'data', 'donapp_data_tecnico.csv')
+    env = dict(env, ARTIFACTS_DIR=os.path.join(stage, 'artifacts_train'))
+    for n in sizes:
+        synthetic_data.write_csv(data_path, n, seed)
+        out = subprocess.run([sys.executable, '-c', _TRAIN_CHILD], cwd=stage, env=env,
+                             capture_output=True, text=True, check=True)
+        measured = json.loads(out.stdout.strip().splitlines()[-1])
+        results[f'train/{n}'] = {
+            'rows': n,
+            'seconds': round(measured['seconds'], 3),
+            'import_seconds': round(measured['import_seconds'], 3),
+            'rows_per_second': round(n / measured['seconds'], 1),
+            'peak_rss_mb': round(measured['peak_rss_mb'], 1),
+        }
+        print(f"  train/{n}: {results[f'train/{n}']['seconds']:.2f} s")
+    return results
+
+
+# --- Baseline ---
+
+def compare(results, baseline, tolerance):
+    """Lista de regresiones (texto) de `results` frente a `baseline`."""
+    regressions = []
+    for name, metrics in results.items():
+        base = baseline.get('results', {}).get(name)
+        if base is None:
+            continue
+        for metric, (lower_is_better, slack) in GATED_METRICS.items():
+            if metric not in metrics or metric not in base:
+                continue
+            new, old = metrics[metric], base[metric]
+            if lower_is_better:
+                worse = new > old * (1 + tolerance) and new - old > slack
+            else:
+                worse = new < old / (1 + tolerance) and old - new > slack
+            if worse:
+                regressions.append(f"{name} {metric}: {old} -> {new}")
+    return regressions
+
+
+def print_results(results):
+    print(f"\n{'escenario':<26}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'req/s':>9}"
+          f"{'err':>7}{'RSS MB':>9}{'fds':>6}{'hilos':>7}")
+    for name, m in results.items():
+        if name.startswith('train/'):
+            print(f"{name:<26}{m['seconds']:>9.2f} s{'':>17}{m['rows_per_second']:>9.0f} filas/s"
+                  f"{m['peak_rss_mb']:>9.1f}")
+            continue
+        print(f"{name:<26}{m['p50_ms']:>9.2f}{m['p95_ms']:>9.2f}{m['p99_ms']:>9.2f}{m['throughput_rps']:>9.1f}"
+              f"{m['error_rate']:>7.2f}{m['peak_rss_mb']:>9.1f}{m.get('fds', ''):>6}{m.get('threads', ''):>7}")
+
+
+def _csv_list(value):
+    return [v.strip() for v in value.split(',') if v.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks de DonApp")
+    parser.add_argument('--targets', default=','.join(TARGETS), help="client,gunicorn,train")
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--requests', type=int, default=200, help="peticiones por escenario")
+    parser.add_argument('--concurrency', type=int, default=8, help="clientes en paralelo contra gunicorn")
+    parser.add_argument('--workers', type=int, default=2, help="workers de gunicorn")
+    parser.add_argument('--train-rows', default=DEFAULT_TRAIN_ROWS, help="tamaños para ml_model.main()")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help="guardar esta ejecución como baseline")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="empeoramiento relativo permitido")
+    parser.add_argument('--output', help="guardar también los resultados en este JSON")
+    parser.add_argument('--keep', action='store_true', help="no borrar los proyectos temporales")
+    args = parser.parse_args(argv)
+
+    targets = _csv_list(args.targets)
+    scenarios = _csv_list(args.scenarios)
+    for name in targets:
+        if name not in TARGETS:
+            parser.error(f"objetivo desconocido: {name}")
+    for name in scenarios:
+        if name not in SCENARIOS:
+            parser.error(f"escenario desconocido: {name}")
+
+    if not args.save_baseline and not os.path.exists(args.baseline):
+        print(f"ERROR: no hay baseline en {args.baseline}; créala en esta máquina con --save-baseline "
+              f"o indica otra con --baseline.")
+        return 2
+
+    rows = synthetic_data.form_rows(max(args.requests, 1), args.seed)
+    tmp = tempfile.mkdtemp(prefix='donapp_bench_')
+    results = {}
+    cwd = os.getcwd()
+    try:
+        if 'gunicorn' in targets:
+            try:
+                import gunicorn  # noqa: F401
+            except ImportError:
+                print("Advertencia: gunicorn no está instalado; se omite ese objetivo.")
+                targets.remove('gunicorn')
+        # gunicorn primero: el objetivo client importa la app en este proceso.
+        if 'gunicorn' in targets:
+            print("gunicorn...")
+            stage = os.path.join(tmp, 'gunicorn')
+            env = stage_project(stage)
+            results.update(run_gunicorn(stage, env, scenarios, args.requests, rows,
+                                        args.workers, args.concurrency))
+        if 'train' in targets:
+            print("entrenamiento...")
+            stage = os.path.join(tmp, 'train')
+            env = stage_project(stage)
+            results.update(run_training(stage, env, [int(n) for n in _csv_list(args.train_rows)], args.seed))
+        if 'client' in targets:
+            print("cliente de pruebas...")
+            stage = os.path.join(tmp, 'client')
+            env = stage_project(stage)
+            results.update(run_client(stage, env, scenarios, args.requests, rows))
+    finally:
+        os.chdir(cwd)
+        if not args.keep:
+            shutil.rmtree(tmp, ignore_errors=True)
+        else:
+            print("Proyectos temporales en:", tmp)
+
+    report = {
+        'meta': {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'requests': args.requests,
+            'seed': args.seed,
+        },
+        'results': results,
+    }
+    print_results(results)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nBaseline guardada en {args.baseline}")
+        return 0
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    unmatched = [name for name in results if name not in baseline.get('results', {})]
+    if unmatched:
+        print(f"\nAdvertencia: sin baseline para {', '.join(unmatched)}; no se comparan.")
+        if len(unmatched) == len(results):
+            print(f"ERROR: ningún escenario medido está en {args.baseline}.")
+            return 2
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"\nRegresiones frente a {args.baseline} (tolerancia {args.tolerance:.0%}):")
+        for line in regressions:
+            print("  -", line)
+        return 1
+    print(f"\nSin regresiones frente a {args.baseline}.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
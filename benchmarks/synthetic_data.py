@@ -0,0 +1,111 @@
+"""Generador de datos sintéticos con el esquema de `donapp_data_tecnico.csv`.
+
+Las filas son deterministas para una semilla dada, así que dos ejecuciones
+del benchmark entrenan y consultan exactamente lo mismo. Los valores imitan
+los del dataset real, incluidas sus irregularidades ("8" y "8GB", "1" y "si").
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.synthetic_data --rows 10000 -o /tmp/donapp_10k.csv
+"""
+import argparse
+import csv
+import random
+
+COLUMNS = ['id_usuario', 'nombre_usuario', 'tipo_usuario', 'tipo', 'marca', 'modelo', 'anio',
+           'estado_fisico', 'encendido', 'fallas', 'ram', 'almacenamiento', 'descripcion',
+           'destino', 'prediccion_ml']
+FORM_COLUMNS = COLUMNS[:-1]
+
+TIPOS_USUARIO = ['Beneficiario', 'Administrador', 'Técnico', 'Donante', 'tecnico', 'cliente']
+# tipo -> (marcas, series de modelo)
+EQUIPOS = {
+    'Celular': (['Samsung', 'Apple', 'Xiaomi', 'Huawei'], ['Galaxy S', 'Galaxy A', 'iPhone ', 'Redmi Note ', 'P']),
+    'Tablet': (['Samsung', 'Apple', 'Huawei', 'Lenovo'], ['Galaxy Tab S', 'iPad ', 'MatePad ', 'Tab M']),
+    'Laptop': (['Lenovo', 'Dell', 'HP', 'Asus', 'Toshiba'], ['IdeaPad ', 'Inspiron ', 'Pavilion ', 'VivoBook X', 'Satellite C']),
+    'PC': (['Dell', 'HP', 'Lenovo'], ['OptiPlex ', 'ProDesk ', 'ThinkCentre M']),
+    'Monitor': (['LG', 'Samsung', 'Dell'], ['UltraWide ', 'Odyssey G', 'P']),
+    'Impresora': (['HP', 'Epson', 'Canon'], ['LaserJet ', 'EcoTank L', 'Pixma G']),
+}
+NOMBRES = ['Ana', 'Luis', 'Mary', 'Joseph', 'Carmen', 'Scott', 'Theresa', 'Jared', 'Lucía', 'Diego']
+APELLIDOS = ['Adams', 'Butler', 'Arias', 'Glenn', 'Watson', 'Brooks', 'Pérez', 'Gómez']
+FALLAS = ['0', '1', '2', '3', 'no carga', 'pantalla rota', 'otro']
+DESCRIPCIONES = [
+    'Teclado y touchpad en óptimo estado', 'No enciende, posible daño en placa base',
+    'Presenta errores de arranque en BIOS', 'Puerto USB no funciona correctamente',
+    'Problemas de sobrecalentamiento al ejecutar tareas pesadas', 'Batería baja',
+    'Conector de carga suelto, requiere ajuste', 'Altavoces no emiten sonido',
+]
+DESTINOS = ['Reacondicionamiento', 'Educativo', 'Reciclaje', 'Donación', 'Reparación']
+CLASES = ['Funcional', 'Semi-funcional', 'No funcional']
+
+
+def _label(estado, encendido, fallas):
+    """Etiqueta con algo de señal (estado, encendido, fallas) más ruido."""
+    score = estado / 10 + (0.3 if encendido else -0.3) - 0.1 * fallas
+    if score > 0.7:
+        return CLASES[0]
+    if score > 0.3:
+        return CLASES[1]
+    return CLASES[2]
+
+
+def generate_rows(n, seed=42):
+    """Genera `n` filas (dicts con `COLUMNS`)."""
+    rng = random.Random(seed)
+    tipos = list(EQUIPOS)
+    for i in range(n):
+        tipo = rng.choice(tipos)
+        marcas, series = EQUIPOS[tipo]
+        estado = rng.randint(1, 10)
+        encendido = rng.random() < 0.7
+        n_fallas = rng.randint(0, 3)
+        ram = str(rng.choice([2, 4, 8, 16]))
+        almacenamiento = str(rng.choice([16, 32, 64, 128, 256, 512]))
+        label = _label(estado, encendido, n_fallas)
+        if rng.random() < 0.2:
+            label = rng.choice(CLASES)
+        yield {
+            'id_usuario': str(i + 1),
+            'nombre_usuario': f"{rng.choice(NOMBRES)} {rng.choice(APELLIDOS)}",
+            'tipo_usuario': rng.choice(TIPOS_USUARIO),
+            'tipo': tipo,
+            'marca': rng.choice(marcas),
+            'modelo': f"{rng.choice(series)}{rng.randint(1, 40)}",
+            'anio': str(rng.randint(2008, 2024)),
+            'estado_fisico': str(estado),
+            'encendido': rng.choice(['1', 'si']) if encendido else rng.choice(['0', 'no']),
+            'fallas': str(n_fallas) if rng.random() < 0.8 else rng.choice(FALLAS),
+            'ram': ram + rng.choice(['', 'GB']),
+            'almacenamiento': almacenamiento + rng.choice(['', 'GB']),
+            'descripcion': rng.choice(DESCRIPCIONES),
+            'destino': rng.choice(DESTINOS),
+            'prediccion_ml': label,
+        }
+
+
+def form_rows(n, seed=42):
+    """Filas sin `prediccion_ml`, tal como las envía el formulario de /predict."""
+    return [{k: row[k] for k in FORM_COLUMNS} for row in generate_rows(n, seed)]
+
+
+def write_csv(path, n, seed=42):
+    """Escribe `n` filas en `path` con el separador `;` del dataset original."""
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS, delimiter=';')
+        writer.writeheader()
+        writer.writerows(generate_rows(n, seed))
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Genera un CSV sintético de DonApp")
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('-o', '--output', required=True)
+    args = parser.parse_args(argv)
+    write_csv(args.output, args.rows, args.seed)
+    print(f"{args.rows} filas escritas en {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,218 @@
+"""RandomForest "compilado" a arrays planos para predecir con baja latencia.
+
+Con una sola fila, `RandomForestClassifier.predict_proba` pasa casi todo el
+tiempo repartiendo los 150 árboles entre hilos de joblib (`n_jobs=-1`) y
+validando la entrada de cada uno, no recorriendo los árboles. `CompiledForest`
+guarda todos los nodos del bosque en arrays contiguos de NumPy:
+
+    feature[n], threshold[n]   <- variable y umbral de cada nodo
+    left[n], right[n]          <- hijos (índices absolutos); una hoja apunta a sí misma
+    value[n, clases]           <- probabilidades de cada nodo
+    roots[árboles]             <- nodo raíz de cada árbol
+
+y recorre todos los árboles a la vez, un nivel por iteración, para todas las
+filas del lote. Las probabilidades coinciden con las de scikit-learn: la
+entrada se compara en float32 como en `tree_.predict` y los árboles se suman
+en el mismo orden.
+
+Formato de artefacto: un `.npz` sin comprimir con esos arrays, `classes`,
+`max_depth`, `n_features` y `format_version`. `ArtifactRegistry.publish`
+lo guarda junto al modelo (`forest.npz`) y `InferenceEngine` lo usa en lugar
+de cargar el bosque de joblib.
+
+    python compiled_forest.py check               # paridad con scikit-learn
+    python compiled_forest.py export              # republica la versión activa con forest.npz
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+
+FORMAT_VERSION = 1
+# Filas que se densifican a la vez al predecir lotes grandes.
+CHUNK_ROWS = 256
+
+
+class CompiledForest:
+    """Predictor compacto de un `RandomForestClassifier` ya entrenado.
+
+    Expone `classes_`, `n_features_in_` y `predict_proba` para sustituir
+    al estimador en `_Pipeline`.
+    """
+
+    def __init__(self, feature, threshold, left, right, value, roots, classes, max_depth, n_features):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.classes_ = classes
+        self.max_depth = int(max_depth)
+        self.n_features_in_ = int(n_features)
+
+    @property
+    def n_estimators(self):
+        return len(self.roots)
+
+    @property
+    def n_nodes(self):
+        return len(self.feature)
+
+    def predict_proba(self, X):
+        if hasattr(X, 'toarray'):
+            X = X.tocsr()
+        else:
+            X = np.asarray(X)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"Se esperaban {self.n_features_in_} columnas, llegaron {X.shape}")
+        out = np.empty((X.shape[0], self.value.shape[1]), dtype=np.float64)
+        for start in range(0, X.shape[0], CHUNK_ROWS):
+            chunk = X[start:start + CHUNK_ROWS]
+            dense = chunk.toarray() if hasattr(chunk, 'toarray') else chunk
+            out[start:start + CHUNK_ROWS] = self._predict_dense(np.asarray(dense, dtype=np.float32))
+        return out
+
+    def predict(self, X):
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1))
+
+    def _predict_dense(self, X):
+        n = X.shape[0]
+        rows = np.arange(n)[:, None]
+        node = np.broadcast_to(self.roots, (n, len(self.roots))).copy()
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[node]] <= self.threshold[node]
+            node = np.where(go_left, self.left[node], self.right[node])
+        # (árboles, filas, clases) sumado sobre el eje 0: acumula árbol a
+        # árbol en orden, igual que `ForestClassifier.predict_proba`.
+        proba = self.value[node.T].sum(axis=0)
+        proba /= len(self.roots)
+        return proba
+
+    # --- Artefacto ---
+    def save(self, path):
+        tmp = f"{path}.tmp.npz"
+        np.savez(tmp, feature=self.feature, threshold=self.threshold, left=self.left, right=self.right,
+                 value=self.value, roots=self.roots, classes=self.classes_, max_depth=self.max_depth,
+                 n_features=self.n_features_in_, format_version=FORMAT_VERSION)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            version = int(data['format_version'])
+            if version != FORMAT_VERSION:
+                raise ValueError(f"Formato de bosque compilado {version} no soportado")
+            return cls(data['feature'], data['threshold'], data['left'], data['right'], data['value'],
+                       data['roots'], data['classes'], data['max_depth'], data['n_features'])
+
+
+def is_compilable(model):
+    """True si `model` es un bosque de árboles de clasificación de una salida."""
+    return (hasattr(model, 'estimators_') and hasattr(model, 'classes_')
+            and getattr(model, 'n_outputs_', 1) == 1
+            and all(hasattr(e, 'tree_') for e in model.estimators_))
+
+
+def compile_forest(model):
+    """Aplana un `RandomForestClassifier` (o `ExtraTreesClassifier`) entrenado."""
+    if not is_compilable(model):
+        raise ValueError(f"No se puede compilar un {type(model).__name__}")
+    n_classes = len(model.classes_)
+    features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+    offset = max_depth = 0
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        ids = np.arange(tree.node_count, dtype=np.int32)
+        leaf = tree.children_left == -1
+        features.append(np.where(leaf, 0, tree.feature).astype(np.int32))
+        thresholds.append(np.where(leaf, np.inf, tree.threshold))
+        lefts.append(np.where(leaf, ids, tree.children_left).astype(np.int32) + offset)
+        rights.append(np.where(leaf, ids, tree.children_right).astype(np.int32) + offset)
+        value = np.array(tree.value[:, 0, :n_classes], dtype=np.float64)
+        # scikit-learn < 1.4 guarda recuentos; predict_proba los normaliza así.
+        normalizer = value.sum(axis=1, keepdims=True)
+        if not np.allclose(normalizer, 1.0):
+            normalizer[normalizer == 0.0] = 1.0
+            value /= normalizer
+        values.append(value)
+        roots.append(offset)
+        offset += tree.node_count
+        max_depth = max(max_depth, tree.max_depth)
+    return CompiledForest(np.concatenate(features), np.concatenate(thresholds), np.concatenate(lefts),
+                          np.concatenate(rights), np.concatenate(values), np.asarray(roots, dtype=np.int32),
+                          np.asarray(model.classes_), max_depth, model.n_features_in_)
+
+
+def parity_report(model, compiled, X):
+    """Compara `predict_proba` de scikit-learn y del bosque compilado sobre `X`."""
+    expected = model.predict_proba(X)
+    got = compiled.predict_proba(X)
+    return {
+        'rows': int(X.shape[0]),
+        'max_abs_diff': float(np.max(np.abs(expected - got))) if len(expected) else 0.0,
+        'identical': bool(np.array_equal(expected, got)),
+        'same_argmax': bool(np.array_equal(expected.argmax(axis=1), got.argmax(axis=1))),
+    }
+
+
+def _load_sklearn_artifacts(version=None):
+    """(model, vectorizer, encoder, manifest) del registro o, si no hay versión, de la raíz."""
+    from artifact_registry import ArtifactRegistry
+    registry = ArtifactRegistry()
+    if version or registry.current_version():
+        return registry.load(version, mmap_mode=None)
+    import joblib
+    from ml_model import ENCODER_FILENAME, MODEL_FILENAME, VECTORIZER_FILENAME
+    return joblib.load(MODEL_FILENAME), joblib.load(VECTORIZER_FILENAME), joblib.load(ENCODER_FILENAME), None
+
+
+def _parity_texts(rows):
+    """Hasta `rows` textos del dataset de entrenamiento (`data_loader.default_sources`)."""
+    from data_loader import default_sources, iter_csv_chunks
+    texts = []
+    for path, text_col, label_col in default_sources():
+        for chunk, _ in iter_csv_chunks(path, text_col, label_col):
+            texts.extend(chunk[:rows - len(texts)].tolist())
+            if len(texts) >= rows:
+                return texts
+    return texts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bosque compilado: paridad y exportación")
+    parser.add_argument('command', choices=('check', 'export'))
+    parser.add_argument('--version', help="versión del registro (por defecto, la activa)")
+    parser.add_argument('--rows', type=int, default=2000, help="filas del dataset para la paridad")
+    args = parser.parse_args(argv)
+
+    model, vectorizer, encoder, manifest = _load_sklearn_artifacts(args.version)
+    if vectorizer is None or not is_compilable(model):
+        print(f"El modelo ({type(model).__name__}) no es un bosque sobre TF-IDF; nada que compilar.")
+        return 1
+    compiled = compile_forest(model)
+    print(f"{compiled.n_estimators} árboles, {compiled.n_nodes} nodos, profundidad máxima {compiled.max_depth}")
+
+    texts = _parity_texts(args.rows)
+    if not texts:
+        print("No hay textos en el dataset de entrenamiento para comprobar la paridad.")
+        return 1
+    report = parity_report(model, compiled, vectorizer.transform(texts))
+    single = parity_report(model, compiled, vectorizer.transform(texts[:1]))
+    print(f"Paridad en {report['rows']} filas: idénticas={report['identical']} "
+          f"diferencia máxima={report['max_abs_diff']:.3g} misma clase={report['same_argmax']}")
+    if not (report['same_argmax'] and single['same_argmax'] and report['max_abs_diff'] <= 1e-12):
+        print("ERROR: el bosque compilado no coincide con scikit-learn")
+        return 1
+
+    if args.command == 'export':
+        from artifact_registry import ArtifactRegistry
+        metadata = dict((manifest or {}).get('metadata', {}), compiled_from=(manifest or {}).get('version'))
+        version = ArtifactRegistry().publish(model, vectorizer, encoder, metadata=metadata, compiled=compiled)
+        print(f"Publicada la versión {version} con forest.npz")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
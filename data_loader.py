@@ -0,0 +1,240 @@
+"""Carga por trozos de los datos de entrenamiento, con memoria acotada.
+
+`ml_model.load_data` lee el CSV entero con dtypes `object` y `prepare` hace
+varias copias filtradas. Aquí:
+
+- Sólo se leen las columnas de texto y etiqueta, con dtypes explícitos (la
+  etiqueta como `category`).
+- El CSV se lee por trozos. El primero tiene FIRST_CHUNK_ROWS filas; con lo
+  que ocupa se calcula cuántas filas caben en TRAINING_CHUNK_MB (64 por
+  defecto) y los siguientes se leen de ese tamaño. El presupuesto cubre
+  todo lo que vive a la vez por trozo: el DataFrame, las copias de la
+  limpieza y los arrays resultantes (medido: unas WORKING_SET_FACTOR veces
+  el DataFrame).
+- Cada trozo se limpia con `clean_chunk` (las reglas de `ml_model.prepare`)
+  antes de pasar al siguiente.
+- Los datos limpios se guardan en `.npy` (TRAINING_CACHE_DIR, por defecto
+  `.training_cache/`): un par textos/etiquetas por trozo, más un
+  `manifest.json`. Las ejecuciones siguientes con los mismos archivos (misma
+  ruta, tamaño y mtime) no vuelven a parsear el CSV y leen los `.npy` con
+  `mmap_mode='r'`.
+
+`TrainingData` es la entrada del entrenamiento en streaming
+(`incremental_training.py`): conoce las clases de antemano y entrega
+(textos, etiquetas) trozo a trozo.
+
+    python data_loader.py                    # construye la caché e informa filas, tiempo y memoria
+    python data_loader.py --with-feedback    # añade user_feedback.csv
+    python data_loader.py --no-cache
+"""
+import argparse
+import hashlib
+import json
+import os
+import resource
+import shutil
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+BASE = Path(__file__).parent
+CACHE_DIR = Path(os.environ.get('TRAINING_CACHE_DIR', BASE / '.training_cache'))
+try:
+    CHUNK_MEMORY_MB = float(os.environ.get('TRAINING_CHUNK_MB', '64'))
+except ValueError:
+    print("Advertencia: valor de entorno TRAINING_CHUNK_MB no válido; usando 64 MB.")
+    CHUNK_MEMORY_MB = 64.0
+FIRST_CHUNK_ROWS = 5000
+MIN_CHUNK_ROWS = 1000
+# Memoria total de un trozo respecto a `memory_usage(deep=True)` de su DataFrame.
+WORKING_SET_FACTOR = 4
+# Súbelo si cambia `clean_chunk`: invalida las cachés existentes.
+CLEAN_VERSION = 1
+
+TEXT_COLUMN = 'modelo'
+LABEL_COLUMN = 'prediccion_ml'
+FEEDBACK_FILE = BASE / 'user_feedback.csv'
+# Fuente: (ruta, columna de texto, columna de etiqueta).
+FEEDBACK_SOURCE = (FEEDBACK_FILE, 'modelo', 'clasificacion_real')
+
+
+def peak_rss_mb():
+    """Pico de memoria residente del proceso, en MB."""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def clean_chunk(df, text_col=TEXT_COLUMN, label_col=LABEL_COLUMN):
+    """Filas con texto y etiqueta no vacíos, como (textos, etiquetas) de `str`.
+
+    Un único filtro sobre el trozo: nada de copias intermedias.
+    """
+    text = df[text_col]
+    label = df[label_col]
+    mask = text.notna() & label.notna()
+    text = text[mask].astype(str)
+    label = label[mask].astype(str)
+    keep = (text.str.strip() != '') & (label.str.strip() != '')
+    return text[keep], label[keep]
+
+
+def iter_csv_chunks(path, text_col=TEXT_COLUMN, label_col=LABEL_COLUMN, memory_mb=CHUNK_MEMORY_MB):
+    """(textos, etiquetas) limpios de `path`, trozo a trozo, con memoria acotada por `memory_mb`."""
+    reader = pd.read_csv(path, sep=';', usecols=[text_col, label_col], encoding='utf-8-sig',
+                         dtype={text_col: object, label_col: 'category'}, on_bad_lines='skip',
+                         iterator=True)
+    rows = FIRST_CHUNK_ROWS
+    with reader:
+        while True:
+            try:
+                chunk = reader.get_chunk(rows)
+            except StopIteration:
+                return
+            if len(chunk):
+                per_row = chunk.memory_usage(deep=True).sum() / len(chunk)
+                rows = max(MIN_CHUNK_ROWS, int(memory_mb * 1024 * 1024 / max(per_row * WORKING_SET_FACTOR, 1)))
+            texts, labels = clean_chunk(chunk, text_col, label_col)
+            del chunk
+            if len(texts):
+                yield texts.to_numpy(dtype=str), labels.to_numpy(dtype=str)
+
+
+def default_sources(with_feedback=False):
+    """El dataset base (`ml_model.DATA_PATHS`) y, opcionalmente, el feedback de usuarios."""
+    from ml_model import DATA_PATHS
+    sources = [(p, TEXT_COLUMN, LABEL_COLUMN) for p in DATA_PATHS if p.exists()][:1]
+    if with_feedback and FEEDBACK_SOURCE[0].exists():
+        sources.append(FEEDBACK_SOURCE)
+    return sources
+
+
+def _cache_key(sources):
+    h = hashlib.sha256(f'v{CLEAN_VERSION}'.encode())
+    for path, text_col, label_col in sources:
+        st = os.stat(path)
+        h.update(f'|{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}|{text_col}|{label_col}'.encode())
+    return h.hexdigest()[:16]
+
+
+class TrainingData:
+    """Datos de entrenamiento limpios de una o varias fuentes CSV, por trozos.
+
+    Con caché, `prepare` parsea los CSV una sola vez (y sólo si cambiaron) y
+    `chunks` lee los `.npy`. Sin caché, `prepare` hace una pasada barata para
+    conocer las etiquetas y `chunks` vuelve a leer los CSV.
+    """
+
+    def __init__(self, sources, cache_dir=CACHE_DIR, memory_mb=CHUNK_MEMORY_MB):
+        self.sources = [(Path(p), t, l) for p, t, l in sources]
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.memory_mb = memory_mb
+        self.manifest = None
+
+    @property
+    def cache_path(self):
+        return self.cache_dir / _cache_key(self.sources) if self.cache_dir else None
+
+    @property
+    def labels(self):
+        return self.prepare()['labels']
+
+    @property
+    def rows(self):
+        return self.prepare()['rows']
+
+    def prepare(self):
+        """Deja lista la caché (o cuenta filas y etiquetas) y devuelve el manifiesto."""
+        if self.manifest is not None:
+            return self.manifest
+        path = self.cache_path
+        if path is not None and (path / 'manifest.json').exists():
+            self.manifest = json.loads((path / 'manifest.json').read_text(encoding='utf-8'))
+            self.manifest['cached'] = True
+            return self.manifest
+        start = time.perf_counter()
+        if path is not None:
+            self.manifest = self._build_cache(path)
+        else:
+            labels, rows, chunks = set(), 0, 0
+            for _, chunk_labels in self._csv_chunks():
+                labels.update(np.unique(chunk_labels).tolist())
+                rows += len(chunk_labels)
+                chunks += 1
+            self.manifest = {'labels': sorted(labels), 'rows': rows, 'chunks': chunks}
+        self.manifest.update(cached=False, parse_seconds=round(time.perf_counter() - start, 3))
+        return self.manifest
+
+    def chunks(self):
+        """(textos, etiquetas) como arrays de `str`, trozo a trozo."""
+        manifest = self.prepare()
+        if self.cache_path is None:
+            yield from self._csv_chunks()
+            return
+        labels = np.asarray(manifest['labels'])
+        for i in range(manifest['chunks']):
+            texts = np.load(self.cache_path / f'texts-{i:05d}.npy', mmap_mode='r')
+            codes = np.load(self.cache_path / f'labels-{i:05d}.npy', mmap_mode='r')
+            yield texts, labels[codes]
+
+    def _csv_chunks(self):
+        for path, text_col, label_col in self.sources:
+            yield from iter_csv_chunks(path, text_col, label_col, self.memory_mb)
+
+    def _build_cache(self, path):
+        staging = path.with_name(f'.tmp-{path.name}-{os.getpid()}')
+        shutil.rmtree(staging, ignore_errors=True)
+        staging.mkdir(parents=True)
+        try:
+            labels, rows, chunks = {}, 0, 0
+            for texts, chunk_labels in self._csv_chunks():
+                for label in np.unique(chunk_labels):
+                    labels.setdefault(str(label), len(labels))
+                codes = np.fromiter((labels[l] for l in chunk_labels), dtype=np.int16, count=len(chunk_labels))
+                np.save(staging / f'texts-{chunks:05d}.npy', texts)
+                np.save(staging / f'labels-{chunks:05d}.npy', codes)
+                rows += len(texts)
+                chunks += 1
+            manifest = {'labels': list(labels), 'rows': rows, 'chunks': chunks,
+                        'sources': [str(p) for p, _, _ in self.sources], 'clean_version': CLEAN_VERSION}
+            (staging / 'manifest.json').write_text(json.dumps(manifest, indent=2, ensure_ascii=False),
+                                                  encoding='utf-8')
+            shutil.rmtree(path, ignore_errors=True)
+            os.rename(staging, path)
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Carga por trozos de los datos de entrenamiento")
+    parser.add_argument('--with-feedback', action='store_true', help="incluir user_feedback.csv")
+    parser.add_argument('--csv', action='append', help="otro CSV con columnas modelo;prediccion_ml")
+    parser.add_argument('--no-cache', action='store_true', help="no guardar ni leer la caché .npy")
+    parser.add_argument('--chunk-mb', type=float, default=CHUNK_MEMORY_MB, help="memoria por trozo")
+    args = parser.parse_args(argv)
+
+    sources = default_sources(args.with_feedback)
+    sources += [(Path(p), TEXT_COLUMN, LABEL_COLUMN) for p in args.csv or []]
+    if not sources:
+        print("No hay datos de entrenamiento.")
+        return 1
+    data = TrainingData(sources, cache_dir=None if args.no_cache else CACHE_DIR, memory_mb=args.chunk_mb)
+    start = time.perf_counter()
+    manifest = data.prepare()
+    read = sum(len(texts) for texts, _ in data.chunks())
+    print(f"Fuentes: {', '.join(str(p) for p, _, _ in data.sources)}")
+    print(f"{manifest['rows']} filas en {manifest['chunks']} trozos, etiquetas: {manifest['labels']}")
+    print(f"CSV {'en caché' if manifest['cached'] else 'parseado en %.2f s' % manifest['parse_seconds']}; "
+          f"lectura completa {read} filas en {time.perf_counter() - start:.2f} s")
+    if data.cache_path is not None:
+        print(f"Caché: {data.cache_path}")
+    print(f"Memoria pico: {peak_rss_mb():.1f} MB")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
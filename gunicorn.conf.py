@@ -0,0 +1,40 @@
+"""Configuración de gunicorn (se lee sola al ejecutar `gunicorn app:app` en esta carpeta).
+
+Con `preload_app` (por defecto) el proceso padre importa la app y carga el
+modelo una sola vez (MODEL_LOAD_MODE=eager); los workers nacen por fork y
+comparten esas páginas de memoria copy-on-write. `gc.freeze()` justo antes
+de crear los workers evita que el recolector de basura de cada hijo toque
+(y por tanto copie) los objetos heredados.
+
+Sin preload (GUNICORN_PRELOAD=0) cada worker importa la app y carga el
+modelo en un hilo de fondo (MODEL_LOAD_MODE=background): arranca antes,
+pero cada uno tiene su propia copia.
+
+Variables: GUNICORN_BIND, WEB_CONCURRENCY, GUNICORN_THREADS, GUNICORN_PRELOAD.
+"""
+import gc
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+try:
+    workers = int(os.environ.get('WEB_CONCURRENCY', '2'))
+    threads = int(os.environ.get('GUNICORN_THREADS', '1'))
+except ValueError:
+    print("Advertencia: WEB_CONCURRENCY/GUNICORN_THREADS no válidos; usando 2 workers y 1 hilo.")
+    workers, threads = 2, 1
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1').lower() not in ('0', 'false', 'no')
+
+# Se fija antes de importar la app; una variable de entorno explícita manda.
+os.environ.setdefault('MODEL_LOAD_MODE', 'eager' if preload_app else 'background')
+
+
+def when_ready(server):
+    # Se llama tras cargar la app (con preload) y antes de crear los workers.
+    if preload_app:
+        gc.freeze()
+        server.log.info("App precargada; objetos congelados para el GC: %d", gc.get_freeze_count())
+
+
+def post_fork(server, worker):
+    server.log.info("Worker %s listo (modelo %s)", worker.pid,
+                    'heredado del padre' if preload_app else 'cargándose en segundo plano')
@@ -0,0 +1,180 @@
+"""Reentrenamiento incremental alimentado por `user_feedback.csv`.
+
+A diferencia de `ml_model.py`, que reconstruye el TF-IDF y el bosque
+completo sobre todo el CSV, este modo sólo trabaja sobre lo nuevo:
+
+- `HashingVectorizer`: no tiene vocabulario, así que nunca hay que reajustarlo.
+- `SGDClassifier(loss='log_loss')`: admite `partial_fit` y `predict_proba`.
+- El estado guarda hasta qué byte de `user_feedback.csv` se ha consumido; cada
+  ejecución lee desde ese punto, por lo que su coste depende de las filas
+  nuevas y no del tamaño total.
+
+La primera ejecución (o con --reset) entrena con `donapp_data_tecnico.csv`,
+leído por trozos con `data_loader.TrainingData` (memoria acotada y caché
+`.npy` de los datos limpios).
+Cada ejecución con filas nuevas publica los artefactos con
+`ml_model.publish_artifacts`; la app los detecta y los recarga sin reiniciar.
+
+Uso:
+    python incremental_training.py            # procesa el feedback nuevo
+    python incremental_training.py --reset    # vuelve a partir del dataset base
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import time
+from pathlib import Path
+
+import joblib
+import numpy as np
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.linear_model import SGDClassifier
+from sklearn.preprocessing import LabelEncoder
+
+import ml_model
+from data_loader import TrainingData, default_sources, peak_rss_mb
+
+BASE = Path(__file__).parent
+FEEDBACK_FILENAME = BASE / "user_feedback.csv"
+STATE_DIR = BASE / "incremental"
+STATE_FILENAME = STATE_DIR / "state.json"
+STATE_MODEL_FILENAME = STATE_DIR / "model.joblib"
+STATE_ENCODER_FILENAME = STATE_DIR / "encoder.joblib"
+
+CHUNK_SIZE = 5000
+
+
+def make_vectorizer():
+    return HashingVectorizer(n_features=2 ** 14, ngram_range=(1, 2), alternate_sign=False)
+
+
+def load_state():
+    if STATE_FILENAME.exists() and STATE_MODEL_FILENAME.exists() and STATE_ENCODER_FILENAME.exists():
+        state = json.loads(STATE_FILENAME.read_text(encoding="utf-8"))
+        return state, joblib.load(STATE_MODEL_FILENAME), joblib.load(STATE_ENCODER_FILENAME)
+    return None, None, None
+
+
+def save_state(state, model, encoder):
+    STATE_DIR.mkdir(parents=True, exist_ok=True)
+    ml_model._atomic_dump(model, STATE_MODEL_FILENAME)
+    ml_model._atomic_dump(encoder, STATE_ENCODER_FILENAME)
+    tmp = STATE_FILENAME.with_name(STATE_FILENAME.name + ".tmp")
+    tmp.write_text(json.dumps(state, indent=2), encoding="utf-8")
+    os.replace(tmp, STATE_FILENAME)
+
+
+def read_feedback_delta(path: Path, offset: int):
+    """Lee las filas de feedback a partir del byte `offset`.
+
+    Sólo consume líneas completas (una escritura a medias se deja para la
+    próxima vez). Devuelve (filas, nuevo_offset); cada fila es (modelo, etiqueta).
+    """
+    if not path.exists():
+        return [], offset
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read()
+    end = data.rfind(b"\n") + 1
+    if end == 0:
+        return [], offset
+    text = data[:end].decode("utf-8-sig")
+    reader = csv.reader(io.StringIO(text), delimiter=";")
+    rows = []
+    for values in reader:
+        if len(values) < 2:
+            continue
+        if offset == 0 and not rows and values[0] == "modelo":
+            continue  # cabecera
+        rows.append((values[0].strip(), values[1].strip()))
+    return rows, offset + end
+
+
+def _known_label(label, by_lower):
+    """Mapea la clasificación escrita por el usuario a una clase conocida (sin distinguir mayúsculas)."""
+    return by_lower.get(label.strip().lower())
+
+
+def _partial_fit(model, vectorizer, encoder, texts, labels):
+    classes = np.arange(len(encoder.classes_))
+    for start in range(0, len(texts), CHUNK_SIZE):
+        X = vectorizer.transform(texts[start:start + CHUNK_SIZE])
+        y = encoder.transform(labels[start:start + CHUNK_SIZE])
+        model.partial_fit(X, y, classes=classes)
+
+
+def train_base():
+    """Primer entrenamiento (o --reset) con el dataset base, trozo a trozo.
+
+    Nunca hay más de un trozo del CSV en memoria: las clases salen del
+    manifiesto de `TrainingData` y cada trozo se vectoriza y se pasa a
+    `partial_fit` antes de leer el siguiente.
+    """
+    sources = default_sources()
+    if not sources:
+        ml_model.load_data()  # crea el CSV de ejemplo
+        sources = default_sources()
+    data = TrainingData(sources)
+    encoder = LabelEncoder().fit(data.labels)
+    model = SGDClassifier(loss="log_loss", random_state=42)
+    vectorizer = make_vectorizer()
+    rows = 0
+    for texts, labels in data.chunks():
+        _partial_fit(model, vectorizer, encoder, texts, labels)
+        rows += len(texts)
+    state = {"feedback_offset": 0, "rows_trained": rows, "feedback_rows": 0, "skipped_feedback": 0}
+    return state, model, encoder
+
+
+def run(reset=False):
+    start = time.perf_counter()
+    state, model, encoder = (None, None, None) if reset else load_state()
+    trained_base = state is None
+    if trained_base:
+        state, model, encoder = train_base()
+        print(f"Entrenamiento base con {state['rows_trained']} filas")
+
+    rows, new_offset = read_feedback_delta(FEEDBACK_FILENAME, state["feedback_offset"])
+    by_lower = {str(c).lower(): str(c) for c in encoder.classes_}
+    texts, labels, skipped = [], [], 0
+    for modelo, etiqueta in rows:
+        label = _known_label(etiqueta, by_lower)
+        if not modelo or label is None:
+            skipped += 1
+            continue
+        texts.append(modelo)
+        labels.append(label)
+
+    if texts:
+        _partial_fit(model, make_vectorizer(), encoder, texts, labels)
+    state["feedback_offset"] = new_offset
+    state["feedback_rows"] += len(texts)
+    state["skipped_feedback"] += skipped
+    state["rows_trained"] += len(texts)
+
+    if not texts and not trained_base:
+        save_state(state, model, encoder)
+        print(f"Sin feedback nuevo utilizable ({skipped} filas descartadas); no se publica nada.")
+        return None
+
+    version = ml_model.publish_artifacts(model, make_vectorizer(), encoder,
+                                         metadata={"trainer": "incremental", "rows": state["rows_trained"]})
+    state["published_version"] = version
+    save_state(state, model, encoder)
+    print(f"Feedback nuevo: {len(texts)} filas usadas, {skipped} descartadas (clase desconocida o vacía)")
+    print(f"Versión publicada: {version} en {time.perf_counter() - start:.2f} s "
+          f"(memoria pico {peak_rss_mb():.0f} MB)")
+    return version
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reentrenamiento incremental con el feedback de usuarios")
+    parser.add_argument("--reset", action="store_true", help="reentrenar desde el dataset base")
+    args = parser.parse_args(argv)
+    run(reset=args.reset)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+"""Motor de inferencia: TF-IDF + RandomForest + LabelEncoder cargados una sola vez.
+
+Los artefactos se cargan al arrancar, se "calientan" con una predicción de
+prueba y se comparten (sólo lectura) entre todos los hilos del proceso.
+Cada petición recorre un único camino: vectorizar -> predict_proba -> decodificar.
+
+Los artefactos se leen del registro versionado (`artifact_registry.py`) con
+`mmap_mode='r'`; si todavía no hay ninguna versión publicada se usan los
+archivos `donapp_*.joblib` de la raíz. Cuando cambia la versión activa, el
+pipeline nuevo se carga en un hilo aparte y sustituye al anterior de golpe:
+las peticiones en curso terminan con la instantánea que ya tenían.
+
+La carga inicial puede hacerse en un hilo (`start_loading`) para que el
+worker acepte peticiones mientras tanto; `ensure_loaded` espera por ella.
+joblib (y con él scikit-learn) sólo se importa al cargar los artefactos.
+
+Con `batcher` (`microbatch.MicroBatcher` sobre `predict_many`) los fallos de
+caché de peticiones concurrentes se resuelven juntos en un único lote.
+
+Los RandomForest se sirven con `compiled_forest.CompiledForest` (el
+`forest.npz` de la versión, o compilado al cargar): mismas probabilidades
+sin el reparto entre hilos de joblib. COMPILED_FOREST=0 usa scikit-learn.
+"""
+import os
+import threading
+import time
+
+import numpy as np
+
+WARMUP_TEXT = 'Galaxy S21'
+# Cada cuántos segundos, como mucho, se comprueba si hay artefactos nuevos.
+RELOAD_CHECK_SECONDS = 2.0
+USE_COMPILED_FOREST = os.environ.get('COMPILED_FOREST', '1') != '0'
+
+
+def safe_load(path):
+    if not os.path.exists(path):
+        return None
+    import joblib
+    try:
+        return joblib.load(path)
+    except Exception as e:
+        print(f"No se pudo cargar {path}: {e}")
+        return None
+
+
+def legacy_version(paths):
+    """Versión de los artefactos sueltos (fuera del registro): su mtime más reciente."""
+    mtimes = [os.stat(p).st_mtime_ns for p in paths if os.path.exists(p)]
+    return f"legacy-{max(mtimes)}" if mtimes else None
+
+
+class _Pipeline:
+    """Instantánea inmutable de los artefactos cargados.
+
+    `labels[i]` es la etiqueta legible de la columna i de `predict_proba`,
+    precalculada para no llamar a `inverse_transform` en cada petición.
+    `features` sólo se define para modelos que reciben registros completos
+    (pipeline estructurado, sin vectorizador aparte); si es None el modelo
+    recibe el texto de `modelo` vectorizado.
+    """
+    __slots__ = ('vectorizer', 'model', 'encoder', 'labels', 'version', 'features')
+
+    def __init__(self, vectorizer, model, encoder, version, features=None):
+        self.vectorizer = vectorizer
+        self.model = model
+        self.encoder = encoder
+        self.version = version
+        self.features = features
+        self.labels = np.asarray(encoder.inverse_transform(model.classes_))
+
+    def cache_text(self, item):
+        """Texto que identifica la entrada en la caché de predicciones."""
+        return cache_text(item, self.features)
+
+
+def cache_text(item, features=None):
+    """Texto de `item` para la clave de caché: `modelo`, o todas las `features` del modelo estructurado."""
+    if features is None:
+        return _text_of(item)
+    if not isinstance(item, dict):
+        item = {'modelo': item}
+    return '|'.join(str(item.get(col) or '') for col in features)
+
+
+def _text_of(item):
+    return str(item.get('modelo') or '') if isinstance(item, dict) else item
+
+
+class InferenceEngine:
+    """Dueño del pipeline de predicción y de sus estadísticas de uso."""
+
+    def __init__(self, model_path, vectorizer_path, encoder_path, top_k=3, cache=None, registry=None,
+                 compiled=USE_COMPILED_FOREST):
+        self.model_path = model_path
+        self.vectorizer_path = vectorizer_path
+        self.encoder_path = encoder_path
+        self.top_k = top_k
+        self.cache = cache
+        self.registry = registry
+        self.compiled = compiled
+        self._pipeline = None
+        self._reload_lock = threading.Lock()
+        self._next_check = 0.0
+        self._pointer_stamp = None
+        self._stats_lock = threading.Lock()
+        self._stats = {'predictions': 0, 'predict_seconds': 0.0, 'last_ms': 0.0,
+                       'load_ms': 0.0, 'warmup_ms': 0.0, 'reloads': 0}
+        self._loader_lock = threading.Lock()
+        self._loader_pid = None
+        self._loaded = threading.Event()
+        self.batcher = None
+
+    @property
+    def ready(self):
+        return self._pipeline is not None
+
+    @property
+    def version(self):
+        pipeline = self._pipeline
+        return pipeline.version if pipeline is not None else None
+
+    def _build_pipeline(self):
+        """Carga una instantánea nueva: del registro si hay versión activa, si no, los archivos sueltos."""
+        if self.registry is not None:
+            self._pointer_stamp = self.registry.pointer_stamp()
+            version = self.registry.current_version()
+            if version is not None:
+                try:
+                    model, vectorizer, encoder, manifest = self.registry.load(version, mmap_mode='r',
+                                                                              compiled=self.compiled)
+                    features = manifest.get('metadata', {}).get('features')
+                    return _Pipeline(vectorizer, self._compile(model), encoder, version, features=features)
+                except Exception as e:
+                    print(f"No se pudo cargar la versión {version} del registro: {e}")
+        model = safe_load(self.model_path)
+        vectorizer = safe_load(self.vectorizer_path)
+        encoder = safe_load(self.encoder_path)
+        if model is None or vectorizer is None or encoder is None:
+            return None
+        version = legacy_version([self.model_path, self.vectorizer_path, self.encoder_path])
+        return _Pipeline(vectorizer, self._compile(model), encoder, version)
+
+    def _compile(self, model):
+        """Sustituye un RandomForest por su versión compilada (si está activado)."""
+        if not self.compiled:
+            return model
+        from compiled_forest import compile_forest, is_compilable
+        return compile_forest(model) if is_compilable(model) else model
+
+    def load(self):
+        """Carga los artefactos. Devuelve False si no hay ninguno disponible."""
+        start = time.perf_counter()
+        pipeline = self._build_pipeline()
+        if pipeline is None:
+            print("Artefactos del modelo no disponibles; se usará la predicción simulada.")
+            return False
+        self._pipeline = pipeline
+        self._stats['load_ms'] = (time.perf_counter() - start) * 1000
+        print(f"Modelo cargado en {self._stats['load_ms']:.1f} ms (versión {pipeline.version})")
+        return True
+
+    def start_loading(self):
+        """Carga y calienta el modelo en un hilo aparte (una vez por proceso)."""
+        pid = os.getpid()
+        with self._loader_lock:
+            if self._loaded.is_set() or self._loader_pid == pid:
+                return
+            # Un hilo lanzado antes de un fork no existe en el hijo: se relanza.
+            self._loader_pid = pid
+            threading.Thread(target=self._initial_load, name='model-preload', daemon=True).start()
+
+    def _initial_load(self):
+        try:
+            if self.load():
+                self.warm_up()
+        except Exception as e:
+            print(f"Error cargando el modelo: {e}")
+        finally:
+            self._loaded.set()
+
+    def load_now(self):
+        """Carga y calienta el modelo en este hilo (modo eager)."""
+        self._initial_load()
+        return self.ready
+
+    def ensure_loaded(self, timeout=None):
+        """Lanza la carga si hace falta y espera como mucho `timeout` segundos.
+
+        Devuelve `ready`: False si no hay artefactos o la carga no terminó a tiempo.
+        Si la carga inicial no encontró artefactos no se queda así: cada llamada
+        comprueba el registro (`check_for_update`, un `stat` cada
+        RELOAD_CHECK_SECONDS) y la primera versión publicada se carga en segundo plano.
+        """
+        if not self._loaded.is_set():
+            self.start_loading()
+            self._loaded.wait(timeout)
+        elif not self.ready:
+            self.check_for_update()
+        return self.ready
+
+    def check_for_update(self):
+        """Lanza una recarga en segundo plano si cambió la versión activa del registro.
+
+        Cuesta un `stat` de `CURRENT` cada RELOAD_CHECK_SECONDS. La petición que
+        lo detecta no espera a la carga: sigue con la instantánea actual.
+        """
+        if self.registry is None:
+            return False
+        now = time.monotonic()
+        if now < self._next_check:
+            return False
+        self._next_check = now + RELOAD_CHECK_SECONDS
+        stamp = self.registry.pointer_stamp()
+        if stamp is None or stamp == self._pointer_stamp:
+            return False
+        if not self._reload_lock.acquire(blocking=False):
+            return False  # ya hay una recarga en marcha
+        threading.Thread(target=self._reload, name='model-reload', daemon=True).start()
+        return True
+
+    def _reload(self):
+        try:
+            start = time.perf_counter()
+            pipeline = self._build_pipeline()
+            if pipeline is None or pipeline.version == self.version:
+                return
+            self.warm_up(pipeline)
+            self._pipeline = pipeline  # cambio atómico de referencia
+            if self.cache is not None:
+                self.cache.invalidate(pipeline.version)
+            with self._stats_lock:
+                self._stats['reloads'] += 1
+                self._stats['load_ms'] = (time.perf_counter() - start) * 1000
+            print(f"Modelo recargado: versión {pipeline.version}")
+        except Exception as e:
+            print(f"Error recargando el modelo: {e}")
+        finally:
+            self._reload_lock.release()
+
+    def warm_up(self, pipeline=None):
+        """Ejecuta una predicción de prueba para inicializar cachés internas."""
+        pipeline = pipeline or self._pipeline
+        if pipeline is None:
+            return
+        start = time.perf_counter()
+        self._predict_proba(pipeline, [WARMUP_TEXT])
+        self._stats['warmup_ms'] = (time.perf_counter() - start) * 1000
+
+    def predict(self, text, top_k=None):
+        """Clasifica un equipo: el texto de `modelo` o el registro completo del formulario (dict).
+
+        Devuelve un dict con la etiqueta más probable, su probabilidad y la
+        lista `top_k` de pares (etiqueta, probabilidad) ordenada de mayor a menor.
+        """
+        self.check_for_update()
+        pipeline = self._pipeline
+        if pipeline is None:
+            raise RuntimeError("El modelo no está cargado")
+        k = top_k or self.top_k
+        key = None
+        if self.cache is not None:
+            key = self.cache.make_key(pipeline.version, pipeline.cache_text(text), k)
+            cached = self.cache.get(key)
+            if cached is not None:
+                return dict(cached)
+        if self.batcher is not None:
+            result = self.batcher.submit(text, k)
+        else:
+            start = time.perf_counter()
+            proba = self._predict_proba(pipeline, [text])[0]
+            order = np.argsort(proba)[::-1][:k]
+            result = {
+                'label': str(pipeline.labels[order[0]]),
+                'probability': float(proba[order[0]]),
+                'top_k': [(str(pipeline.labels[i]), float(proba[i])) for i in order],
+            }
+            self._record(time.perf_counter() - start)
+        if key is not None:
+            self.cache.set(key, result)
+        return dict(result)
+
+    def predict_many(self, texts, top_k=None):
+        """Clasifica una lista de textos (o registros) con un único transform + predict_proba.
+
+        Devuelve una lista de dicts con el mismo formato que `predict`. Quien
+        llama es responsable de trocear la entrada para acotar la memoria.
+        """
+        self.check_for_update()
+        pipeline = self._pipeline
+        if pipeline is None:
+            raise RuntimeError("El modelo no está cargado")
+        if not texts:
+            return []
+        k = top_k or self.top_k
+        start = time.perf_counter()
+        proba = self._predict_proba(pipeline, texts)
+        order = np.argsort(proba, axis=1)[:, ::-1][:, :k]
+        results = []
+        for row, idx in zip(proba, order):
+            results.append({
+                'label': str(pipeline.labels[idx[0]]),
+                'probability': float(row[idx[0]]),
+                'top_k': [(str(pipeline.labels[i]), float(row[i])) for i in idx],
+            })
+        self._record(time.perf_counter() - start, n=len(texts))
+        return results
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        n = stats['predictions']
+        stats['avg_ms'] = (stats['predict_seconds'] / n * 1000) if n else 0.0
+        stats['ready'] = self.ready
+        stats['loading'] = not self._loaded.is_set() and self._loader_pid == os.getpid()
+        stats['version'] = self.version
+        if self.cache is not None:
+            stats['cache'] = self.cache.stats()
+        if self.batcher is not None:
+            stats['batching'] = self.batcher.stats()
+        return stats
+
+    @staticmethod
+    def _predict_proba(pipeline, items):
+        if pipeline.features is not None:
+            import pandas as pd
+            records = [item if isinstance(item, dict) else {'modelo': item} for item in items]
+            return pipeline.model.predict_proba(pd.DataFrame.from_records(records, columns=pipeline.features))
+        X = pipeline.vectorizer.transform([_text_of(item) for item in items])
+        return pipeline.model.predict_proba(X)
+
+    def _record(self, elapsed, n=1):
+        with self._stats_lock:
+            self._stats['predictions'] += n
+            self._stats['predict_seconds'] += elapsed
+            self._stats['last_ms'] = elapsed * 1000
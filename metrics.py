@@ -0,0 +1,397 @@
+"""Métricas en formato Prometheus y perfilado por muestreo.
+
+- Histogramas de duración por etapa de `/predict` (lectura del formulario,
+  predicción, escritura del CSV, maquetación y escritura del PDF, plantilla)
+  y por endpoint.
+- Métricas calculadas al leer `/metrics` (aciertos de la caché, tamaño de
+  `tmp_pdfs/`, hilos vivos...), registradas por la app con `callback`.
+- `SamplingProfiler`: perfila con cProfile una fracción de las peticiones y
+  guarda cada perfil en `profiles/` (se abren con `python -m pstats` o
+  snakeviz). La fracción se lee de un archivo de control que se revisa cada
+  pocos segundos, así que se activa y desactiva sin reiniciar, en todos los
+  workers a la vez. `/metrics/profile` sólo responde a quien envía el token
+  de operador (PROFILE_ADMIN_TOKEN en la cabecera X-Admin-Token) y no
+  acepta fracciones mayores que PROFILE_MAX_RATE (0.1 por defecto).
+
+Cada proceso (cada worker de gunicorn) expone sus propias métricas.
+"""
+import bisect
+import cProfile
+import hmac
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import Response, g, jsonify, request
+
+# Fracción máxima que admite `/metrics/profile` si no se indica PROFILE_MAX_RATE.
+DEFAULT_MAX_PROFILE_RATE = 0.1
+
+# Límites (segundos) de los histogramas: de 0.5 ms a 10 s.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Contador monótono con etiquetas opcionales."""
+
+    kind = 'counter'
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(n, '') for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [(self.name, _format_labels(self.labelnames, key), value) for key, value in items]
+
+
+class Histogram:
+    """Histograma acumulativo (cubetas, suma y cuenta) con etiquetas opcionales."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(n, '') for n in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(entry[0]), entry[1], entry[2]) for key, entry in self._values.items()]
+        out = []
+        for key, counts, total, count in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float('inf'),), counts):
+                cumulative += n
+                out.append((self.name + '_bucket',
+                            _format_labels(self.labelnames, key, ('le', _format_value(bound))), cumulative))
+            out.append((self.name + '_sum', _format_labels(self.labelnames, key), total))
+            out.append((self.name + '_count', _format_labels(self.labelnames, key), count))
+        return out
+
+
+class CallbackMetric:
+    """Métrica cuyo valor se calcula al leer `/metrics`.
+
+    `fn` devuelve un número o, si hay una etiqueta, un dict {valor_etiqueta: número}.
+    """
+
+    def __init__(self, name, help, fn, kind='gauge', labelname=None):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.kind = kind
+        self.labelname = labelname
+
+    def samples(self):
+        try:
+            value = self.fn()
+        except Exception as e:
+            print(f"Error al calcular la métrica {self.name}: {e}")
+            return []
+        if value is None:
+            return []
+        if isinstance(value, dict):
+            return [(self.name, _format_labels((self.labelname,), (label,)), v) for label, v in value.items()]
+        return [(self.name, '', value)]
+
+
+class MetricsRegistry:
+    """Conjunto de métricas de un proceso y su exposición en texto."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _add(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self._add(Counter(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help, labelnames, buckets))
+
+    def callback(self, name, help, fn, kind='gauge', labelname=None):
+        """Registra (o reemplaza) una métrica calculada al vuelo."""
+        metric = CallbackMetric(name, help, fn, kind, labelname)
+        with self._lock:
+            self._metrics[name] = metric
+        return metric
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            samples = metric.samples()
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, labels, value in samples:
+                lines.append(f'{name}{labels} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+PREDICT_STAGE_SECONDS = REGISTRY.histogram(
+    'donapp_predict_stage_seconds', 'Duración de cada etapa de /predict.', ('stage',))
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    'donapp_http_request_seconds', 'Duración de las peticiones HTTP por endpoint.', ('endpoint', 'method'))
+HTTP_REQUESTS = REGISTRY.counter(
+    'donapp_http_requests_total', 'Peticiones HTTP atendidas por endpoint y código.',
+    ('endpoint', 'method', 'status'))
+PROFILED_REQUESTS = REGISTRY.counter(
+    'donapp_profiled_requests_total', 'Peticiones perfiladas por el muestreador.', ('endpoint',))
+
+
+def stage(name):
+    """`with stage('prediction'): ...` registra la duración de una etapa de /predict."""
+    return PREDICT_STAGE_SECONDS.time(stage=name)
+
+
+def observe_stage(name, seconds):
+    """Igual que `stage`, para etapas medidas fuera de la petición (p. ej. en la cola de PDFs)."""
+    PREDICT_STAGE_SECONDS.observe(seconds, stage=name)
+
+
+# --- Perfilado por muestreo ---
+
+class SamplingProfiler:
+    """Perfila con cProfile una fracción `rate` (0..1) de las peticiones.
+
+    - output_dir: carpeta donde se guardan los `.prof`.
+    - control_path: archivo opcional con la fracción; si existe manda sobre `rate`
+      y se vuelve a leer cuando cambia (se comprueba cada `check_seconds`).
+    - max_files: nº de perfiles que se conservan (se borran los más antiguos).
+    - max_rate: fracción máxima que acepta `set_rate`.
+
+    Sólo se perfila una petición a la vez por proceso: cProfile no admite dos
+    perfiladores activos en el mismo hilo y así el coste queda acotado.
+    """
+
+    def __init__(self, rate=0.0, output_dir='profiles', control_path=None, max_files=100, check_seconds=2.0,
+                 max_rate=1.0):
+        self.default_rate = rate
+        self.max_rate = max_rate
+        self.output_dir = output_dir
+        self.control_path = control_path
+        self.max_files = max_files
+        self.check_seconds = check_seconds
+        self._rate = rate
+        self._control_stamp = None
+        self._next_check = 0.0
+        self._busy = threading.Lock()
+
+    @property
+    def rate(self):
+        now = time.monotonic()
+        if self.control_path and now >= self._next_check:
+            self._next_check = now + self.check_seconds
+            try:
+                stamp = os.stat(self.control_path).st_mtime_ns
+            except OSError:
+                stamp = None
+            if stamp != self._control_stamp:
+                self._control_stamp = stamp
+                self._rate = self._read_control() if stamp is not None else self.default_rate
+        return self._rate
+
+    def _read_control(self):
+        try:
+            with open(self.control_path, encoding='utf-8') as f:
+                return min(1.0, max(0.0, float(f.read().strip() or 0)))
+        except (OSError, ValueError):
+            print(f"Advertencia: {self.control_path} no contiene una fracción válida; perfilado desactivado.")
+            return 0.0
+
+    def set_rate(self, rate):
+        """Cambia la fracción en todos los procesos que comparten `control_path`.
+
+        Lanza ValueError si `rate` no está entre 0 y `max_rate`.
+        """
+        rate = float(rate)
+        if not 0.0 <= rate <= self.max_rate:
+            raise ValueError(f"rate debe estar entre 0 y {self.max_rate}")
+        if self.control_path:
+            tmp = f'{self.control_path}.{os.getpid()}.tmp'
+            with open(tmp, 'w', encoding='utf-8') as f:
+                f.write(str(rate))
+            os.replace(tmp, self.control_path)
+            self._next_check = 0.0
+        else:
+            self._rate = rate
+        return rate
+
+    def start(self):
+        """Devuelve un perfilador activo si esta petición entra en la muestra, o None."""
+        rate = self.rate
+        if rate <= 0 or random.random() >= rate or not self._busy.acquire(blocking=False):
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:  # otro perfilador ya está activo
+            self._busy.release()
+            return None
+        return profile
+
+    def finish(self, profile, label):
+        """Detiene `profile`, lo guarda en `output_dir` y devuelve la ruta."""
+        try:
+            profile.disable()
+            os.makedirs(self.output_dir, exist_ok=True)
+            path = os.path.join(self.output_dir, f'{label}-{time.time_ns()}-{os.getpid()}.prof')
+            profile.dump_stats(path)
+            self._prune()
+            return path
+        finally:
+            self._busy.release()
+
+    def _prune(self):
+        try:
+            files = [os.path.join(self.output_dir, f) for f in os.listdir(self.output_dir) if f.endswith('.prof')]
+        except OSError:
+            return
+        if len(files) <= self.max_files:
+            return
+        files.sort(key=lambda p: os.path.getmtime(p) if os.path.exists(p) else 0)
+        for path in files[:len(files) - self.max_files]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def stats(self):
+        return {'rate': self.rate, 'max_rate': self.max_rate, 'output_dir': self.output_dir,
+                'control_path': self.control_path}
+
+
+def profiler_from_env(base_dir):
+    """Perfilador según PROFILE_SAMPLE_RATE, PROFILE_MAX_RATE, PROFILE_DIR y PROFILE_CONTROL_FILE."""
+    try:
+        rate = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))
+    except ValueError:
+        print("Advertencia: valor de entorno PROFILE_SAMPLE_RATE no válido; perfilado desactivado.")
+        rate = 0.0
+    try:
+        max_rate = min(1.0, max(0.0, float(os.environ.get('PROFILE_MAX_RATE', str(DEFAULT_MAX_PROFILE_RATE)))))
+    except ValueError:
+        print(f"Advertencia: valor de entorno PROFILE_MAX_RATE no válido; usando {DEFAULT_MAX_PROFILE_RATE}.")
+        max_rate = DEFAULT_MAX_PROFILE_RATE
+    output_dir = os.environ.get('PROFILE_DIR', os.path.join(base_dir, 'profiles'))
+    control_path = os.environ.get('PROFILE_CONTROL_FILE', os.path.join(base_dir, 'profile_rate'))
+    return SamplingProfiler(rate, output_dir=output_dir, control_path=control_path, max_rate=max_rate)
+
+
+def _is_operator(admin_token):
+    """True si la petición trae el token de operador en X-Admin-Token."""
+    sent = request.headers.get('X-Admin-Token', '')
+    return bool(admin_token) and hmac.compare_digest(sent.encode('utf-8'), admin_token.encode('utf-8'))
+
+
+# --- Integración con Flask ---
+
+def init_metrics(app, profiler=None, registry=REGISTRY, admin_token=None):
+    """Mide cada petición, añade `/metrics` y, si hay perfilador, `/metrics/profile`.
+
+    `/metrics/profile` exige `admin_token` en X-Admin-Token; sin token
+    configurado responde siempre 403 (el perfilado se controla entonces sólo
+    con PROFILE_SAMPLE_RATE o el archivo de control).
+    """
+
+    @app.before_request
+    def _start_request():
+        g._metrics_start = time.perf_counter()
+        g._profile = profiler.start() if profiler is not None else None
+
+    @app.after_request
+    def _finish_request(response):
+        start = g.pop('_metrics_start', None)
+        endpoint = request.endpoint or 'desconocido'
+        if start is not None:
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint, method=request.method)
+        HTTP_REQUESTS.inc(endpoint=endpoint, method=request.method, status=str(response.status_code))
+        return response
+
+    @app.teardown_request
+    def _finish_profile(exc):
+        profile = g.pop('_profile', None)
+        if profile is not None:
+            endpoint = request.endpoint or 'desconocido'
+            profiler.finish(profile, endpoint)
+            PROFILED_REQUESTS.inc(endpoint=endpoint)
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(registry.render(), content_type=CONTENT_TYPE)
+
+    if profiler is not None:
+        @app.route('/metrics/profile', methods=['GET', 'POST'])
+        def metrics_profile():
+            """GET: configuración actual. POST rate=0.05: perfilar el 5 % de las peticiones."""
+            if not _is_operator(admin_token):
+                return jsonify({'error': 'Sólo para operadores (X-Admin-Token).'}), 403
+            if request.method == 'POST':
+                value = request.form.get('rate') or (request.get_json(silent=True) or {}).get('rate')
+                try:
+                    profiler.set_rate(value)
+                except (TypeError, ValueError):
+                    return jsonify({'error': f'rate debe ser un número entre 0 y {profiler.max_rate}.'}), 400
+            return jsonify(profiler.stats())
@@ -0,0 +1,155 @@
+"""Micro-batching de predicciones concurrentes.
+
+Con varias peticiones a la vez (gunicorn con hilos, o el modo ASGI) cada
+`/predict` llamaba al RandomForest con una sola fila: el coste fijo de
+`transform` + `predict_proba` (recorrer los árboles, repartir el trabajo
+entre hilos de joblib por `n_jobs=-1`) se pagaba una vez por petición.
+
+`MicroBatcher` junta las peticiones que llegan en una ventana de
+`max_wait` segundos (o hasta `max_batch` filas), las resuelve con una sola
+llamada a `run_batch(items, top_k)` y devuelve a cada una su resultado. Con
+una sola petición en vuelo la latencia añadida es como mucho `max_wait`.
+
+Configuración (`batcher_from_env`): PREDICT_BATCH_MAX (32; 0 o 1 lo
+desactiva) y PREDICT_BATCH_WAIT_MS (2).
+"""
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+
+class _Request:
+    __slots__ = ('item', 'top_k', 'future', 'enqueued')
+
+    def __init__(self, item, top_k):
+        self.item = item
+        self.top_k = top_k
+        self.future = Future()
+        self.enqueued = time.monotonic()
+
+
+class MicroBatcher:
+    """Cola de predicciones que se resuelven por lotes.
+
+    - run_batch: función (items, top_k) -> lista de resultados, uno por item.
+    - max_batch: nº máximo de filas por llamada.
+    - max_wait: segundos que se espera a completar un lote desde que llega
+      su primera petición.
+    - workers: lotes que pueden ejecutarse a la vez (1 en proceso; tantos
+      como procesos si `run_batch` delega en un pool).
+    - observe: callback opcional (tamaño del lote, segundos que esperó su
+      petición más antigua).
+    """
+
+    def __init__(self, run_batch, max_batch=32, max_wait=0.002, workers=1, observe=None):
+        self.run_batch = run_batch
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.workers = workers
+        self.observe = observe
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._pid = None
+        self._counters = {'submitted': 0, 'batches': 0, 'batched_items': 0, 'largest_batch': 0, 'failed': 0}
+
+    # --- API pública ---
+    def submit_future(self, item, top_k=None):
+        """Encola una predicción y devuelve un `Future` con su resultado."""
+        self._ensure_workers()
+        request = _Request(item, top_k)
+        with self._cond:
+            self._pending.append(request)
+            self._counters['submitted'] += 1
+            # Sólo hace falta despertar a un worker al abrir un lote o al llenarlo.
+            if len(self._pending) == 1 or len(self._pending) >= self.max_batch:
+                self._cond.notify()
+        return request.future
+
+    def submit(self, item, top_k=None):
+        """Predicción de un item; bloquea hasta que se resuelva su lote."""
+        return self.submit_future(item, top_k).result()
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._counters)
+            stats['queue_depth'] = len(self._pending)
+        stats['avg_batch'] = stats['batched_items'] / stats['batches'] if stats['batches'] else 0.0
+        stats.update(max_batch=self.max_batch, max_wait_ms=self.max_wait * 1000, workers=self.workers)
+        return stats
+
+    # --- Internos ---
+    def _ensure_workers(self):
+        """Arranca los hilos en el primer uso de cada proceso (también tras un fork)."""
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._cond:
+            if self._pid == pid:
+                return
+            self._pending.clear()
+            for i in range(self.workers):
+                threading.Thread(target=self._run, name=f'predict-batcher-{i}', daemon=True).start()
+            self._pid = pid
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+            deadline = self._pending[0].enqueued + self.max_wait
+            while 0 < len(self._pending) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = [self._pending.popleft() for _ in range(min(self.max_batch, len(self._pending)))]
+            if self._pending:
+                self._cond.notify()  # lo que sobra abre el siguiente lote
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch:
+                self._execute(batch)
+
+    def _execute(self, batch):
+        waited = time.monotonic() - batch[0].enqueued
+        groups = {}
+        for request in batch:
+            groups.setdefault(request.top_k, []).append(request)
+        for top_k, requests in groups.items():
+            try:
+                results = self.run_batch([r.item for r in requests], top_k)
+            except Exception as e:
+                with self._cond:
+                    self._counters['failed'] += len(requests)
+                for request in requests:
+                    request.future.set_exception(e)
+                continue
+            for request, result in zip(requests, results):
+                request.future.set_result(result)
+        with self._cond:
+            self._counters['batches'] += 1
+            self._counters['batched_items'] += len(batch)
+            self._counters['largest_batch'] = max(self._counters['largest_batch'], len(batch))
+        if self.observe is not None:
+            self.observe(len(batch), waited)
+
+
+def batcher_from_env(run_batch, workers=1, observe=None):
+    """Crea el batcher según PREDICT_BATCH_MAX y PREDICT_BATCH_WAIT_MS.
+
+    Devuelve None si PREDICT_BATCH_MAX es 0 o 1.
+    """
+    try:
+        max_batch = int(os.environ.get('PREDICT_BATCH_MAX', '32'))
+        max_wait_ms = float(os.environ.get('PREDICT_BATCH_WAIT_MS', '2'))
+    except ValueError:
+        print("Advertencia: configuración de micro-batching no válida; usando valores por defecto.")
+        max_batch, max_wait_ms = 32, 2.0
+    if max_batch <= 1:
+        return None
+    return MicroBatcher(run_batch, max_batch=max_batch, max_wait=max_wait_ms / 1000, workers=workers,
+                        observe=observe)
@@ -1,3 +1,5 @@
+import argparse
+import json
 import os
 from pathlib import Path
 import pandas as pd
@@ -8,6 +10,11 @@ from sklearn.ensemble import RandomForestClassifier
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import classification_report
 
+import structured_model
+from artifact_registry import ArtifactRegistry
+from compiled_forest import compile_forest
+from data_loader import clean_chunk
+
 BASE = Path(__file__).parent
 DATA_PATHS = [BASE / "data" / "donapp_data_tecnico.csv", BASE / "donapp_data_tecnico.csv"]
 MODEL_FILENAME = BASE / "donapp_ml_model.joblib"
@@ -39,12 +46,23 @@ def load_data():
 def prepare(df: pd.DataFrame):
     if 'modelo' not in df.columns or 'prediccion_ml' not in df.columns:
         raise ValueError("CSV debe contener las columnas 'modelo' y 'prediccion_ml'")
-    df = df[['modelo','prediccion_ml']].dropna()
-    df = df[df['modelo'].astype(str).str.strip() != '']
-    df = df[df['prediccion_ml'].astype(str).str.strip() != '']
-    if df.empty:
+    texts, labels = clean_chunk(df, 'modelo', 'prediccion_ml')
+    if texts.empty:
         raise ValueError("No hay filas válidas en 'modelo' / 'prediccion_ml'")
-    return df['modelo'].astype(str), df['prediccion_ml'].astype(str)
+    return texts, labels
+
+def _atomic_dump(obj, path: Path):
+    tmp = path.with_name(path.name + ".tmp")
+    joblib.dump(obj, tmp)
+    os.replace(tmp, path)
+
+def publish_artifacts(model, vectorizer, encoder, metadata=None, compiled=None):
+    """Publica los tres artefactos como una versión nueva del registro.
+
+    La versión se escribe completa (con su manifiesto) antes de mover el
+    puntero `CURRENT`; los workers en marcha la cargan sin reiniciar.
+    """
+    return ArtifactRegistry().publish(model, vectorizer, encoder, metadata=metadata, compiled=compiled)
 
 def train_and_save(X, y):
     le = LabelEncoder()
@@ -71,17 +89,42 @@ def train_and_save(X, y):
         print("Reporte de clasificación (test):")
         print(classification_report(y_test, preds, zero_division=0))
 
-    joblib.dump(model, MODEL_FILENAME)
-    joblib.dump(tfidf, VECTORIZER_FILENAME)
-    joblib.dump(le, ENCODER_FILENAME)
-    print("Artefactos guardados:")
-    print(" ", MODEL_FILENAME)
-    print(" ", VECTORIZER_FILENAME)
-    print(" ", ENCODER_FILENAME)
+    version = publish_artifacts(model, tfidf, le, metadata={"trainer": "ml_model", "rows": int(len(y))},
+                                compiled=compile_forest(model))
+    print(f"Artefactos publicados como versión {version} en:", ArtifactRegistry().versions_dir / version)
     print("\nPara probar el modelo, ejecuta: python app.py y abre http://127.0.0.1:5000/interfaz")
 
-def main():
+def train_structured_and_save(df: pd.DataFrame):
+    """Entrena el pipeline multi-columna (ver `structured_model.py`) y lo publica.
+
+    El pipeline completo se publica como "modelo"; no hay vectorizador aparte.
+    """
+    X, y = structured_model.prepare_structured(df)
+    pipeline, le = structured_model.fit_structured(X, y)
+    version = publish_artifacts(pipeline, None, le,
+                                metadata={"trainer": "ml_model --structured", "rows": int(len(y)),
+                                          "features": structured_model.FEATURE_COLUMNS})
+    print(f"Pipeline estructurado publicado como versión {version} en:", ArtifactRegistry().versions_dir / version)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Entrenamiento del modelo de DonApp")
+    parser.add_argument("--structured", action="store_true",
+                        help="entrenar el pipeline con todas las columnas en lugar de sólo 'modelo'")
+    parser.add_argument("--compare", action="store_true",
+                        help="comparar exactitud, tamaño y latencia de ambos modelos sin publicar nada")
+    parser.add_argument("--report", help="guardar la comparación en este archivo JSON")
+    args = parser.parse_args(argv)
+
     df = load_data()
+    if args.compare:
+        report = structured_model.compare_models(df)
+        structured_model.print_comparison(report)
+        if args.report:
+            Path(args.report).write_text(json.dumps(report, indent=2), encoding="utf-8")
+        return
+    if args.structured:
+        train_structured_and_save(df)
+        return
     X, y = prepare(df)
     print(f"Registros disponibles para entrenamiento: {len(X)}")
     train_and_save(X, y)
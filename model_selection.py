@@ -0,0 +1,314 @@
+"""Selección de modelo: búsqueda con validación cruzada sobre el TF-IDF y el bosque.
+
+`ml_model.train_and_save` fija `max_features=200`, `ngram_range=(1, 2)` y
+`n_estimators=150` con una única partición. Aquí se evalúa una rejilla de
+configuraciones con K particiones (estratificadas si hay datos suficientes):
+
+1. Se ajusta el TF-IDF de cada partición y configuración de vectorizador.
+   Las matrices se guardan en disco con `joblib.Memory` (MODEL_SELECTION_CACHE,
+   por defecto `.model_selection_cache/`): otra ejecución con los mismos
+   datos no vuelve a ajustarlas.
+2. Se entrena y puntúa cada bosque en cada partición, repartidos en un pool
+   de procesos (cada uno con `n_jobs=1`).
+3. Con el pool ya cerrado se mide la latencia de una fila tal como se sirve
+   (`transform` + `CompiledForest`) y el tamaño de los artefactos.
+
+El resultado es una tabla con la exactitud media (y su desviación), la
+latencia y el tamaño, y el rango de cada candidato en cada métrica. Se
+recomienda el candidato más barato (menor latencia, luego menor tamaño) cuya
+exactitud llegue a `--min-accuracy` (por defecto, la mejor menos 0.01).
+
+    python model_selection.py
+    python model_selection.py --max-features 100,200 --estimators 50,150 --folds 3 --report seleccion.json
+    python model_selection.py --min-accuracy 0.8 --publish
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+BASE = Path(__file__).parent
+CACHE_DIR = Path(os.environ.get('MODEL_SELECTION_CACHE', BASE / '.model_selection_cache'))
+
+# Configuración que usa hoy `ml_model.train_and_save`.
+CURRENT_PARAMS = {'max_features': 200, 'ngram_range': (1, 2), 'n_estimators': 150, 'max_depth': None}
+DEFAULT_GRID = {
+    'max_features': [100, 200, 500],
+    'ngram_range': [(1, 1), (1, 2)],
+    'n_estimators': [50, 150, 300],
+    'max_depth': [None, 12],
+}
+ACCURACY_SLACK = 0.01
+
+# Estado de cada proceso del pool (ver `_init_worker`).
+_worker = {}
+
+
+def candidates(grid):
+    """Combinaciones de la rejilla como dicts, en un orden estable."""
+    keys = ['max_features', 'ngram_range', 'n_estimators', 'max_depth']
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+
+
+def make_folds(labels, n_folds, random_state=42):
+    """Índices (train, test) de cada partición; estratificadas si cada clase tiene `n_folds` filas."""
+    from sklearn.model_selection import KFold, StratifiedKFold
+    _, counts = np.unique(labels, return_counts=True)
+    if counts.min() >= n_folds:
+        splitter = StratifiedKFold(n_splits=n_folds, shuffle=True, random_state=random_state)
+    else:
+        splitter = KFold(n_splits=n_folds, shuffle=True, random_state=random_state)
+    return [(train, test) for train, test in splitter.split(np.zeros(len(labels)), labels)]
+
+
+def fit_fold_vectorizer(texts, train_idx, test_idx, max_features, ngram_range):
+    """TF-IDF ajustado sobre la parte de entrenamiento de una partición: (vectorizer, X_train, X_test)."""
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    vectorizer = TfidfVectorizer(max_features=max_features, ngram_range=tuple(ngram_range))
+    X_train = vectorizer.fit_transform(texts[train_idx])
+    return vectorizer, X_train, vectorizer.transform(texts[test_idx])
+
+
+def _init_worker(texts, labels, folds, cache_dir):
+    _worker.update(texts=texts, labels=labels, folds=folds)
+    if cache_dir is None:
+        _worker['vectorize'] = fit_fold_vectorizer
+    else:
+        from joblib import Memory
+        _worker['vectorize'] = Memory(str(cache_dir), verbose=0).cache(fit_fold_vectorizer)
+
+
+def _vectorize(fold, max_features, ngram_range):
+    train_idx, test_idx = _worker['folds'][fold]
+    return _worker['vectorize'](_worker['texts'], train_idx, test_idx, max_features, ngram_range)
+
+
+def _warm_vectorizer(fold, max_features, ngram_range):
+    """Fase 1: deja en caché las matrices de una partición. Devuelve si ya estaban."""
+    vectorize = _worker['vectorize']
+    train_idx, test_idx = _worker['folds'][fold]
+    args = (_worker['texts'], train_idx, test_idx, max_features, ngram_range)
+    cached = hasattr(vectorize, 'check_call_in_cache') and vectorize.check_call_in_cache(*args)
+    vectorize(*args)
+    return cached
+
+
+def _evaluate(params, fold, keep_model):
+    """Fase 2: entrena un bosque en una partición y devuelve su exactitud."""
+    from sklearn.ensemble import RandomForestClassifier
+    vectorizer, X_train, X_test = _vectorize(fold, params['max_features'], params['ngram_range'])
+    train_idx, test_idx = _worker['folds'][fold]
+    labels = _worker['labels']
+    start = time.perf_counter()
+    model = RandomForestClassifier(n_estimators=params['n_estimators'], max_depth=params['max_depth'],
+                                   random_state=42, n_jobs=1)
+    model.fit(X_train, labels[train_idx])
+    fit_seconds = time.perf_counter() - start
+    accuracy = float(np.mean(model.predict(X_test) == labels[test_idx]))
+    return accuracy, fit_seconds, (model, vectorizer) if keep_model else None
+
+
+def _artifact_cost(model, vectorizer):
+    """Tamaño de los artefactos publicados y del bosque compilado; devuelve también el compilado."""
+    from compiled_forest import compile_forest
+    from artifact_registry import size_bytes
+    compiled = compile_forest(model)
+    compiled_bytes = sum(a.nbytes for a in (compiled.feature, compiled.threshold, compiled.left,
+                                             compiled.right, compiled.value, compiled.roots))
+    return compiled, {'size_bytes': size_bytes(model, vectorizer), 'compiled_bytes': int(compiled_bytes),
+                      'total_nodes': int(compiled.n_nodes)}
+
+
+def measure_latencies(servers, texts, repeat, rounds=5):
+    """Latencia de una fila (`transform` + bosque compilado) de cada (vectorizer, compiled), en ms.
+
+    Las rondas se intercalan entre candidatos y se queda la mejor mediana de
+    cada uno, para que el ruido de la máquina no decida el orden.
+    """
+    best = [float('inf')] * len(servers)
+    per_round = max(repeat // rounds, 1)
+    for r in range(rounds):
+        for i, (vectorizer, compiled) in enumerate(servers):
+            timings = []
+            for j in range(per_round + 1):
+                start = time.perf_counter()
+                compiled.predict_proba(vectorizer.transform([texts[(r * per_round + j) % len(texts)]]))
+                timings.append(time.perf_counter() - start)
+            best[i] = min(best[i], float(np.median(timings[1:])))
+    return [round(t * 1000, 4) for t in best]
+
+
+def search(texts, labels, grid=None, n_folds=5, processes=None, cache_dir=CACHE_DIR, repeat=200):
+    """Evalúa la rejilla y devuelve el informe (dict) con un resultado por candidato."""
+    grid = grid or DEFAULT_GRID
+    texts = np.asarray(texts, dtype=object)
+    labels = np.asarray(labels)
+    folds = make_folds(labels, n_folds)
+    cands = candidates(grid)
+    vectorizer_keys = sorted({(c['max_features'], c['ngram_range']) for c in cands}, key=str)
+    processes = processes or os.cpu_count() or 1
+
+    report = {'rows': int(len(texts)), 'folds': len(folds), 'processes': processes,
+              'cache_dir': str(cache_dir) if cache_dir else None}
+    with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker,
+                             initargs=(texts, labels, folds, cache_dir)) as pool:
+        start = time.perf_counter()
+        jobs = [pool.submit(_warm_vectorizer, fold, mf, ng)
+                for mf, ng in vectorizer_keys for fold in range(len(folds))]
+        hits = sum(job.result() for job in jobs)
+        report['vectorize_seconds'] = round(time.perf_counter() - start, 3)
+        report['vectorize_cache_hits'] = f"{hits}/{len(jobs)}"
+
+        start = time.perf_counter()
+        jobs = {(i, fold): pool.submit(_evaluate, params, fold, fold == 0)
+                for i, params in enumerate(cands) for fold in range(len(folds))}
+        scores = {key: job.result() for key, job in jobs.items()}
+        report['train_seconds'] = round(time.perf_counter() - start, 3)
+
+    results, servers = [], []
+    for i, params in enumerate(cands):
+        accuracies = [scores[(i, fold)][0] for fold in range(len(folds))]
+        model, vectorizer = scores[(i, 0)][2]
+        compiled, cost = _artifact_cost(model, vectorizer)
+        servers.append((vectorizer, compiled))
+        results.append({
+            'params': {**params, 'ngram_range': list(params['ngram_range'])},
+            'current': params == CURRENT_PARAMS,
+            'accuracy': round(float(np.mean(accuracies)), 4),
+            'accuracy_std': round(float(np.std(accuracies)), 4),
+            'fit_seconds': round(float(np.mean([scores[(i, f)][1] for f in range(len(folds))])), 3),
+            **cost,
+        })
+    for result, latency in zip(results, measure_latencies(servers, texts, repeat)):
+        result['latency_ms'] = latency
+    # Rango de competición: los empates comparten puesto.
+    for metric, sign in (('accuracy', -1), ('latency_ms', 1), ('size_bytes', 1)):
+        values = [sign * r[metric] for r in results]
+        for result, value in zip(results, values):
+            result[f'rank_{metric}'] = 1 + sum(v < value for v in values)
+    results.sort(key=lambda r: (-r['accuracy'], r['latency_ms']))
+    report['results'] = results
+    return report
+
+
+def recommend(report, min_accuracy=None):
+    """El candidato más barato (latencia, luego tamaño) con exactitud >= `min_accuracy`."""
+    results = report['results']
+    if min_accuracy is None:
+        min_accuracy = max(r['accuracy'] for r in results) - ACCURACY_SLACK
+    eligible = [r for r in results if r['accuracy'] >= min_accuracy]
+    if not eligible:
+        return None, min_accuracy
+    return min(eligible, key=lambda r: (r['latency_ms'], r['size_bytes'])), min_accuracy
+
+
+def _describe(params):
+    ngram = '-'.join(str(n) for n in params['ngram_range'])
+    return f"tfidf {params['max_features']} ng {ngram} / {params['n_estimators']} árboles prof {params['max_depth']}"
+
+
+def print_leaderboard(report, chosen=None, limit=None):
+    print(f"Filas: {report['rows']}, {report['folds']} particiones, {report['processes']} procesos")
+    print(f"TF-IDF: {report['vectorize_seconds']} s (en caché: {report['vectorize_cache_hits']}); "
+          f"bosques: {report['train_seconds']} s")
+    print(f"\n{'#':>3}  {'candidato':<44}{'exactitud':>12}{'latencia ms':>13}{'tamaño KB':>11}{'nodos':>8}"
+          f"{'rangos (exac/lat/tam)':>24}")
+    for i, r in enumerate(report['results'][:limit], 1):
+        mark = ('>' if r is chosen else ' ') + ('*' if r['current'] else ' ')
+        ranks = f"{r['rank_accuracy']}/{r['rank_latency_ms']}/{r['rank_size_bytes']}"
+        print(f"{i:>3}{mark}{_describe(r['params']):<44}{r['accuracy']:>7.3f}±{r['accuracy_std']:.3f}"
+              f"{r['latency_ms']:>13.3f}{r['size_bytes'] / 1024:>11.0f}{r['total_nodes']:>8}{ranks:>24}")
+    print("\n* configuración actual de ml_model.py   > recomendada")
+
+
+def publish_candidate(texts, labels, params, metadata):
+    """Entrena el candidato con todos los datos y lo publica en el registro."""
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.preprocessing import LabelEncoder
+    from compiled_forest import compile_forest
+    from ml_model import publish_artifacts
+    encoder = LabelEncoder()
+    y = encoder.fit_transform(labels)
+    vectorizer = TfidfVectorizer(max_features=params['max_features'], ngram_range=tuple(params['ngram_range']))
+    X = vectorizer.fit_transform(texts)
+    model = RandomForestClassifier(n_estimators=params['n_estimators'], max_depth=params['max_depth'],
+                                   random_state=42, n_jobs=-1)
+    model.fit(X, y)
+    return publish_artifacts(model, vectorizer, encoder, metadata=metadata, compiled=compile_forest(model))
+
+
+def _int_or_none(value):
+    return None if value.strip().lower() == 'none' else int(value)
+
+
+def _parse_list(value, parse):
+    return [parse(v) for v in value.split(',') if v.strip()]
+
+
+def _parse_ngram(value):
+    low, _, high = value.partition('-')
+    return (int(low), int(high or low))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Selección de modelo con validación cruzada")
+    parser.add_argument('--max-features', help="p. ej. 100,200,500 (none = sin límite)")
+    parser.add_argument('--ngrams', help="p. ej. 1-1,1-2")
+    parser.add_argument('--estimators', help="p. ej. 50,150,300")
+    parser.add_argument('--max-depth', help="p. ej. none,12")
+    parser.add_argument('--folds', type=int, default=5)
+    parser.add_argument('--processes', type=int, default=None, help="procesos del pool (por defecto, nº de CPUs)")
+    parser.add_argument('--no-cache', action='store_true', help="no guardar ni reutilizar las matrices TF-IDF")
+    parser.add_argument('--min-accuracy', type=float, default=None,
+                        help=f"exactitud mínima (por defecto, la mejor menos {ACCURACY_SLACK})")
+    parser.add_argument('--top', type=int, default=None, help="mostrar sólo los N primeros")
+    parser.add_argument('--report', help="guardar el informe en este archivo JSON")
+    parser.add_argument('--publish', action='store_true',
+                        help="entrenar el candidato recomendado con todos los datos y publicarlo")
+    args = parser.parse_args(argv)
+
+    grid = dict(DEFAULT_GRID)
+    if args.max_features:
+        grid['max_features'] = _parse_list(args.max_features, _int_or_none)
+    if args.ngrams:
+        grid['ngram_range'] = _parse_list(args.ngrams, _parse_ngram)
+    if args.estimators:
+        grid['n_estimators'] = _parse_list(args.estimators, int)
+    if args.max_depth:
+        grid['max_depth'] = _parse_list(args.max_depth, _int_or_none)
+
+    from ml_model import load_data, prepare
+    X, y = prepare(load_data())
+    texts, labels = X.to_numpy(dtype=object), y.to_numpy()
+    print(f"{len(candidates(grid))} candidatos x {args.folds} particiones")
+    report = search(texts, labels, grid=grid, n_folds=args.folds, processes=args.processes,
+                    cache_dir=None if args.no_cache else CACHE_DIR)
+    chosen, bar = recommend(report, args.min_accuracy)
+    print_leaderboard(report, chosen, args.top)
+    report['min_accuracy'] = bar
+    report['recommended'] = chosen['params'] if chosen else None
+    if chosen is None:
+        print(f"\nNingún candidato llega a una exactitud de {bar:.3f}")
+    else:
+        print(f"\nRecomendado (exactitud >= {bar:.3f}): {_describe(chosen['params'])}")
+    if args.report:
+        Path(args.report).write_text(json.dumps(report, indent=2), encoding='utf-8')
+    if args.publish:
+        if chosen is None:
+            return 1
+        version = publish_candidate(texts, labels, chosen['params'], metadata={
+            'trainer': 'model_selection', 'rows': int(len(labels)), 'params': chosen['params'],
+            'cv_accuracy': chosen['accuracy'], 'folds': report['folds']})
+        print(f"Publicado como versión {version}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,101 @@
+"""Trabajo de CPU del modo ASGI (`asgi.py`), ejecutado en un pool de procesos.
+
+Cada proceso del pool carga su propio `InferenceEngine` al arrancar (con la
+misma caché, registro y recarga en caliente que la app WSGI) y atiende
+predicciones y maquetación de PDFs. Así el bucle de eventos nunca queda
+bloqueado por scikit-learn o FPDF, y varias peticiones lentas se reparten
+entre núcleos.
+
+Este módulo no importa Flask ni `app.py`: los procesos se crean con
+`spawn` y sólo cargan lo que necesitan.
+"""
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from artifact_registry import ArtifactRegistry
+from inference import InferenceEngine
+from prediction_cache import cache_from_env
+
+_engine = None
+
+
+def init_worker(model_path, vectorizer_path, encoder_path):
+    """Inicializador de cada proceso del pool: carga y calienta el modelo."""
+    global _engine
+    _engine = InferenceEngine(model_path, vectorizer_path, encoder_path, cache=cache_from_env(),
+                              registry=ArtifactRegistry())
+    _engine.load_now()
+
+
+def _ready():
+    # `ensure_loaded` (y no `ready`): si el proceso arrancó antes de publicar
+    # el primer modelo, así lo recoge en cuanto aparece en el registro.
+    return _engine is not None and _engine.ensure_loaded(0)
+
+
+def ping():
+    """Tarea vacía: sirve para arrancar (y esperar) a todos los procesos del pool."""
+    return os.getpid()
+
+
+def predict(record):
+    """Predicción de un registro del formulario, o None si no hay modelo."""
+    if not _ready():
+        return None
+    return _engine.predict(record)
+
+
+def predict_many(records, top_k=None):
+    """Lote de predicciones (ver `microbatch.py`); None por registro si no hay modelo."""
+    if not _ready():
+        return [None] * len(records)
+    return _engine.predict_many(records, top_k)
+
+
+def pipeline_info():
+    """Versión, columnas y top_k del modelo de este proceso: lo que necesita la caché del proceso padre."""
+    if not _ready():
+        return None
+    pipeline = _engine._pipeline
+    return {'version': pipeline.version, 'features': pipeline.features, 'top_k': _engine.top_k}
+
+
+def predict_many_with_info(records, top_k=None):
+    """`predict_many` más el `pipeline_info` con el que se calcularon los resultados."""
+    if not _ready():
+        return None, [None] * len(records)
+    _engine.check_for_update()
+    pipeline = _engine._pipeline
+    info = pipeline_info()
+    results = _engine.predict_many(records, top_k)
+    # Si el modelo se recargó a mitad del lote no se sabe con qué versión se calculó: que no se cachee.
+    return (info if _engine._pipeline is pipeline else None), results
+
+
+def engine_stats():
+    return {**_engine.stats(), 'pid': os.getpid()} if _engine is not None else None
+
+
+def render_pdf(data, prediction, path):
+    """Maqueta el informe y lo escribe en `path` (vía `.part` + rename).
+
+    Devuelve la duración de cada etapa y el tamaño del archivo.
+    """
+    from pdf_report import generate_prediction_pdf
+    start = time.perf_counter()
+    buffer = generate_prediction_pdf(data, prediction)
+    rendered = time.perf_counter()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.part'
+    with open(tmp_path, 'wb') as f:
+        f.write(buffer.getvalue())
+    os.replace(tmp_path, path)
+    return {'pdf_render': rendered - start, 'file_write': time.perf_counter() - rendered,
+            'bytes': os.path.getsize(path)}
+
+
+def make_pool(processes, model_path, vectorizer_path, encoder_path):
+    return ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn'),
+                               initializer=init_worker, initargs=(model_path, vectorizer_path, encoder_path))
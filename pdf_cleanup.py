@@ -0,0 +1,196 @@
+"""Borrado programado de los PDFs temporales de `tmp_pdfs/`.
+
+Un único hilo por proceso mantiene un montículo (heap) de vencimientos:
+programar un borrado es O(log n) y el hilo duerme hasta el siguiente
+vencimiento, en lugar de un hilo dormido por descarga o de recorrer el
+directorio entero cada pocos minutos.
+
+El planificador lleva además un manifiesto (ruta -> tamaño) de los archivos
+creados para exponer cuántos bytes ocupan y cuántos borrados quedan pendientes.
+
+Varios workers sirven el mismo PDF (el nombre depende del contenido) y cada
+uno tiene su propio montículo. El estado compartido es el mtime del archivo:
+`track` y `schedule` lo ponen al instante actual, y antes de borrar se
+comprueba que nadie lo haya tocado después; si lo tocó otro worker (o lo
+regeneró), el borrado se aplaza (max_age desde ese uso, el plazo más largo)
+en lugar de quitarle el archivo a su descarga: el worker que lo tocó tiene su
+propio vencimiento y lo borrará a su hora.
+"""
+import heapq
+import itertools
+import os
+import threading
+import time
+
+# Por debajo de este tamaño no merece la pena compactar el montículo.
+COMPACT_MIN_ENTRIES = 64
+
+
+class ExpiryScheduler:
+    """Planificador de borrados con montículo y un solo hilo.
+
+    - directory: carpeta vigilada; al primer uso se adoptan los archivos que
+      ya existían (p. ej. tras un reinicio) con vencimiento según su mtime.
+    - max_age_seconds: vida máxima de un archivo creado y nunca descargado.
+    """
+
+    def __init__(self, directory, max_age_seconds=3600):
+        self.directory = directory
+        self.max_age_seconds = max_age_seconds
+        self._heap = []
+        # ruta -> (vencimiento, seq, mtime_ns puesto al programar, retraso)
+        self._deadlines = {}
+        self._manifest = {}
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._pid = None
+        self._counters = {'deleted': 0, 'deleted_bytes': 0, 'errors': 0, 'postponed': 0, 'compactions': 0}
+
+    # --- API pública ---
+    def track(self, path, delay_seconds=None):
+        """Registra un archivo recién creado y programa su caducidad."""
+        self._ensure_started()
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            size = 0
+        with self._cond:
+            self._manifest[path] = size
+        self.schedule(path, self.max_age_seconds if delay_seconds is None else delay_seconds)
+
+    def schedule(self, path, delay_seconds):
+        """Programa (o reprograma) el borrado de `path` dentro de `delay_seconds`.
+
+        Si ya había un vencimiento, el nuevo lo sustituye; la entrada antigua
+        del montículo se descarta al salir (borrado perezoso) o al compactar.
+        También toca el mtime del archivo para que los demás workers lo vean.
+        """
+        self._ensure_started()
+        now_ns = time.time_ns()
+        try:
+            os.utime(path, ns=(now_ns, now_ns))
+        except OSError:
+            now_ns = None
+        self._push(path, delay_seconds, now_ns)
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._counters)
+            stats['pending_deletions'] = len(self._deadlines)
+            stats['heap_entries'] = len(self._heap)
+            stats['tracked_files'] = len(self._manifest)
+            stats['bytes_on_disk'] = sum(self._manifest.values())
+            stats['next_deletion_in'] = (max(0.0, self._heap[0][0] - time.time())
+                                         if self._heap else None)
+        return stats
+
+    # --- Internos ---
+    def _push(self, path, delay_seconds, touched_ns):
+        deadline = (touched_ns / 1e9 if touched_ns is not None else time.time()) + delay_seconds
+        with self._cond:
+            if path not in self._manifest:
+                try:
+                    self._manifest[path] = os.path.getsize(path)
+                except OSError:
+                    self._manifest[path] = 0
+            seq = next(self._seq)
+            self._deadlines[path] = (deadline, seq, touched_ns, delay_seconds)
+            heapq.heappush(self._heap, (deadline, seq, path))
+            if len(self._heap) > max(COMPACT_MIN_ENTRIES, 2 * len(self._deadlines)):
+                self._compact()
+            if self._heap[0][2] == path:
+                self._cond.notify()
+
+    def _compact(self):
+        # Más entradas obsoletas que vigentes: se reconstruye el montículo
+        # con las vigentes (O(n), amortizado entre las reprogramaciones).
+        self._heap = [(deadline, seq, path) for path, (deadline, seq, _, _) in self._deadlines.items()]
+        heapq.heapify(self._heap)
+        self._counters['compactions'] += 1
+
+    def _ensure_started(self):
+        # Se arranca en el primer uso dentro de cada proceso: funciona igual con
+        # `python app.py` que con gunicorn (donde los workers nacen por fork).
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._cond:
+            if self._pid == pid:
+                return
+            self._heap = []
+            self._deadlines = {}
+            self._manifest = {}
+            self._pid = pid
+            self._thread = threading.Thread(target=self._run, name='pdf-expiry', daemon=True)
+            self._thread.start()
+        self._adopt_existing()
+
+    def _adopt_existing(self):
+        """Adopta los archivos que ya estaban en la carpeta (un único listado).
+
+        Se saltan los temporales (`.part`, nombres que empiezan por `.`): los
+        está escribiendo otro worker y se renombran al terminar.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        for entry in os.scandir(self.directory):
+            if not entry.is_file() or entry.name.startswith('.') or entry.name.endswith('.part'):
+                continue
+            try:
+                st = entry.stat()
+            except FileNotFoundError:
+                continue
+            with self._cond:
+                self._manifest[entry.path] = st.st_size
+            # Sin tocar el mtime: vence max_age después del último uso.
+            self._push(entry.path, self.max_age_seconds, st.st_mtime_ns)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if not self._heap:
+                        self._cond.wait()
+                        continue
+                    deadline, _, path = self._heap[0]
+                    wait = deadline - time.time()
+                    if wait > 0:
+                        self._cond.wait(wait)
+                        continue
+                    _, seq, _ = heapq.heappop(self._heap)
+                    entry = self._deadlines.get(path)
+                    if entry is None or entry[1] != seq:
+                        continue  # reprogramado: la entrada vigente está más adelante
+                    del self._deadlines[path]
+                    size = self._manifest.pop(path, 0)
+                    break
+            self._delete(path, size, entry[2], entry[3])
+
+    def _delete(self, path, size, touched_ns, delay_seconds):
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        except OSError:
+            mtime_ns = None
+        if touched_ns is not None and mtime_ns is not None and mtime_ns > touched_ns:
+            # Otro worker lo sirvió o lo regeneró después. No se sabe con qué
+            # plazo (quizá `track`, con max_age): se aplaza el más largo de los
+            # dos; el borrado puntual queda a cargo del worker que lo tocó.
+            with self._cond:
+                self._counters['postponed'] += 1
+            self._push(path, max(delay_seconds, self.max_age_seconds), mtime_ns)
+            return
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            print(f"No se pudo eliminar {path}: {e}")
+            with self._cond:
+                self._counters['errors'] += 1
+            return
+        print(f"Eliminado archivo temporal: {path}")
+        with self._cond:
+            self._counters['deleted'] += 1
+            self._counters['deleted_bytes'] += size
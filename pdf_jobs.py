@@ -0,0 +1,205 @@
+"""Generación asíncrona de los informes PDF.
+
+`/predict` ya no espera a que FPDF maquete el informe: encola un trabajo y
+responde con su id. Un grupo acotado de hilos procesa la cola y el estado de
+cada informe se consulta con `/pdf_status/<archivo>`.
+
+El estado de los trabajos vive en el proceso que los encoló, pero con varios
+workers la consulta puede llegar a otro: por eso se pregunta por el nombre
+del PDF (que depende del contenido) y, si este proceso no conoce el trabajo,
+el estado se deduce de si el archivo ya está en la carpeta compartida
+(`file_status`).
+
+Si la cola está llena, `submit` espera como mucho `submit_timeout` segundos
+y luego lanza `QueueFullError` (contrapresión): quien llama decide cómo
+responder en lugar de acumular trabajo sin límite.
+"""
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+QUEUED = 'queued'
+RENDERING = 'rendering'
+DONE = 'done'
+ERROR = 'error'
+
+
+class QueueFullError(Exception):
+    """La cola de PDFs está llena; reintentar más tarde."""
+
+
+def file_status(output_dir, filename, job=None):
+    """Estado del informe `filename` visto desde cualquier worker.
+
+    `job` es el trabajo local (o None si lo encoló otro proceso). Si el PDF
+    ya está en `output_dir` el informe está hecho, lo haya generado quien lo haya
+    generado; si no, vale el estado local y, sin él, se da por encolado.
+    """
+    if os.path.isfile(os.path.join(output_dir, filename)):
+        state, error = DONE, None
+    elif job is not None:
+        state, error = job['state'], job['error']
+    else:
+        state, error = QUEUED, None
+    return {'filename': filename, 'state': state, 'error': error, 'known': job is not None}
+
+
+class PDFJobQueue:
+    """Cola acotada de trabajos de PDF con un grupo fijo de hilos.
+
+    - render: función (data, prediction) -> BytesIO con el PDF.
+    - output_dir: carpeta donde se escriben los PDFs (`tmp_pdfs/`).
+    - workers: nº de hilos que renderizan en paralelo.
+    - max_queue: nº máximo de trabajos esperando.
+    - submit_timeout: segundos que `submit` espera por un hueco en la cola.
+    - max_jobs: nº de trabajos cuyo estado se recuerda (los más antiguos se olvidan).
+    - on_written: callback opcional (ruta) llamado tras escribir cada PDF.
+    - observe: callback opcional (etapa, segundos) con la duración de la
+      maquetación ('pdf_render') y de la escritura ('file_write').
+    """
+
+    def __init__(self, render, output_dir, workers=2, max_queue=32, submit_timeout=0.5, max_jobs=1000,
+                 on_written=None, observe=None):
+        self.render = render
+        self.on_written = on_written
+        self.observe = observe
+        self.output_dir = output_dir
+        self.workers = workers
+        self.max_queue = max_queue
+        self.submit_timeout = submit_timeout
+        self.max_jobs = max_jobs
+
+        self._queue = None
+        self._threads = []
+        self._pid = None
+        self._jobs = OrderedDict()
+        self._by_filename = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._counters = {'submitted': 0, 'completed': 0, 'failed': 0, 'rejected': 0}
+
+    # --- API pública ---
+    def submit(self, data, prediction, filename=None):
+        """Encola un informe y devuelve el id del trabajo.
+
+        Si ya hay un trabajo pendiente para el mismo `filename`, devuelve ese id
+        en lugar de generar el mismo PDF dos veces.
+        """
+        self._ensure_workers()
+        job_id = uuid.uuid4().hex
+        job = {
+            'id': job_id,
+            'state': QUEUED,
+            'filename': filename or f"pred_{job_id}.pdf",
+            'submitted_at': time.time(),
+            'finished_at': None,
+            'error': None,
+        }
+        with self._lock:
+            # Consulta y alta bajo el mismo lock: dos envíos simultáneos del
+            # mismo informe no pueden encolar dos trabajos.
+            existing = self._inflight.get(job['filename'])
+            if existing is not None:
+                return existing
+            self._remember(job)
+            self._inflight[job['filename']] = job_id
+        try:
+            self._queue.put((job, dict(data), prediction), timeout=self.submit_timeout)
+        except queue.Full:
+            with self._lock:
+                self._jobs.pop(job_id, None)
+                if self._by_filename.get(job['filename']) == job_id:
+                    del self._by_filename[job['filename']]
+                self._inflight.pop(job['filename'], None)
+                self._counters['rejected'] += 1
+            raise QueueFullError("La cola de PDFs está llena")
+        with self._lock:
+            self._counters['submitted'] += 1
+        return job_id
+
+    def status(self, job_id):
+        """Copia del estado del trabajo o None si no existe (o ya se olvidó)."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def status_for(self, filename):
+        """Estado del último informe `filename` (ver `file_status`); válido en cualquier worker."""
+        with self._lock:
+            job = self._jobs.get(self._by_filename.get(filename))
+            job = dict(job) if job is not None else None
+        return file_status(self.output_dir, filename, job)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats['tracked_jobs'] = len(self._jobs)
+        stats['queue_depth'] = self._queue.qsize() if self._queue is not None else 0
+        stats['max_queue'] = self.max_queue
+        stats['workers'] = self.workers
+        return stats
+
+    # --- Internos ---
+    def _remember(self, job):
+        self._jobs[job['id']] = job
+        self._by_filename[job['filename']] = job['id']
+        while len(self._jobs) > self.max_jobs:
+            _, old = self._jobs.popitem(last=False)
+            if self._by_filename.get(old['filename']) == old['id']:
+                del self._by_filename[old['filename']]
+
+    def _ensure_workers(self):
+        # Los hilos se crean en el proceso que atiende peticiones (también bajo
+        # gunicorn, tras el fork), no al importar el módulo.
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid == pid:
+                return
+            self._queue = queue.Queue(maxsize=self.max_queue)
+            self._threads = []
+            for i in range(self.workers):
+                t = threading.Thread(target=self._worker, name=f'pdf-worker-{i}', daemon=True)
+                t.start()
+                self._threads.append(t)
+            self._pid = pid
+
+    def _set(self, job, **changes):
+        with self._lock:
+            job.update(changes)
+
+    def _worker(self):
+        while True:
+            job, data, prediction = self._queue.get()
+            try:
+                self._set(job, state=RENDERING)
+                start = time.perf_counter()
+                buffer = self.render(data, prediction)
+                rendered = time.perf_counter()
+                os.makedirs(self.output_dir, exist_ok=True)
+                path = os.path.join(self.output_dir, job['filename'])
+                tmp_path = path + '.part'
+                with open(tmp_path, 'wb') as f:
+                    f.write(buffer.getvalue())
+                os.replace(tmp_path, path)
+                if self.observe is not None:
+                    self.observe('pdf_render', rendered - start)
+                    self.observe('file_write', time.perf_counter() - rendered)
+                if self.on_written is not None:
+                    self.on_written(path)
+                self._set(job, state=DONE, finished_at=time.time())
+                with self._lock:
+                    self._counters['completed'] += 1
+            except Exception as e:
+                print(f"Error al generar el PDF {job['filename']}: {e}")
+                self._set(job, state=ERROR, error=str(e), finished_at=time.time())
+                with self._lock:
+                    self._counters['failed'] += 1
+            finally:
+                with self._lock:
+                    self._inflight.pop(job['filename'], None)
+                self._queue.task_done()
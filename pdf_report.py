@@ -0,0 +1,66 @@
+"""Informe PDF de una predicción, sin depender de Flask.
+
+Lo usan `predict.py` (generación en el propio proceso web) y los procesos
+`spawn` de `offload.py`, que así no arrancan una app Flask para maquetar.
+"""
+import hashlib
+import json
+from io import BytesIO
+
+
+# Súbelo cuando cambie la maquetación del informe: cambia el nombre de todos
+# los PDFs y evita servir informes con el formato antiguo.
+PDF_TEMPLATE_VERSION = '1'
+
+
+def report_filename(data, prediction):
+    """Nombre del PDF derivado de su contenido (datos, predicción y versión de plantilla).
+
+    Dos envíos idénticos producen el mismo nombre, así que el segundo reutiliza
+    el archivo ya generado en lugar de maquetarlo otra vez.
+    """
+    payload = json.dumps({'data': data, 'prediction': prediction, 'template': PDF_TEMPLATE_VERSION},
+                         sort_keys=True, ensure_ascii=False, default=str)
+    return f"pred_{hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]}.pdf"
+
+
+def generate_prediction_pdf(data, prediction):
+    # fpdf se importa al generar el primer informe, no al arrancar la app.
+    from fpdf import FPDF
+    pdf = FPDF()
+    pdf.add_page()
+
+    # Título
+    pdf.set_font("Arial", "B", 16)
+    pdf.cell(0, 10, "Informe de Predicción del Modelo", 0, 1, "C")
+    pdf.ln(5)
+
+    # Resultado de la Predicción
+    pdf.set_fill_color(220, 220, 255)  # Color de fondo azul claro
+    pdf.set_font("Arial", "B", 14)
+    pdf.cell(0, 10, f"PREDICCIÓN: {prediction}", 1, 1, "C", True)
+    pdf.ln(5)
+
+    # Datos Enviados
+    pdf.set_font("Arial", "B", 12)
+    pdf.cell(0, 10, "Datos del Equipo Registrado:", 0, 1, "L")
+    pdf.ln(1)
+
+    # Listar los datos en el PDF
+    pdf.set_font("Arial", "", 10)
+    for key, value in data.items():
+        # Excluir el campo prediction_result si está presente temporalmente
+        if key == 'prediction_result':
+            continue
+
+        # Formatear la clave
+        display_key = key.replace('_', ' ').title()
+
+        pdf.cell(50, 7, f"{display_key}:", 0, 0, "L")
+        pdf.cell(0, 7, str(value), 0, 1, "L")
+
+    # Salida del PDF en memoria
+    buffer = BytesIO()
+    pdf.output(buffer)
+    buffer.seek(0)
+    return buffer
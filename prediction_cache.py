@@ -0,0 +1,171 @@
+"""Caché de predicciones delante del motor de inferencia.
+
+Los usuarios envían una y otra vez los mismos textos ("Galaxy S21",
+"iPhone 11"...). La clave es el texto normalizado más la versión de los
+artefactos, así que un reentrenamiento invalida la caché sin más.
+
+- `PredictionCache`: LRU acotada en memoria con TTL y contadores.
+- `SQLiteCacheBackend`: respaldo compartido opcional para que varios
+  workers de gunicorn aprovechen los aciertos de los demás.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def normalize_text(text):
+    """Minúsculas y espacios colapsados: el TF-IDF ya ignora esas diferencias."""
+    return ' '.join(str(text).lower().split())
+
+
+class SQLiteCacheBackend:
+    """Caché compartida entre procesos sobre un archivo SQLite.
+
+    Cada hilo usa su propia conexión; los valores se guardan como JSON.
+    """
+
+    def __init__(self, path, ttl=3600):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute('CREATE TABLE IF NOT EXISTS prediction_cache ('
+                     'key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)')
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        row = self._conn().execute('SELECT value, expires FROM prediction_cache WHERE key = ?',
+                                   (key,)).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        conn = self._conn()
+        conn.execute('INSERT OR REPLACE INTO prediction_cache (key, value, expires) VALUES (?, ?, ?)',
+                     (key, json.dumps(value), time.time() + self.ttl))
+        conn.commit()
+
+    def purge(self, keep_prefix):
+        """Elimina entradas caducadas o de otras versiones de artefactos."""
+        conn = self._conn()
+        conn.execute('DELETE FROM prediction_cache WHERE expires < ? OR key NOT LIKE ?',
+                     (time.time(), keep_prefix + '%'))
+        conn.commit()
+
+
+class PredictionCache:
+    """LRU acotada con TTL. Segura entre hilos.
+
+    - maxsize: nº máximo de entradas en memoria.
+    - ttl: segundos de vida de cada entrada.
+    - backend: respaldo compartido opcional (p. ej. `SQLiteCacheBackend`).
+    """
+
+    def __init__(self, maxsize=2048, ttl=3600, backend=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.backend = backend
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0,
+                          'shared_hits': 0, 'invalidations': 0}
+
+    @staticmethod
+    def make_key(version, text, top_k):
+        return f"{version}|{top_k}|{normalize_text(text)}"
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires >= now:
+                    self._data.move_to_end(key)
+                    self._counters['hits'] += 1
+                    return value
+                del self._data[key]
+                self._counters['expirations'] += 1
+        if self.backend is not None:
+            try:
+                value = self.backend.get(key)
+            except sqlite3.Error as e:
+                print(f"Error leyendo la caché compartida: {e}")
+                value = None
+            if value is not None:
+                self._store(key, value)
+                with self._lock:
+                    self._counters['shared_hits'] += 1
+                return value
+        with self._lock:
+            self._counters['misses'] += 1
+        return None
+
+    def set(self, key, value):
+        self._store(key, value)
+        if self.backend is not None:
+            try:
+                self.backend.set(key, value)
+            except sqlite3.Error as e:
+                print(f"Error escribiendo la caché compartida: {e}")
+
+    def invalidate(self, version=None):
+        """Vacía la caché local; con `version`, purga además el respaldo compartido."""
+        with self._lock:
+            self._data.clear()
+            self._counters['invalidations'] += 1
+        if self.backend is not None and version is not None:
+            try:
+                self.backend.purge(f"{version}|")
+            except sqlite3.Error as e:
+                print(f"Error purgando la caché compartida: {e}")
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats['size'] = len(self._data)
+        stats['maxsize'] = self.maxsize
+        lookups = stats['hits'] + stats['shared_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['hits'] + stats['shared_hits']) / lookups if lookups else 0.0
+        return stats
+
+    def _store(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self._counters['evictions'] += 1
+
+
+def cache_from_env():
+    """Crea la caché según PREDICTION_CACHE_SIZE, PREDICTION_CACHE_TTL y PREDICTION_CACHE_DB.
+
+    Devuelve None si PREDICTION_CACHE_SIZE es 0.
+    """
+    try:
+        maxsize = int(os.environ.get('PREDICTION_CACHE_SIZE', '2048'))
+        ttl = float(os.environ.get('PREDICTION_CACHE_TTL', '3600'))
+    except ValueError:
+        print("Advertencia: configuración de caché no válida; usando valores por defecto.")
+        maxsize, ttl = 2048, 3600.0
+    if maxsize <= 0:
+        return None
+    backend = None
+    db_path = os.environ.get('PREDICTION_CACHE_DB')
+    if db_path:
+        backend = SQLiteCacheBackend(db_path, ttl=ttl)
+    return PredictionCache(maxsize=maxsize, ttl=ttl, backend=backend)
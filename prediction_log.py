@@ -0,0 +1,327 @@
+"""Registro de predicciones en modo solo-anexar (append-only).
+
+Sustituye el patrón "leer todo el CSV -> concatenar -> reescribir" por un
+escritor que sólo añade filas al final de `data_log.csv`:
+
+- Esquema fijo (`LOG_COLUMNS`), compatible con las columnas del formulario.
+  Un registro existente con otro esquema se migra a él (columna a columna).
+- Las filas se acumulan en memoria y un hilo de fondo las escribe por lotes.
+- Política de fsync configurable: 'always', 'batch' o 'none'.
+- Bloqueo de archivo entre procesos (varios workers de gunicorn).
+- Rotación por tamaño: data_log.csv -> data_log.csv.1 -> data_log.csv.2 ...
+
+El mismo escritor recoge el feedback de usuarios (`user_feedback.csv`, ver
+`get_feedback_log`): `/feedback` sólo encola la fila y responde.
+"""
+import atexit
+import csv
+import io
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Columnas del registro. Coinciden con los campos del formulario más la
+# predicción y la marca de tiempo que añade `save_data_to_csv`.
+LOG_COLUMNS = ['id_usuario', 'nombre_usuario', 'tipo_usuario', 'tipo', 'marca', 'modelo', 'anio',
+               'estado_fisico', 'encendido', 'fallas', 'ram', 'almacenamiento', 'descripcion',
+               'destino', 'prediccion_ml', 'timestamp']
+
+# Columnas de `user_feedback.csv` (separador ';'), las que lee `incremental_training.py`.
+FEEDBACK_COLUMNS = ['modelo', 'clasificacion_real', 'timestamp']
+
+FSYNC_POLICIES = ('always', 'batch', 'none')
+
+
+def _env_int(name, default):
+    try:
+        return int(os.environ.get(name, str(default)))
+    except ValueError:
+        print(f"Advertencia: valor de entorno {name} no válido; usando {default}.")
+        return default
+
+
+def _env_float(name, default):
+    try:
+        return float(os.environ.get(name, str(default)))
+    except ValueError:
+        print(f"Advertencia: valor de entorno {name} no válido; usando {default}.")
+        return default
+
+
+class _FileLock:
+    """Bloqueo exclusivo entre procesos sobre un archivo auxiliar `<ruta>.lock`.
+
+    Se usa un archivo aparte para que la rotación (renombrar el CSV) no
+    invalide el bloqueo que otros procesos están esperando.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._fd = None
+
+    def __enter__(self):
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        else:
+            while True:
+                try:
+                    msvcrt.locking(self._fd, msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+
+
+class AppendOnlyCSVWriter:
+    """Escritor CSV solo-anexar con buffer, hilo de vaciado y rotación.
+
+    - path: archivo CSV destino.
+    - columns: esquema fijo; las claves ajenas al esquema se ignoran.
+    - fsync: 'always' escribe y sincroniza en cada `append` (sin buffer);
+      'batch' sincroniza tras cada lote; 'none' lo deja al sistema operativo.
+    - flush_interval: segundos máximos que una fila espera en memoria.
+    - batch_size: nº de filas pendientes que fuerza un vaciado inmediato.
+    - max_bytes: tamaño a partir del cual se rota (0 desactiva la rotación).
+    - backup_count: nº de archivos rotados que se conservan.
+    """
+
+    def __init__(self, path, columns, sep=',', fsync='batch', flush_interval=1.0,
+                 batch_size=100, max_bytes=10 * 1024 * 1024, backup_count=5):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Política de fsync no válida: {fsync!r} (usa {FSYNC_POLICIES})")
+        self.path = path
+        self.columns = list(columns)
+        self.sep = sep
+        self.fsync = fsync
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+
+        self._buffer = []
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._closed = False
+        atexit.register(self.close)
+
+    # --- API pública ---
+    def append(self, row):
+        """Encola una fila (dict). Con fsync='always' se escribe en el acto."""
+        values = [self._cell(row.get(col)) for col in self.columns]
+        if self.fsync == 'always':
+            self._write_rows([values])
+            return
+        with self._cond:
+            self._ensure_flusher()
+            self._buffer.append(values)
+            if len(self._buffer) >= self.batch_size:
+                self._cond.notify()
+
+    def flush(self):
+        """Escribe en disco todas las filas pendientes."""
+        with self._cond:
+            rows, self._buffer = self._buffer, []
+        if rows:
+            self._write_rows(rows)
+
+    def close(self):
+        """Detiene el hilo de vaciado y escribe lo pendiente."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout=5)
+        self.flush()
+
+    def pending(self):
+        with self._cond:
+            return len(self._buffer)
+
+    # --- Internos ---
+    @staticmethod
+    def _cell(value):
+        return '' if value is None else str(value)
+
+    def _ensure_flusher(self):
+        # Tras un fork (p. ej. gunicorn con preload) el hilo del padre no existe
+        # en el hijo: se descarta el buffer heredado y se arranca un hilo nuevo.
+        pid = os.getpid()
+        if self._thread is not None and self._pid == pid:
+            return
+        if self._pid is not None and self._pid != pid:
+            self._buffer = []
+        self._pid = pid
+        self._closed = False
+        self._thread = threading.Thread(target=self._flusher, name='csv-log-flusher', daemon=True)
+        self._thread.start()
+
+    def _flusher(self):
+        while True:
+            with self._cond:
+                if len(self._buffer) < self.batch_size and not self._closed:
+                    # Esperar hasta completar un lote o agotar el intervalo.
+                    self._cond.wait(self.flush_interval)
+                rows, self._buffer = self._buffer, []
+                closed = self._closed
+            if rows:
+                try:
+                    self._write_rows(rows)
+                except Exception as e:
+                    print(f"Error escribiendo lote en {self.path}: {e}")
+            if closed:
+                return
+
+    def _encode(self, rows, header):
+        out = io.StringIO()
+        writer = csv.writer(out, delimiter=self.sep, lineterminator='\n')
+        if header:
+            writer.writerow(self.columns)
+        writer.writerows(rows)
+        return out.getvalue().encode('utf-8')
+
+    def _write_rows(self, rows):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        with self._write_lock, _FileLock(self.path + '.lock'):
+            self._prepare_target()
+            size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+            payload = self._encode(rows, header=(size == 0))
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, payload)
+                if self.fsync != 'none':
+                    os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    def _prepare_target(self):
+        """Rota el archivo si supera `max_bytes` o si su cabecera no coincide."""
+        if not os.path.exists(self.path):
+            return
+        if self.max_bytes and os.path.getsize(self.path) >= self.max_bytes:
+            self._rotate()
+            return
+        header = self._read_header() if os.path.getsize(self.path) > 0 else self.columns
+        if header != self.columns:
+            self._migrate(header)
+
+    def _read_header(self):
+        with open(self.path, newline='', encoding='utf-8-sig') as f:
+            return next(csv.reader(f, delimiter=self.sep), [])
+
+    def _migrate(self, header):
+        """Reescribe un registro con otro esquema en `self.columns`.
+
+        Cada valor va a su columna por nombre y las que faltan quedan vacías,
+        así el historial sigue en el archivo que leen las estadísticas. Si el
+        registro antiguo tenía columnas que no existen en el esquema, se
+        guarda además una copia intacta (`.legacy-<fecha>`).
+        """
+        dropped = [col for col in header if col not in self.columns]
+        if dropped:
+            legacy = f"{self.path}.legacy-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+            shutil.copy2(self.path, legacy)
+            print(f"Columnas {dropped} fuera del esquema; copia del registro antiguo en {legacy}")
+        tmp = f"{self.path}.migrating"
+        rows = 0
+        with open(self.path, newline='', encoding='utf-8-sig') as src, \
+                open(tmp, 'w', newline='', encoding='utf-8') as dst:
+            reader = csv.reader(src, delimiter=self.sep)
+            next(reader, None)
+            writer = csv.writer(dst, delimiter=self.sep, lineterminator='\n')
+            writer.writerow(self.columns)
+            for values in reader:
+                if values:
+                    record = dict(zip(header, values))
+                    writer.writerow([record.get(col, '') for col in self.columns])
+                    rows += 1
+            dst.flush()
+            if self.fsync != 'none':
+                os.fsync(dst.fileno())
+        os.replace(tmp, self.path)
+        print(f"Registro {self.path} migrado al esquema actual ({rows} filas)")
+
+    def _rotate(self):
+        if self.backup_count <= 0:
+            os.remove(self.path)
+            return
+        for i in range(self.backup_count - 1, 0, -1):
+            src = f"{self.path}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def _env_fsync(name):
+    fsync = os.environ.get(name, 'batch')
+    if fsync not in FSYNC_POLICIES:
+        print(f"Advertencia: {name}={fsync!r} no válido; usando 'batch'.")
+        fsync = 'batch'
+    return fsync
+
+
+def _shared_writer(path, build):
+    key = os.path.abspath(path)
+    with _writers_lock:
+        writer = _writers.get(key)
+        if writer is None:
+            writer = _writers[key] = build()
+        return writer
+
+
+def get_prediction_log(path):
+    """Devuelve el escritor compartido (uno por ruta y proceso) para `path`.
+
+    La configuración se lee de variables de entorno:
+    DATA_LOG_FSYNC, DATA_LOG_FLUSH_INTERVAL, DATA_LOG_BATCH_SIZE,
+    DATA_LOG_MAX_BYTES y DATA_LOG_BACKUPS.
+    """
+    return _shared_writer(path, lambda: AppendOnlyCSVWriter(
+        path, LOG_COLUMNS, fsync=_env_fsync('DATA_LOG_FSYNC'),
+        flush_interval=_env_float('DATA_LOG_FLUSH_INTERVAL', 1.0),
+        batch_size=_env_int('DATA_LOG_BATCH_SIZE', 100),
+        max_bytes=_env_int('DATA_LOG_MAX_BYTES', 10 * 1024 * 1024),
+        backup_count=_env_int('DATA_LOG_BACKUPS', 5),
+    ))
+
+
+def get_feedback_log(path):
+    """Escritor compartido de `user_feedback.csv` (separador ';').
+
+    Nunca rota: `incremental_training.py` lo lee a partir de un desplazamiento
+    en bytes. La cabecera se escribe bajo el bloqueo de archivo, así que dos
+    workers no pueden duplicarla. Configuración: FEEDBACK_FSYNC,
+    FEEDBACK_FLUSH_INTERVAL y FEEDBACK_BATCH_SIZE.
+    """
+    return _shared_writer(path, lambda: AppendOnlyCSVWriter(
+        path, FEEDBACK_COLUMNS, sep=';', fsync=_env_fsync('FEEDBACK_FSYNC'),
+        flush_interval=_env_float('FEEDBACK_FLUSH_INTERVAL', 1.0),
+        batch_size=_env_int('FEEDBACK_BATCH_SIZE', 100),
+        max_bytes=0,
+    ))
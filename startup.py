@@ -0,0 +1,58 @@
+"""Medición del arranque de la app por fases.
+
+`app.py` importa este módulo antes que nada y marca el final de cada fase
+(imports, configuración, modelo...). El resumen se imprime al terminar de
+importar la app y se expone en `/metrics` y en `/model/info`.
+
+Modos de carga del modelo (MODEL_LOAD_MODE):
+
+- eager: se carga y calienta al importar `app.py`. Es el modo de gunicorn con
+  `preload_app`: el proceso padre carga una vez y los workers heredan el
+  modelo por fork (copy-on-write).
+- background (por defecto): un hilo lo carga mientras el worker ya acepta
+  peticiones; `/predict` espera como mucho MODEL_READY_TIMEOUT segundos.
+- lazy: se carga en la primera petición que lo necesita.
+"""
+import os
+import time
+from collections import OrderedDict
+
+LOAD_MODES = ('eager', 'background', 'lazy')
+
+
+class StartupTimer:
+    """Duración de cada fase del arranque, en segundos."""
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self.started = time.perf_counter()
+        self._last = self.started
+        self.phases = OrderedDict()
+        self.total = None
+
+    def mark(self, phase):
+        """Cierra la fase `phase`: su duración es el tiempo desde la marca anterior."""
+        now = time.perf_counter()
+        self.phases[phase] = now - self._last
+        self._last = now
+
+    def finish(self):
+        self.total = time.perf_counter() - self.started
+        summary = ', '.join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in self.phases.items())
+        print(f"Arranque en {self.total * 1000:.0f} ms (pid {self.pid}): {summary}")
+
+    def report(self):
+        return {'pid': self.pid,
+                'phases_ms': {name: round(seconds * 1000, 1) for name, seconds in self.phases.items()},
+                'total_ms': round(self.total * 1000, 1) if self.total is not None else None}
+
+
+startup_timer = StartupTimer()
+
+
+def load_mode_from_env():
+    mode = os.environ.get('MODEL_LOAD_MODE', 'background')
+    if mode not in LOAD_MODES:
+        print(f"Advertencia: MODEL_LOAD_MODE={mode} no válido; usando 'background'.")
+        mode = 'background'
+    return mode
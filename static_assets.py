@@ -0,0 +1,310 @@
+"""Archivos estáticos con nombre por contenido, minificados y precomprimidos.
+
+`build` recorre `static/` y escribe en `static/dist/`:
+
+- una copia de cada archivo con el hash de su contenido en el nombre
+  (`style.css` -> `style.3f2a9c01b7de.css`). CSS y SVG se minifican antes
+  de calcular el hash; en los CSS, las referencias `url(...)` a otros
+  archivos de `static/` se reescriben a su nombre con hash;
+- variantes `.gz` (y `.br` si está instalado el paquete `brotli`) de los
+  archivos de texto, cuando salen más pequeñas;
+- `manifest.json`: nombre lógico -> nombre con hash, variantes de cada uno
+  y el tamaño/mtime de las fuentes para saber si hay que reconstruir.
+
+`init_static(app)` reconstruye al arrancar si alguna fuente cambió, hace que
+`url_for('static', filename='style.css')` devuelva `/static/dist/style.<hash>.css`
+y sirve esos archivos con `Cache-Control: public, max-age=31536000, immutable`
+y la variante comprimida que acepte el navegador (`Vary: Accept-Encoding`).
+Como el nombre cambia con el contenido, las visitas siguientes no piden
+nada a la app. STATIC_FINGERPRINT=0 lo desactiva.
+
+Los archivos de la versión anterior se conservan, para las páginas que aún
+los referencian durante un despliegue; los más antiguos se borran.
+
+Con nginx delante, `dist/` se puede servir sin pasar por Python:
+
+    location /static/dist/ {
+        alias /ruta/a/static/dist/;
+        gzip_static on;
+        add_header Cache-Control "public, max-age=31536000, immutable";
+    }
+
+    python static_assets.py          # construye static/dist/ (paso de despliegue)
+    python static_assets.py --check  # código de salida 1 si hay que reconstruir
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import sys
+from pathlib import Path
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+BASE = Path(__file__).parent
+STATIC_DIR = BASE / 'static'
+DIST_DIRNAME = 'dist'
+MANIFEST_FILE = 'manifest.json'
+MANIFEST_VERSION = 1
+HASH_LENGTH = 12
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+COMPRESSIBLE = {'.css', '.svg', '.js', '.json', '.txt', '.html', '.xml', '.map'}
+# Extensión de cada codificación, en orden de preferencia.
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+_CSS_STRING = re.compile(r'''("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')''')
+_CSS_STRING_OR_COMMENT = re.compile(_CSS_STRING.pattern + r'|/\*.*?\*/', re.S)
+_CSS_URL = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+_XML_COMMENT = re.compile(r'<!--.*?-->', re.S)
+
+
+def minify_css(text):
+    """Quita comentarios y espacios sobrantes sin tocar las cadenas."""
+    text = _CSS_STRING_OR_COMMENT.sub(lambda m: m.group(1) or ' ', text)
+    parts = _CSS_STRING.split(text)
+    for i in range(0, len(parts), 2):
+        code = re.sub(r'\s+', ' ', parts[i])
+        code = re.sub(r'\s*([{};,])\s*', r'\1', code)
+        code = re.sub(r':\s+', ':', code)
+        parts[i] = code.replace(';}', '}')
+    return ''.join(parts).strip()
+
+
+def minify_svg(text):
+    """Quita comentarios y espacios entre etiquetas."""
+    return re.sub(r'>\s+<', '><', _XML_COMMENT.sub('', text)).strip()
+
+
+def rewrite_css_urls(text, logical, files):
+    """Apunta los `url(...)` relativos de un CSS a los nombres con hash."""
+    css_dir = posixpath.dirname(posixpath.join(DIST_DIRNAME, logical))
+
+    def replace(match):
+        quote, ref = match.groups()
+        ref = ref.strip()
+        if ref.startswith(('data:', 'http:', 'https:', '//', '/', '#')):
+            return match.group(0)
+        path, sep, suffix = ref.partition('?') if '?' in ref else ref.partition('#')
+        target = posixpath.normpath(posixpath.join(posixpath.dirname(logical), path))
+        target = posixpath.join(DIST_DIRNAME, files[target]) if target in files else target
+        return f'url({quote}{posixpath.relpath(target, css_dir)}{sep}{suffix}{quote})'
+
+    return _CSS_URL.sub(replace, text)
+
+
+def _sources(static_dir):
+    """Archivos de `static/` (fuera de `dist/`) como {nombre lógico: Path}."""
+    static_dir = Path(static_dir)
+    sources = {}
+    for path in sorted(static_dir.rglob('*')):
+        logical = path.relative_to(static_dir).as_posix()
+        if (path.is_file() and not logical.startswith(DIST_DIRNAME + '/')
+                and not any(part.startswith('.') for part in logical.split('/'))):
+            sources[logical] = path
+    return sources
+
+
+def _fingerprint(sources):
+    return {name: [st.st_size, st.st_mtime_ns] for name, st in ((n, p.stat()) for n, p in sources.items())}
+
+
+def _hashed_name(logical, data):
+    digest = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+    stem, ext = posixpath.splitext(logical)
+    return f'{stem}.{digest}{ext}'
+
+
+def _write(path, data):
+    """Escritura atómica: varios workers pueden construir a la vez."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def _compress(data):
+    """{codificación: bytes} de las variantes que ahorran algo."""
+    variants = {'gzip': gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['br'] = brotli.compress(data, quality=11)
+    return {enc: body for enc, body in variants.items() if len(body) < len(data)}
+
+
+def load_manifest(static_dir=STATIC_DIR):
+    """El manifiesto de `dist/`, o None si no existe o es de otro formato."""
+    path = Path(static_dir) / DIST_DIRNAME / MANIFEST_FILE
+    try:
+        manifest = json.loads(path.read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return None
+    return manifest if manifest.get('version') == MANIFEST_VERSION else None
+
+
+def is_stale(static_dir=STATIC_DIR, manifest=None):
+    """True si falta el manifiesto o alguna fuente cambió, apareció o desapareció."""
+    manifest = manifest or load_manifest(static_dir)
+    return manifest is None or manifest.get('sources') != _fingerprint(_sources(static_dir))
+
+
+def build(static_dir=STATIC_DIR):
+    """Minifica, pone el hash en el nombre y precomprime todo `static/`. Devuelve el manifiesto."""
+    static_dir = Path(static_dir)
+    dist = static_dir / DIST_DIRNAME
+    previous = load_manifest(static_dir) or {}
+    sources = _sources(static_dir)
+    files, variants, sizes = {}, {}, {}
+    # Primero lo que no es CSS: los CSS necesitan los nombres finales de lo que referencian.
+    for logical in sorted(sources, key=lambda name: name.endswith('.css')):
+        data = sources[logical].read_bytes()
+        ext = posixpath.splitext(logical)[1].lower()
+        if ext == '.css':
+            data = rewrite_css_urls(minify_css(data.decode('utf-8')), logical, files).encode('utf-8')
+        elif ext == '.svg':
+            data = minify_svg(data.decode('utf-8')).encode('utf-8')
+        hashed = _hashed_name(logical, data)
+        files[logical] = hashed
+        _write(dist / hashed, data)
+        encoded = _compress(data) if ext in COMPRESSIBLE else {}
+        for encoding, suffix in ENCODINGS:
+            if encoding in encoded:
+                _write(dist / (hashed + suffix), encoded[encoding])
+        variants[hashed] = [enc for enc, _ in ENCODINGS if enc in encoded]
+        sizes[logical] = {'source': sources[logical].stat().st_size, 'built': len(data),
+                          **{enc: len(body) for enc, body in encoded.items()}}
+
+    manifest = {'version': MANIFEST_VERSION, 'files': files, 'variants': variants,
+                'sources': _fingerprint(sources), 'sizes': sizes}
+    _write(dist / MANIFEST_FILE, json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+    _prune(dist, manifest, previous)
+    return manifest
+
+
+def _prune(dist, manifest, previous):
+    """Borra de `dist/` lo que no es de esta versión ni de la anterior."""
+    keep = {MANIFEST_FILE}
+    for m in (manifest, previous):
+        for hashed, encodings in m.get('variants', {}).items():
+            keep.add(hashed)
+            keep.update(hashed + suffix for enc, suffix in ENCODINGS if enc in encodings)
+    for path in dist.rglob('*'):
+        if path.is_file() and not path.name.startswith('.') and path.relative_to(dist).as_posix() not in keep:
+            try:
+                path.unlink()
+            except OSError:
+                pass
+
+
+def negotiate(manifest, hashed, accept_encoding):
+    """(nombre en `dist/`, codificación o None) para `Accept-Encoding`."""
+    accepted = {}
+    for item in (accept_encoding or '').split(','):
+        name, _, params = item.strip().partition(';')
+        q = 1.0
+        if params.strip().startswith('q='):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    for encoding, suffix in ENCODINGS:
+        if encoding in manifest['variants'].get(hashed, ()) and accepted.get(encoding, 0) > 0:
+            return hashed + suffix, encoding
+    return hashed, None
+
+
+def response_headers(encoding):
+    """Cabeceras de un archivo con hash (y de su variante comprimida)."""
+    headers = {'Cache-Control': IMMUTABLE_CACHE_CONTROL, 'Vary': 'Accept-Encoding'}
+    if encoding:
+        headers['Content-Encoding'] = encoding
+    return headers
+
+
+def content_type(hashed):
+    return mimetypes.guess_type(hashed)[0] or 'application/octet-stream'
+
+
+def hashed_path(manifest, filename):
+    """`dist/<nombre con hash>` si `filename` está en el manifiesto; si no, None."""
+    if filename.startswith(DIST_DIRNAME + '/'):
+        hashed = filename[len(DIST_DIRNAME) + 1:]
+        return hashed if hashed in manifest['variants'] else None
+    return None
+
+
+def prepare(static_dir=STATIC_DIR):
+    """Manifiesto al día, reconstruyendo si hace falta. None si no se puede escribir `dist/`."""
+    manifest = load_manifest(static_dir)
+    if not is_stale(static_dir, manifest):
+        return manifest
+    try:
+        return build(static_dir)
+    except OSError as e:
+        print(f"Advertencia: no se pudo construir {Path(static_dir) / DIST_DIRNAME} ({e}); "
+              f"se sirven los estáticos sin hash.")
+        return manifest
+
+
+def init_static(app, static_dir=None):
+    """Nombres con hash en `url_for('static', ...)` y cabeceras inmutables para `dist/`."""
+    if os.environ.get('STATIC_FINGERPRINT', '1') == '0':
+        return None
+    from flask import request, send_from_directory
+
+    static_dir = Path(static_dir or app.static_folder)
+    manifest = prepare(static_dir)
+    if manifest is None:
+        return None
+    files = manifest['files']
+    dist = static_dir / DIST_DIRNAME
+    default_view = app.view_functions['static']
+
+    @app.url_defaults
+    def _hashed_static_url(endpoint, values):
+        if endpoint == 'static' and values.get('filename') in files:
+            values['filename'] = f"{DIST_DIRNAME}/{files[values['filename']]}"
+
+    def static(filename):
+        hashed = hashed_path(manifest, filename)
+        if hashed is None:
+            return default_view(filename=filename)
+        name, encoding = negotiate(manifest, hashed, request.headers.get('Accept-Encoding'))
+        response = send_from_directory(dist, name, mimetype=content_type(hashed), max_age=31536000)
+        response.headers.update(response_headers(encoding))
+        return response
+
+    app.view_functions['static'] = static
+    print(f"Estáticos con hash: {len(files)} archivos en {dist}")
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Construye static/dist/ (hash, minificado y compresión)")
+    parser.add_argument('--static-dir', default=str(STATIC_DIR))
+    parser.add_argument('--check', action='store_true', help="sólo comprobar si hay que reconstruir")
+    args = parser.parse_args(argv)
+
+    if args.check:
+        stale = is_stale(args.static_dir)
+        print("Hay que reconstruir." if stale else "static/dist/ está al día.")
+        return 1 if stale else 0
+    manifest = build(args.static_dir)
+    if brotli is None:
+        print("brotli no está instalado: sólo variantes .gz (pip install brotli).")
+    print(f"{'archivo':<36}{'original':>10}{'minif.':>10}{'gzip':>8}{'br':>8}")
+    for logical, hashed in sorted(manifest['files'].items()):
+        s = manifest['sizes'][logical]
+        print(f"{logical:<36}{s['source']:>10}{s['built']:>10}{s.get('gzip', '-'):>8}{s.get('br', '-'):>8}"
+              f"  -> dist/{hashed}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
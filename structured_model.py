@@ -0,0 +1,189 @@
+"""Modelo estructurado: usa todas las columnas de `donapp_data_tecnico.csv`.
+
+El modelo original sólo mira un TF-IDF de 200 términos del campo `modelo`.
+Aquí un único `Pipeline` ajustado combina:
+
+- texto: TF-IDF de `modelo` (disperso),
+- numéricas: `anio`, `estado_fisico`, `encendido`, `fallas`, `ram`,
+  `almacenamiento` (se extrae el número de valores como "8GB" y se traducen
+  palabras como "si"/"no"),
+- categóricas: one-hot de `tipo` y `marca`,
+
+seguido de una selección de variables (chi2) y un bosque más pequeño y menos
+profundo. En producción se publica el pipeline entero como "modelo", así que
+recibe los registros tal cual llegan del formulario.
+"""
+import re
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.compose import ColumnTransformer
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.feature_selection import SelectKBest, chi2
+from sklearn.impute import SimpleImputer
+from sklearn.metrics import accuracy_score
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import FunctionTransformer, LabelEncoder, MinMaxScaler, OneHotEncoder
+
+from artifact_registry import size_bytes
+
+TEXT_COLUMN = 'modelo'
+NUMERIC_COLUMNS = ['anio', 'estado_fisico', 'encendido', 'fallas', 'ram', 'almacenamiento']
+CATEGORICAL_COLUMNS = ['tipo', 'marca']
+FEATURE_COLUMNS = [TEXT_COLUMN] + NUMERIC_COLUMNS + CATEGORICAL_COLUMNS
+TARGET_COLUMN = 'prediccion_ml'
+
+# Valores escritos con palabras en los formularios y en los datos antiguos.
+WORD_VALUES = {
+    'encendido': {'si': 1, 'sí': 1, 'no': 0, 'parcial': 0.5},
+    'estado_fisico': {'nuevo': 10, 'bueno': 7, 'regular': 5, 'dañado': 3, 'malo': 2},
+    'fallas': {'no': 0, 'ninguna': 0},
+}
+_NUMBER = re.compile(r'(\d+(?:[.,]\d+)?)')
+
+
+def _missing(value):
+    return value is None or (isinstance(value, float) and np.isnan(value))
+
+
+def _to_number(value, words):
+    if _missing(value):
+        return np.nan
+    text = str(value).strip().lower()
+    if not text:
+        return np.nan
+    if text in words:
+        return words[text]
+    match = _NUMBER.search(text)
+    if match:
+        return float(match.group(1).replace(',', '.'))
+    # Una falla descrita con palabras ("pantalla rota") cuenta como una falla.
+    return 1.0 if words is WORD_VALUES['fallas'] else np.nan
+
+
+def clean_records(df):
+    """Normaliza registros crudos (formulario o CSV) al esquema de entrada del pipeline.
+
+    Trabaja con listas de Python y construye un único DataFrame al final: con
+    una sola fila (una petición) es varias veces más rápido que operar por columnas.
+    """
+    df = pd.DataFrame(df)
+    n = len(df)
+    raw = {col: (df[col].tolist() if col in df.columns else [None] * n) for col in FEATURE_COLUMNS}
+    out = {TEXT_COLUMN: ['' if _missing(v) else str(v) for v in raw[TEXT_COLUMN]]}
+    for col in NUMERIC_COLUMNS:
+        words = WORD_VALUES.get(col, {})
+        out[col] = [_to_number(v, words) for v in raw[col]]
+    for col in CATEGORICAL_COLUMNS:
+        out[col] = ['desconocido' if _missing(v) else str(v).strip().lower() for v in raw[col]]
+    return pd.DataFrame(out, index=df.index, columns=FEATURE_COLUMNS)
+
+
+def build_pipeline(n_estimators=40, max_depth=6, k_best=30, random_state=42):
+    preprocess = ColumnTransformer([
+        ('texto', TfidfVectorizer(max_features=200, ngram_range=(1, 2)), TEXT_COLUMN),
+        ('numericas', Pipeline([
+            ('imputar', SimpleImputer(strategy='median', keep_empty_features=True)),
+            ('escalar', MinMaxScaler()),
+        ]), NUMERIC_COLUMNS),
+        ('categoricas', OneHotEncoder(handle_unknown='ignore'), CATEGORICAL_COLUMNS),
+    ])
+    return Pipeline([
+        ('limpieza', FunctionTransformer(clean_records)),
+        ('preproceso', preprocess),
+        ('seleccion', SelectKBest(chi2, k=k_best)),
+        ('bosque', RandomForestClassifier(n_estimators=n_estimators, max_depth=max_depth,
+                                          min_samples_leaf=2, random_state=random_state, n_jobs=1)),
+    ])
+
+
+def prepare_structured(df):
+    """Filas con etiqueta y `modelo` no vacíos. Devuelve (X DataFrame, y Series)."""
+    if TARGET_COLUMN not in df.columns or TEXT_COLUMN not in df.columns:
+        raise ValueError("CSV debe contener las columnas 'modelo' y 'prediccion_ml'")
+    df = df[df[TARGET_COLUMN].notna() & df[TEXT_COLUMN].notna()]
+    df = df[df[TEXT_COLUMN].astype(str).str.strip() != '']
+    df = df[df[TARGET_COLUMN].astype(str).str.strip() != '']
+    if df.empty:
+        raise ValueError("No hay filas válidas en 'modelo' / 'prediccion_ml'")
+    return df.reindex(columns=FEATURE_COLUMNS), df[TARGET_COLUMN].astype(str)
+
+
+def fit_structured(X, y, **params):
+    """Ajusta el pipeline estructurado. Devuelve (pipeline, encoder)."""
+    encoder = LabelEncoder()
+    y_enc = encoder.fit_transform(y)
+    pipeline = build_pipeline(**params)
+    n_features = pipeline[:2].fit_transform(X).shape[1]
+    pipeline.set_params(seleccion__k=min(pipeline.get_params()['seleccion__k'], n_features))
+    pipeline.fit(X, y_enc)
+    return pipeline, encoder
+
+
+# --- Comparación con el modelo de sólo texto ---
+
+def _latency_ms(fn, repeat):
+    fn()  # calentamiento
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def _forest_shape(forest):
+    depths = [est.get_depth() for est in forest.estimators_]
+    nodes = [est.tree_.node_count for est in forest.estimators_]
+    return {'n_estimators': len(forest.estimators_), 'avg_depth': float(np.mean(depths)),
+            'total_nodes': int(np.sum(nodes))}
+
+
+def compare_models(df, repeat=50, test_size=0.2, random_state=42):
+    """Entrena el modelo actual (TF-IDF de `modelo` + 150 árboles) y el estructurado
+    sobre la misma partición y compara exactitud, tamaño y latencia."""
+    from sklearn.model_selection import train_test_split
+
+    X, y = prepare_structured(df)
+    stratify = y if y.value_counts().min() >= 2 else None
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=test_size,
+                                                        random_state=random_state, stratify=stratify)
+    one = X_test.iloc[[0]]
+
+    # Modelo actual
+    encoder = LabelEncoder().fit(y)
+    tfidf = TfidfVectorizer(max_features=200, ngram_range=(1, 2))
+    Xt_train = tfidf.fit_transform(X_train[TEXT_COLUMN].astype(str))
+    forest = RandomForestClassifier(n_estimators=150, random_state=42, n_jobs=-1)
+    forest.fit(Xt_train, encoder.transform(y_train))
+    texts_test = X_test[TEXT_COLUMN].astype(str)
+    baseline = {
+        'accuracy': accuracy_score(encoder.transform(y_test), forest.predict(tfidf.transform(texts_test))),
+        'size_bytes': size_bytes(forest, tfidf, encoder),
+        'single_row_ms': _latency_ms(lambda: forest.predict_proba(tfidf.transform(one[TEXT_COLUMN])), repeat),
+        'batch_ms': _latency_ms(lambda: forest.predict_proba(tfidf.transform(texts_test)), max(1, repeat // 5)),
+        **_forest_shape(forest),
+    }
+
+    # Modelo estructurado
+    pipeline, s_encoder = fit_structured(X_train, y_train)
+    structured = {
+        'accuracy': accuracy_score(s_encoder.transform(y_test), pipeline.predict(X_test)),
+        'size_bytes': size_bytes(pipeline, s_encoder),
+        'single_row_ms': _latency_ms(lambda: pipeline.predict_proba(one), repeat),
+        'batch_ms': _latency_ms(lambda: pipeline.predict_proba(X_test), max(1, repeat // 5)),
+        'selected_features': int(pipeline.named_steps['seleccion'].get_support().sum()),
+        **_forest_shape(pipeline.named_steps['bosque']),
+    }
+    return {'rows_train': len(X_train), 'rows_test': len(X_test),
+            'baseline': baseline, 'structured': structured}
+
+
+def print_comparison(report):
+    print(f"Filas: {report['rows_train']} entrenamiento / {report['rows_test']} prueba")
+    keys = ['accuracy', 'size_bytes', 'single_row_ms', 'batch_ms', 'n_estimators', 'avg_depth', 'total_nodes']
+    print(f"{'métrica':<16}{'actual':>14}{'estructurado':>16}")
+    for key in keys:
+        a, b = report['baseline'][key], report['structured'][key]
+        fmt = '{:>14.3f}{:>16.3f}' if isinstance(a, float) else '{:>14}{:>16}'
+        print(f"{key:<16}" + fmt.format(a, b))
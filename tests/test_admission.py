@@ -0,0 +1,127 @@
+"""Control de admisión: cubo de fichas, devolución al descartar y cola con timeout."""
+import threading
+import time
+
+import pytest
+
+from admission import (QUEUE_FULL, QUEUE_TIMEOUT, RATE_LIMITED, AdmissionController, ConcurrencyLimiter,
+                       Overloaded, SQLiteBucketBackend, TokenBucketLimiter, admission_from_env,
+                       forwarded_ip, parse_limits)
+
+
+def test_token_bucket_allows_burst_then_limits():
+    limiter = TokenBucketLimiter(per_minute=60, burst=3)
+    assert [limiter.check('user:1') for _ in range(3)] == [0.0, 0.0, 0.0]
+    wait = limiter.check('user:1')
+    assert 0 < wait <= 1.0
+    # Otro usuario tiene su propio cubo.
+    assert limiter.check('user:2') == 0.0
+    assert limiter.stats()['rate_limited'] == 1
+
+
+def test_token_bucket_refills_over_time():
+    limiter = TokenBucketLimiter(per_minute=600, burst=1)  # una ficha cada 0.1 s
+    assert limiter.check('k') == 0.0
+    assert limiter.check('k') > 0
+    time.sleep(0.15)
+    assert limiter.check('k') == 0.0
+
+
+def test_sqlite_buckets_are_shared_and_refundable(tmp_path):
+    path = str(tmp_path / 'buckets.db')
+    first = TokenBucketLimiter(per_minute=1, burst=2, backend=SQLiteBucketBackend(path))
+    second = TokenBucketLimiter(per_minute=1, burst=2, backend=SQLiteBucketBackend(path))
+    assert first.check('ip:1') == 0.0
+    assert second.check('ip:1') == 0.0
+    assert first.check('ip:1') > 0
+    second.refund('ip:1')
+    assert first.check('ip:1') == 0.0
+
+
+def test_limiter_rejects_when_queue_is_full():
+    limiter = ConcurrencyLimiter(limit=1, max_queue=0)
+    assert limiter.acquire() == 0.0
+    with pytest.raises(Overloaded) as excinfo:
+        limiter.acquire()
+    assert excinfo.value.reason == QUEUE_FULL and excinfo.value.status_code == 503
+    assert excinfo.value.retry_after >= 1
+    limiter.release(0.01)
+    assert limiter.acquire() == 0.0
+
+
+def test_limiter_queue_times_out():
+    limiter = ConcurrencyLimiter(limit=1, max_queue=1, queue_timeout=0.05)
+    limiter.acquire()
+    start = time.monotonic()
+    with pytest.raises(Overloaded) as excinfo:
+        limiter.acquire()
+    assert excinfo.value.reason == QUEUE_TIMEOUT
+    assert time.monotonic() - start >= 0.05
+    stats = limiter.stats()
+    assert stats[QUEUE_TIMEOUT] == 1 and stats['queue_depth'] == 0 and stats['in_flight'] == 1
+
+
+def test_queued_request_gets_the_released_slot():
+    limiter = ConcurrencyLimiter(limit=1, max_queue=1, queue_timeout=2.0)
+    limiter.acquire()
+    waited = []
+    thread = threading.Thread(target=lambda: waited.append(limiter.acquire()))
+    thread.start()
+    time.sleep(0.05)
+    limiter.release(0.05)
+    thread.join(timeout=2)
+    assert waited and waited[0] > 0
+    assert limiter.stats()['queued'] == 1
+
+
+def test_controller_refunds_token_when_shed():
+    rate = TokenBucketLimiter(per_minute=1, burst=2)
+    shed = []
+    controller = AdmissionController({'predict': ConcurrencyLimiter(1, 0)}, rate,
+                                     on_shed=lambda endpoint, reason: shed.append(reason))
+    admission = controller.admit('predict', 'user:1')
+    for _ in range(3):
+        with pytest.raises(Overloaded):
+            controller.admit('predict', 'user:1')
+    assert shed == [QUEUE_FULL] * 3
+    # Los descartes por saturación no gastaron fichas: queda la segunda.
+    admission.release()
+    assert controller.admit('predict', 'user:1') is not None
+    assert rate.stats()['refunded'] == 3
+
+
+def test_controller_rate_limits_before_queueing():
+    controller = AdmissionController({'predict': ConcurrencyLimiter(4, 0)},
+                                     TokenBucketLimiter(per_minute=1, burst=1))
+    controller.admit('predict', 'user:1').release()
+    with pytest.raises(Overloaded) as excinfo:
+        controller.admit('predict', 'user:1')
+    assert excinfo.value.reason == RATE_LIMITED and excinfo.value.status_code == 429
+    assert controller.admit('otro_endpoint', 'user:1') is None
+
+
+def test_degraded_only_when_request_waited():
+    controller = AdmissionController({'predict': ConcurrencyLimiter(1, 1, queue_timeout=2.0)}, degrade=True)
+    first = controller.admit('predict')
+    assert not first.degraded
+    threading.Timer(0.05, first.release).start()
+    assert controller.admit('predict').degraded
+
+
+def test_parse_limits_and_env(monkeypatch):
+    limiters = parse_limits('predict=4:16, predict_batch=1', 0.5)
+    assert (limiters['predict'].limit, limiters['predict'].max_queue) == (4, 16)
+    assert (limiters['predict_batch'].limit, limiters['predict_batch'].max_queue) == (1, 0)
+    monkeypatch.setenv('ADMISSION_LIMITS', '')
+    assert admission_from_env() is None
+    monkeypatch.setenv('ADMISSION_LIMITS', 'predict=2:2')
+    monkeypatch.delenv('RATE_LIMIT_PER_MINUTE', raising=False)
+    assert admission_from_env().rate_limiter is None  # el límite de ritmo es opcional
+
+
+def test_forwarded_ip_follows_trusted_proxies():
+    assert forwarded_ip('10.0.0.1', '203.0.113.7', 0) == '10.0.0.1'
+    assert forwarded_ip('10.0.0.1', '203.0.113.7', 1) == '203.0.113.7'
+    assert forwarded_ip('10.0.0.1', '198.51.100.1, 203.0.113.7', 1) == '203.0.113.7'
+    assert forwarded_ip('10.0.0.1', '198.51.100.1, 203.0.113.7', 2) == '198.51.100.1'
+    assert forwarded_ip('10.0.0.1', '203.0.113.7', 2) == '10.0.0.1'
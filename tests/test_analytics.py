@@ -0,0 +1,90 @@
+"""`AnalyticsStore`: incorporación incremental de los CSV, también tras rotarlos."""
+import os
+from datetime import datetime
+
+import pytest
+
+from analytics import AnalyticsStore
+from prediction_log import AppendOnlyCSVWriter, FEEDBACK_COLUMNS, LOG_COLUMNS
+
+NOW = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+
+def prediction(modelo, clase, tipo='Laptop', marca='Dell'):
+    return {'modelo': modelo, 'tipo': tipo, 'marca': marca, 'prediccion_ml': clase, 'timestamp': NOW}
+
+
+@pytest.fixture
+def paths(tmp_path):
+    return str(tmp_path / 'data_log.csv'), str(tmp_path / 'user_feedback.csv'), str(tmp_path / 'analytics.db')
+
+
+@pytest.fixture
+def store(paths):
+    log_path, feedback_path, db_path = paths
+    return AnalyticsStore(db_path, log_path, feedback_path)
+
+
+def log_writer(path, max_bytes=0):
+    return AppendOnlyCSVWriter(path, LOG_COLUMNS, fsync='always', max_bytes=max_bytes, backup_count=5)
+
+
+def test_refresh_reads_only_new_rows(paths, store):
+    log = log_writer(paths[0])
+    log.append(prediction('Inspiron 15', 'Funcional'))
+    log.append(prediction('Galaxy S8', 'Reciclaje', tipo='Celular', marca='Samsung'))
+    assert store.refresh() == {'predictions': 2, 'feedback': 0}
+    assert store.refresh() == {'predictions': 0, 'feedback': 0}
+    log.append(prediction('Inspiron 15', 'Funcional'))
+    assert store.refresh()['predictions'] == 1
+
+    summary = store.summary()
+    assert summary['total_predicciones'] == 3
+    assert summary['por_clase'] == {'Funcional': 2, 'Reciclaje': 1}
+    assert summary['por_tipo']['Celular'] == {'Reciclaje': 1}
+    assert summary['por_dia'] == [{'dia': NOW[:10], 'Funcional': 2, 'Reciclaje': 1}]
+
+
+def test_skips_error_rows(paths, store):
+    log = log_writer(paths[0])
+    log.append(prediction('Inspiron 15', 'Error: modelo no cargado'))
+    log.append(prediction('', 'Funcional'))
+    assert store.refresh()['predictions'] == 0
+
+
+def test_follows_rotation_without_losing_or_repeating_rows(paths, store):
+    log = log_writer(paths[0], max_bytes=400)
+    for i in range(3):
+        log.append(prediction(f'equipo {i}', 'Funcional'))
+    assert store.refresh()['predictions'] == 3
+    # Lo bastante para rotar varias veces antes de la siguiente incorporación.
+    for i in range(3, 20):
+        log.append(prediction(f'equipo {i}', 'Funcional'))
+    assert os.path.exists(paths[0] + '.2')
+    assert store.refresh()['predictions'] == 17
+    assert store.summary()['total_predicciones'] == 20
+
+
+def test_rebuild_matches_incremental_state(paths, store):
+    log = log_writer(paths[0], max_bytes=400)
+    for i in range(12):
+        log.append(prediction(f'equipo {i}', 'Reciclaje' if i % 3 else 'Funcional'))
+        if i % 4 == 0:
+            store.refresh()
+    store.refresh()
+    incremental = store.summary()
+    store.rebuild()
+    assert store.summary() == incremental
+
+
+def test_feedback_is_compared_with_last_prediction(paths, store):
+    log_path, feedback_path, _ = paths
+    log = log_writer(log_path)
+    log.append(prediction('Inspiron 15', 'Reciclaje'))
+    log.append(prediction('Inspiron 15', 'Funcional'))
+    feedback = AppendOnlyCSVWriter(feedback_path, FEEDBACK_COLUMNS, sep=';', fsync='always', max_bytes=0)
+    feedback.append({'modelo': 'INSPIRON 15', 'clasificacion_real': 'funcional', 'timestamp': NOW})
+    feedback.append({'modelo': 'Galaxy S8', 'clasificacion_real': 'Reciclaje', 'timestamp': NOW})
+    assert store.refresh() == {'predictions': 2, 'feedback': 2}
+    acuerdo = store.summary()['acuerdo']
+    assert acuerdo['coincide'] == 1 and acuerdo['sin_prediccion'] == 1 and acuerdo['tasa'] == 1.0
@@ -0,0 +1,51 @@
+"""Paridad de `CompiledForest` con `RandomForestClassifier.predict_proba`."""
+import numpy as np
+import pytest
+from scipy import sparse
+from sklearn.ensemble import RandomForestClassifier
+
+from compiled_forest import CompiledForest, compile_forest
+
+
+@pytest.fixture(scope='module')
+def data():
+    rng = np.random.RandomState(0)
+    X = rng.rand(300, 12)
+    # Un tercio de ceros, como en un TF-IDF, para que la versión dispersa tenga sentido.
+    X[rng.rand(*X.shape) < 0.33] = 0.0
+    y = np.where(X[:, 0] + X[:, 3] > 0.8, 'Funcional', np.where(X[:, 5] > 0.5, 'Reciclaje', 'Reparación'))
+    return X, y
+
+
+@pytest.fixture(scope='module')
+def model(data):
+    X, y = data
+    return RandomForestClassifier(n_estimators=15, max_depth=6, random_state=0).fit(X, y)
+
+
+def test_predict_proba_matches_dense(model, data):
+    X, _ = data
+    compiled = compile_forest(model)
+    assert np.allclose(compiled.predict_proba(X), model.predict_proba(X))
+    assert np.array_equal(compiled.predict(X), model.predict(X))
+
+
+def test_predict_proba_matches_sparse(model, data):
+    X = sparse.csr_matrix(data[0])
+    compiled = compile_forest(model)
+    assert np.allclose(compiled.predict_proba(X), model.predict_proba(X))
+    assert np.allclose(compiled.predict_proba(X[:1]), model.predict_proba(X[:1]))
+
+
+def test_save_and_load_roundtrip(model, data, tmp_path):
+    X, _ = data
+    path = str(tmp_path / 'forest.npz')
+    compile_forest(model).save(path)
+    loaded = CompiledForest.load(path)
+    assert list(loaded.classes_) == list(model.classes_)
+    assert np.allclose(loaded.predict_proba(X), model.predict_proba(X))
+
+
+def test_rejects_wrong_width(model):
+    with pytest.raises(ValueError):
+        compile_forest(model).predict_proba(np.zeros((1, 3)))
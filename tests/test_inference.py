@@ -0,0 +1,65 @@
+"""`InferenceEngine`: carga desde el registro y recogida de versiones nuevas."""
+import time
+
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.preprocessing import LabelEncoder
+
+import inference
+from artifact_registry import ArtifactRegistry
+from inference import InferenceEngine
+
+TEXTS = ['laptop dell inspiron', 'iphone pantalla rota', 'laptop hp pavilion', 'nokia sin bateria'] * 5
+LABELS = ['Funcional', 'Reciclaje', 'Funcional', 'Reciclaje'] * 5
+
+
+def train():
+    vectorizer = TfidfVectorizer().fit(TEXTS)
+    encoder = LabelEncoder().fit(LABELS)
+    model = RandomForestClassifier(n_estimators=5, random_state=0).fit(
+        vectorizer.transform(TEXTS), encoder.transform(LABELS))
+    return model, vectorizer, encoder
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline and not condition():
+        time.sleep(0.02)
+    return condition()
+
+
+@pytest.fixture
+def registry(tmp_path):
+    return ArtifactRegistry(tmp_path / 'artifacts')
+
+
+@pytest.fixture
+def engine(tmp_path, registry, monkeypatch):
+    monkeypatch.setattr(inference, 'RELOAD_CHECK_SECONDS', 0.0)
+    missing = str(tmp_path / 'no_existe.joblib')
+    return InferenceEngine(missing, missing, missing, registry=registry)
+
+
+def test_loads_active_version(engine, registry):
+    version = registry.publish(*train())
+    assert engine.ensure_loaded(timeout=10)
+    assert engine.version == version
+    assert engine.predict('laptop dell inspiron')['label'] in ('Funcional', 'Reciclaje')
+
+
+def test_picks_up_first_version_published_after_boot(engine, registry):
+    assert not engine.ensure_loaded(timeout=10)
+    version = registry.publish(*train())
+    assert wait_until(lambda: engine.ensure_loaded(0))
+    assert engine.version == version
+
+
+def test_reloads_when_active_version_changes(engine, registry):
+    registry.publish(*train())
+    assert engine.ensure_loaded(timeout=10)
+    time.sleep(0.01)
+    newer = registry.publish(*train())
+    engine.check_for_update()
+    assert wait_until(lambda: engine.version == newer)
+    assert engine.stats()['reloads'] == 1
@@ -0,0 +1,90 @@
+"""`MicroBatcher`: agrupación por lotes y vaciado por tiempo."""
+import threading
+import time
+
+import pytest
+
+from microbatch import MicroBatcher, batcher_from_env
+
+
+class Recorder:
+    """`run_batch` de prueba: anota cada llamada y devuelve el item en mayúsculas."""
+
+    def __init__(self):
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def __call__(self, items, top_k):
+        with self.lock:
+            self.calls.append((list(items), top_k))
+        return [(item.upper(), top_k) for item in items]
+
+
+def test_concurrent_requests_share_one_call():
+    run = Recorder()
+    batcher = MicroBatcher(run, max_batch=8, max_wait=0.2)
+    futures = [batcher.submit_future(f'item{i}') for i in range(5)]
+    assert [f.result(timeout=2) for f in futures] == [(f'ITEM{i}', None) for i in range(5)]
+    assert run.calls == [([f'item{i}' for i in range(5)], None)]
+    stats = batcher.stats()
+    assert stats['batches'] == 1 and stats['largest_batch'] == 5 and stats['avg_batch'] == 5.0
+
+
+def test_full_batch_is_flushed_without_waiting():
+    run = Recorder()
+    batcher = MicroBatcher(run, max_batch=4, max_wait=5.0)
+    start = time.monotonic()
+    futures = [batcher.submit_future(f'item{i}') for i in range(4)]
+    for f in futures:
+        f.result(timeout=2)
+    assert time.monotonic() - start < 1.0
+    assert [len(items) for items, _ in run.calls] == [4]
+
+
+def test_batches_never_exceed_max_batch():
+    run = Recorder()
+    batcher = MicroBatcher(run, max_batch=3, max_wait=0.05)
+    futures = [batcher.submit_future(f'item{i}') for i in range(10)]
+    assert [f.result(timeout=2)[0] for f in futures] == [f'ITEM{i}' for i in range(10)]
+    assert all(len(items) <= 3 for items, _ in run.calls)
+    assert sum(len(items) for items, _ in run.calls) == 10
+
+
+def test_lone_request_is_flushed_after_max_wait():
+    run = Recorder()
+    batcher = MicroBatcher(run, max_batch=32, max_wait=0.05)
+    start = time.monotonic()
+    assert batcher.submit('solo') == ('SOLO', None)
+    elapsed = time.monotonic() - start
+    assert 0.04 <= elapsed < 1.0
+    assert run.calls == [(['solo'], None)]
+
+
+def test_groups_by_top_k_within_a_batch():
+    run = Recorder()
+    batcher = MicroBatcher(run, max_batch=8, max_wait=0.2)
+    futures = [batcher.submit_future('a', 1), batcher.submit_future('b', 3), batcher.submit_future('c', 1)]
+    assert [f.result(timeout=2) for f in futures] == [('A', 1), ('B', 3), ('C', 1)]
+    assert sorted(run.calls, key=lambda call: call[1]) == [(['a', 'c'], 1), (['b'], 3)]
+    assert batcher.stats()['batches'] == 1
+
+
+def test_failure_is_delivered_to_every_request_of_the_group():
+    def run(items, top_k):
+        raise RuntimeError('modelo no cargado')
+
+    batcher = MicroBatcher(run, max_batch=8, max_wait=0.05)
+    futures = [batcher.submit_future('a'), batcher.submit_future('b')]
+    for f in futures:
+        with pytest.raises(RuntimeError):
+            f.result(timeout=2)
+    assert batcher.stats()['failed'] == 2
+
+
+def test_batcher_from_env(monkeypatch):
+    monkeypatch.setenv('PREDICT_BATCH_MAX', '1')
+    assert batcher_from_env(Recorder()) is None
+    monkeypatch.setenv('PREDICT_BATCH_MAX', '16')
+    monkeypatch.setenv('PREDICT_BATCH_WAIT_MS', '5')
+    batcher = batcher_from_env(Recorder())
+    assert batcher.max_batch == 16 and batcher.max_wait == pytest.approx(0.005)
@@ -0,0 +1,83 @@
+"""`ExpiryScheduler`: borrado programado, aplazamiento entre workers y compactación."""
+import os
+import time
+
+import pytest
+
+from pdf_cleanup import COMPACT_MIN_ENTRIES, ExpiryScheduler
+
+
+def wait_until(condition, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return condition()
+
+
+@pytest.fixture
+def pdf_dir(tmp_path):
+    return str(tmp_path / 'tmp_pdfs')
+
+
+def make_pdf(pdf_dir, name='pred_a.pdf'):
+    os.makedirs(pdf_dir, exist_ok=True)
+    path = os.path.join(pdf_dir, name)
+    with open(path, 'wb') as f:
+        f.write(b'%PDF-1.4')
+    return path
+
+
+def test_deletes_after_delay_and_counts_bytes(pdf_dir):
+    scheduler = ExpiryScheduler(pdf_dir, max_age_seconds=60)
+    path = make_pdf(pdf_dir)
+    scheduler.track(path, delay_seconds=0.1)
+    assert scheduler.stats()['bytes_on_disk'] == 8
+    assert wait_until(lambda: not os.path.exists(path))
+    assert wait_until(lambda: scheduler.stats()['deleted'] == 1)
+    stats = scheduler.stats()
+    assert stats['deleted_bytes'] == 8 and stats['tracked_files'] == 0 and stats['pending_deletions'] == 0
+
+
+def test_reschedule_replaces_previous_deadline(pdf_dir):
+    scheduler = ExpiryScheduler(pdf_dir, max_age_seconds=60)
+    path = make_pdf(pdf_dir)
+    scheduler.track(path, delay_seconds=0.1)
+    scheduler.schedule(path, 60)
+    time.sleep(0.3)
+    assert os.path.exists(path)
+    assert scheduler.stats()['pending_deletions'] == 1
+
+
+def test_file_touched_by_another_worker_is_postponed(pdf_dir):
+    mine = ExpiryScheduler(pdf_dir, max_age_seconds=0.6)
+    other = ExpiryScheduler(pdf_dir, max_age_seconds=0.6)
+    path = make_pdf(pdf_dir)
+    mine.schedule(path, 0.1)
+    time.sleep(0.05)
+    other.track(path)  # otro worker vuelve a enlazar el PDF (max_age)
+    time.sleep(0.3)
+    assert os.path.exists(path)
+    assert mine.stats()['postponed'] == 1
+    assert wait_until(lambda: not os.path.exists(path))
+
+
+def test_adopts_existing_files_but_not_temporaries(pdf_dir):
+    path = make_pdf(pdf_dir)
+    make_pdf(pdf_dir, 'pred_b.pdf.part')
+    make_pdf(pdf_dir, '.tmp-render')
+    scheduler = ExpiryScheduler(pdf_dir, max_age_seconds=60)
+    scheduler.schedule(path, 60)
+    assert scheduler.stats()['tracked_files'] == 1
+
+
+def test_heap_is_compacted_when_stale_entries_dominate(pdf_dir):
+    scheduler = ExpiryScheduler(pdf_dir, max_age_seconds=60)
+    path = make_pdf(pdf_dir)
+    for _ in range(10 * COMPACT_MIN_ENTRIES):
+        scheduler.schedule(path, 60)
+    stats = scheduler.stats()
+    assert stats['compactions'] > 0
+    assert stats['heap_entries'] <= COMPACT_MIN_ENTRIES + 1
+    assert stats['pending_deletions'] == 1
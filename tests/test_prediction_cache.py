@@ -0,0 +1,70 @@
+"""`PredictionCache`: LRU, TTL e invalidación al cambiar la versión del modelo."""
+import time
+
+import pytest
+
+from prediction_cache import PredictionCache, SQLiteCacheBackend, normalize_text
+
+
+def test_key_normalizes_text_and_includes_version():
+    assert normalize_text('  Galaxy   S21 ') == 'galaxy s21'
+    assert PredictionCache.make_key('v1', 'Galaxy  S21', 3) == PredictionCache.make_key('v1', 'galaxy s21', 3)
+    assert PredictionCache.make_key('v1', 'Galaxy S21', 3) != PredictionCache.make_key('v2', 'Galaxy S21', 3)
+    assert PredictionCache.make_key('v1', 'Galaxy S21', 3) != PredictionCache.make_key('v1', 'Galaxy S21', 1)
+
+
+def test_evicts_least_recently_used():
+    cache = PredictionCache(maxsize=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1  # 'b' pasa a ser la menos usada
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    stats = cache.stats()
+    assert stats['evictions'] == 1 and stats['size'] == 2
+    assert stats['hits'] == 3 and stats['misses'] == 1
+
+
+def test_entries_expire_after_ttl():
+    cache = PredictionCache(maxsize=10, ttl=0.05)
+    cache.set('a', 1)
+    assert cache.get('a') == 1
+    time.sleep(0.1)
+    assert cache.get('a') is None
+    assert cache.stats()['expirations'] == 1
+
+
+def test_invalidate_clears_local_entries():
+    cache = PredictionCache(maxsize=10, ttl=60)
+    cache.set(PredictionCache.make_key('v1', 'dell', 3), 'Funcional')
+    cache.invalidate('v2')
+    assert cache.get(PredictionCache.make_key('v1', 'dell', 3)) is None
+    assert cache.stats()['invalidations'] == 1
+
+
+@pytest.fixture
+def backend(tmp_path):
+    return SQLiteCacheBackend(str(tmp_path / 'cache.db'), ttl=60)
+
+
+def test_shared_backend_serves_other_workers(backend):
+    key = PredictionCache.make_key('v1', 'dell', 3)
+    PredictionCache(backend=backend).set(key, {'label': 'Funcional'})
+    other = PredictionCache(backend=backend)
+    assert other.get(key) == {'label': 'Funcional'}
+    assert other.stats()['shared_hits'] == 1
+    # El acierto compartido queda también en la LRU local.
+    assert other.get(key) == {'label': 'Funcional'}
+    assert other.stats()['hits'] == 1
+
+
+def test_version_change_purges_other_versions_from_backend(backend):
+    old = PredictionCache.make_key('v1', 'dell', 3)
+    new = PredictionCache.make_key('v2', 'dell', 3)
+    cache = PredictionCache(backend=backend)
+    cache.set(old, 'Funcional')
+    cache.set(new, 'Reciclaje')
+    cache.invalidate('v2')
+    assert backend.get(old) is None
+    assert backend.get(new) == 'Reciclaje'
@@ -0,0 +1,72 @@
+"""`AppendOnlyCSVWriter`: escritura por lotes, migración de esquema y rotación."""
+import csv
+import glob
+
+import pytest
+
+from prediction_log import AppendOnlyCSVWriter
+
+COLUMNS = ['modelo', 'tipo', 'prediccion_ml']
+
+
+def read_rows(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        return list(csv.reader(f))
+
+
+@pytest.fixture
+def log_path(tmp_path):
+    return str(tmp_path / 'data_log.csv')
+
+
+def test_writes_header_once_and_ignores_unknown_keys(log_path):
+    writer = AppendOnlyCSVWriter(log_path, COLUMNS, fsync='none', max_bytes=0)
+    writer.append({'modelo': 'Dell', 'prediccion_ml': 'Funcional', 'otra': 'x'})
+    writer.append({'modelo': 'HP', 'tipo': 'Laptop'})
+    writer.close()
+    assert read_rows(log_path) == [COLUMNS, ['Dell', '', 'Funcional'], ['HP', 'Laptop', '']]
+
+
+def test_buffers_until_flush(log_path):
+    writer = AppendOnlyCSVWriter(log_path, COLUMNS, fsync='none', flush_interval=60, batch_size=100)
+    writer.append({'modelo': 'Dell'})
+    assert writer.pending() == 1
+    writer.flush()
+    assert writer.pending() == 0
+    assert read_rows(log_path)[1] == ['Dell', '', '']
+    writer.close()
+
+
+def test_migrates_old_schema_by_column_name(log_path):
+    with open(log_path, 'w', encoding='utf-8') as f:
+        f.write('prediccion_ml,modelo\nReciclaje,Nokia\n')
+    writer = AppendOnlyCSVWriter(log_path, COLUMNS, fsync='always', max_bytes=0)
+    writer.append({'modelo': 'Dell', 'tipo': 'PC', 'prediccion_ml': 'Funcional'})
+    assert read_rows(log_path) == [COLUMNS, ['Nokia', '', 'Reciclaje'], ['Dell', 'PC', 'Funcional']]
+    assert glob.glob(log_path + '.legacy-*') == []
+
+
+def test_migration_keeps_a_copy_when_columns_are_dropped(log_path):
+    with open(log_path, 'w', encoding='utf-8') as f:
+        f.write('modelo,obsoleta\nNokia,1\n')
+    writer = AppendOnlyCSVWriter(log_path, COLUMNS, fsync='always', max_bytes=0)
+    writer.append({'modelo': 'Dell'})
+    assert read_rows(log_path) == [COLUMNS, ['Nokia', '', ''], ['Dell', '', '']]
+    [legacy] = glob.glob(log_path + '.legacy-*')
+    assert read_rows(legacy) == [['modelo', 'obsoleta'], ['Nokia', '1']]
+
+
+def test_rotates_by_size_and_keeps_backup_count(log_path):
+    writer = AppendOnlyCSVWriter(log_path, COLUMNS, fsync='always', max_bytes=50, backup_count=2)
+    for i in range(12):
+        writer.append({'modelo': f'equipo-{i:02d}', 'prediccion_ml': 'Funcional'})
+    assert sorted(glob.glob(log_path + '.*')) == [log_path + '.1', log_path + '.2', log_path + '.lock']
+    # Cada archivo rotado empieza con su propia cabecera.
+    for path in (log_path, log_path + '.1', log_path + '.2'):
+        assert read_rows(path)[0] == COLUMNS
+    assert read_rows(log_path)[-1][0] == 'equipo-11'
+
+
+def test_rejects_unknown_fsync_policy(log_path):
+    with pytest.raises(ValueError):
+        AppendOnlyCSVWriter(log_path, COLUMNS, fsync='sometimes')
@@ -1,7 +1,35 @@
+"""Modelo de usuario y repositorio persistente en SQLite.
+
+- `username` tiene un índice único: las búsquedas son O(log n), no un
+  recorrido lineal de todos los usuarios.
+- Cada hilo de cada worker reutiliza su propia conexión (pool por hilo).
+- `get_user_by_id`, que Flask-Login llama en cada petición autenticada, se
+  sirve desde una pequeña caché de identidades con TTL.
+- El coste del hash de contraseñas se controla con PASSWORD_HASH_METHOD; los
+  hashes con otro método se rehacen al iniciar sesión.
+- El esquema (y los usuarios iniciales) se crean en la primera consulta, no
+  al importar el módulo: arrancar un worker no abre la base ni calcula hashes.
+
+La base de datos se configura con USERS_DB (por defecto `users.db`).
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash
+from werkzeug.security import generate_password_hash, check_password_hash
 
-# --- MODELO DE USUARIO Y BASE DE DATOS FICTICIA ---
+BASE_DIR = os.path.dirname(__file__)
+USERS_DB = os.environ.get('USERS_DB', os.path.join(BASE_DIR, 'users.db'))
+# Método de werkzeug para los hashes nuevos, p. ej. 'scrypt' o 'pbkdf2:sha256:600000'.
+PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')
+
+# Usuarios iniciales: sólo se crean (y se hashean) si la tabla está vacía.
+DEFAULT_USERS = [('admin', 'pass123'), ('user', 'otra123')]
+
+# --- MODELO DE USUARIO ---
 
 class User(UserMixin):
     def __init__(self, id, username, password_hash):
@@ -9,36 +37,146 @@ class User(UserMixin):
         self.username = username
         self.password_hash = password_hash
 
-# Base de datos de usuarios ficticia
-USERS = {
-    1: User(1, 'admin', generate_password_hash('pass123')),
-    2: User(2, 'user', generate_password_hash('otra123')),
-}
-# Variable para el ID del próximo usuario
-next_user_id = 3 
+
+class UserRepository:
+    """Acceso a la tabla `users` con una conexión por hilo y caché de identidades.
+
+    - path: archivo SQLite.
+    - cache_size: nº de usuarios que se guardan en la caché por id.
+    - cache_ttl: segundos que un usuario permanece en la caché.
+    """
+
+    def __init__(self, path, cache_size=256, cache_ttl=60):
+        self.path = path
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self._local = threading.local()
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._counters = {'cache_hits': 0, 'cache_misses': 0, 'queries': 0}
+        self._schema_ready = False
+        self._schema_lock = threading.Lock()
+
+    # --- Conexiones ---
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        if not self._schema_ready:
+            self._init_schema(conn)
+        return conn
+
+    def _init_schema(self, conn):
+        with self._schema_lock:
+            if self._schema_ready:
+                return
+            conn.execute('CREATE TABLE IF NOT EXISTS users ('
+                         'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                         'username TEXT NOT NULL, '
+                         'password_hash TEXT NOT NULL)')
+            conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_users_username ON users (username)')
+            conn.commit()
+            if conn.execute('SELECT COUNT(*) FROM users').fetchone()[0] == 0:
+                for username, password in DEFAULT_USERS:
+                    self._insert(conn, username, password)
+            self._schema_ready = True
+
+    def _insert(self, conn, username, password):
+        password_hash = generate_password_hash(password, method=PASSWORD_HASH_METHOD)
+        try:
+            cur = conn.execute('INSERT INTO users (username, password_hash) VALUES (?, ?)',
+                               (username, password_hash))
+            conn.commit()
+        except sqlite3.IntegrityError:
+            conn.rollback()
+            return None
+        return User(cur.lastrowid, username, password_hash)
+
+    def _query_one(self, sql, params):
+        self._counters['queries'] += 1
+        row = self._conn().execute(sql, params).fetchone()
+        return User(*row) if row else None
+
+    # --- Consultas ---
+    def get_by_id(self, user_id):
+        try:
+            user_id = int(user_id)
+        except (TypeError, ValueError):
+            return None
+        now = time.monotonic()
+        with self._cache_lock:
+            entry = self._cache.get(user_id)
+            if entry is not None and entry[1] >= now:
+                self._cache.move_to_end(user_id)
+                self._counters['cache_hits'] += 1
+                return entry[0]
+            self._counters['cache_misses'] += 1
+        user = self._query_one('SELECT id, username, password_hash FROM users WHERE id = ?', (user_id,))
+        if user is not None:
+            self._remember(user)
+        return user
+
+    def get_by_username(self, username):
+        if not username:
+            return None
+        return self._query_one('SELECT id, username, password_hash FROM users WHERE username = ?',
+                               (username,))
+
+    def add(self, username, password):
+        """Crea un usuario. Devuelve None si el nombre ya existe."""
+        return self._insert(self._conn(), username, password)
+
+    def verify_password(self, user, password):
+        """Comprueba la contraseña y, si el hash usa otro método, lo rehace con el actual."""
+        if not check_password_hash(user.password_hash, password):
+            return False
+        if not user.password_hash.startswith(PASSWORD_HASH_METHOD + '$') and \
+                not user.password_hash.startswith(PASSWORD_HASH_METHOD + ':'):
+            user.password_hash = generate_password_hash(password, method=PASSWORD_HASH_METHOD)
+            conn = self._conn()
+            conn.execute('UPDATE users SET password_hash = ? WHERE id = ?', (user.password_hash, user.id))
+            conn.commit()
+            self.invalidate(user.id)
+        return True
+
+    # --- Caché de identidades ---
+    def _remember(self, user):
+        with self._cache_lock:
+            self._cache[user.id] = (user, time.monotonic() + self.cache_ttl)
+            self._cache.move_to_end(user.id)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._cache_lock:
+            self._cache.pop(int(user_id), None)
+
+    def stats(self):
+        with self._cache_lock:
+            stats = dict(self._counters)
+            stats['cache_size'] = len(self._cache)
+        return stats
+
+
+# Repositorio compartido por el proceso
+users = UserRepository(USERS_DB)
 
 def get_user_by_id(user_id):
     """Función para obtener un usuario por su ID."""
-    return USERS.get(int(user_id))
+    return users.get_by_id(user_id)
 
 def get_user_by_username(username):
     """Función para obtener un usuario por su nombre de usuario."""
-    return next((u for u in USERS.values() if u.username == username), None)
+    return users.get_by_username(username)
+
+def check_user_password(user, password):
+    """Verifica la contraseña de `user` (ver `UserRepository.verify_password`)."""
+    return users.verify_password(user, password)
 
 def add_new_user(username, password):
-    """Función para agregar un nuevo usuario (simulación de guardado en DB)."""
-    global next_user_id
-    
-    # 1. Verificar si el usuario ya existe
-    if get_user_by_username(username):
-        return None  # Indica que el usuario ya existe
-    
-    # 2. Hashear la contraseña
-    hashed_password = generate_password_hash(password)
-    
-    # 3. Crear y guardar el nuevo usuario
-    new_user = User(next_user_id, username, hashed_password)
-    USERS[next_user_id] = new_user
-    next_user_id += 1
-    
-    return new_user
\ No newline at end of file
+    """Función para agregar un nuevo usuario. Devuelve None si ya existe."""
+    return users.add(username, password)